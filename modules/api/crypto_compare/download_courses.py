@@ -5,8 +5,13 @@ Input:
 - list of symbols (e.g. [BTC, ETH, ADA, ...])
 Output:
 - downloaded courses in one folder
+
+Concurrent mode: symbols are downloaded in a thread pool (1x http session per thread, shared rate limit)
 """
 
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 
 from modules.utils import json_dump_nicely
@@ -20,16 +25,62 @@ ACCEPTED_ERRORS_LIST = [
     'limit is smaller than min value.'                  # if limit = 0
 ]
 ACCEPTED_ERRORS = {}
+URL_HISTODAY = 'https://min-api.cryptocompare.com/data/v2/histoday'
+
+_lock = threading.Lock()            # ACCEPTED_ERRORS and error log (threads)
+_thread_local = threading.local()   # 1x http session per thread
+
+
+class RateLimiter:
+    """
+    Token bucket rate limit (thread-safe), shared by all threads of a download.
+    Every request takes one token. Tokens refill with the rate, up to the capacity (burst).
+    """
+
+    def __init__(self, rate:float, capacity:float=None):
+        if rate <= 0:
+            raise ValueError(f'Rate must be > 0 requests per second: {rate}')
+        self.rate = rate                                # tokens (requests) per second
+        self.capacity = capacity or max(1.0, rate)      # max tokens
+
+        # Initialize variables, value assigned at runtime
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+
+    def acquire(self) -> None:
+        """ Wait until a token is available and take it
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _get_session() -> requests.Session:
+    """ Return the http session of the current thread (connections are reused between the requests)
+    """
+    if not hasattr(_thread_local, 'session'):
+        _thread_local.session = requests.Session()
+    return _thread_local.session
 
 
-def API_request_course(symbol:str, to_ts=None, limit=2000):
+def API_request_course(symbol:str, to_ts=None, limit=2000, url:str=URL_HISTODAY, rate_limiter:RateLimiter=None):
     """ API request to get historical course data for a symbol from CryptoCompare
     :param symbol: Cryptocurrency symbol (e.g., 'BTC')
     :param to_ts: time in seconds - last day in df (if to_ts=None download until today)
     :param limit: specifies how much data is requested, max 2000 data points per API call
+    :param url: url of the histoday endpoint
+    :param rate_limiter: shared rate limit (None - no limit)
     :return: df with historical course data for the symbol containing historical data containing to_ts datapoints
     """
-    url = 'https://min-api.cryptocompare.com/data/v2/histoday'
     currency = 'USD'
     limit = limit  # 2000 is maximum data points per API request
 
@@ -42,7 +93,9 @@ def API_request_course(symbol:str, to_ts=None, limit=2000):
     }
 
     # Make the API request
-    response = requests.get(url, params=params)
+    if rate_limiter:
+        rate_limiter.acquire()
+    response = _get_session().get(url, params=params, timeout=60)
     data = response.json()
 
     # Check for errors in the API response
@@ -74,14 +127,17 @@ class DownloadManagerCC:
     This class tracks errors across all instances (in class methods). They are categorizing in new and known errors.
     """
 
-    def __init__(self, symbol:str):
+    def __init__(self, symbol:str, folder_path:Path=None):
         self.symbol = symbol                                     # symbol
 
-        self.folder_path = get_path('cc') / 'download'    # folder to save all symbols
+        self.folder_path = folder_path or get_path('cc') / 'download'   # folder to save all symbols
         self.allow_update = True                                 # bool, whether updates are allowed if file with old data exists (if False, always full download)
+        self.url = URL_HISTODAY                                  # url of the histoday endpoint
+        self.rate_limiter = None                                 # shared RateLimiter (None - no limit)
 
         # Initialize variables, value assigned at runtime
         self.df = pd.DataFrame()                                 # requested data (summarized if multiple requests needed)
+        self.status = ''                                         # result of run() - for the progress
 
 
     def run(self):
@@ -98,32 +154,38 @@ class DownloadManagerCC:
                 # Full data
                 self._routine_request_full_course()
             #print(self.df)
-            # Save data to csv
+            # Save data to csv (readable) and npy (full precision, fast loading)
             if not self.df.empty:
-                save_pandas_to_file(self.df, self.folder_path, self.symbol)
+                if self.status == 'Update':
+                    # Append only the new rows (the overlapping last day is replaced)
+                    append_course(self.df, file_path)
+                else:
+                    save_pandas_to_file(self.df, self.folder_path, self.symbol)
+                    save_course_npy(self.df, self.folder_path / f'{self.symbol}.npy')
         except Exception as e:
             # Append error (with symbol) to dict, if error in ACCEPTED_ERRORS_LIST
             for accepted_error in ACCEPTED_ERRORS_LIST:
                 if accepted_error in str(e):
-                    if accepted_error in ACCEPTED_ERRORS:
-                        ACCEPTED_ERRORS[accepted_error].append(self.symbol)
-                    else:
-                        ACCEPTED_ERRORS[accepted_error] = []
+                    with _lock:
+                        ACCEPTED_ERRORS.setdefault(accepted_error, []).append(self.symbol)
+                    self.status = f'Known error: {accepted_error}'
                     return
             # Call error handler, if error_msg is not in ACCEPTED_ERRORS
-            log_error(e)
+            self.status = f'Error: {e}'
+            with _lock:
+                log_error(e)
 
 
     def _routine_request_full_course(self):
         """ Get all historical course data with multiple requests for a symbol
         Because only 2000 data points can be requested per api call, it must be repeated x times for all data
         """
-        print('<Full>')
+        self.status = 'Full'
         to_ts = None
         beginning_reached = False     # True, if first datapoint in df['volumefrom'] is 0, which means no data
         while True:
             # Download 2000 data points
-            df = API_request_course(self.symbol, to_ts)
+            df = API_request_course(self.symbol, to_ts, url=self.url, rate_limiter=self.rate_limiter)
 
             # Cut data, if the first course data df['volumefrom'] is 0
             if df['volumefrom'].iloc[0] == 0: # first date is 0, when no historical course data is available
@@ -149,41 +211,61 @@ class DownloadManagerCC:
     def _routine_update_available_course(self, file_path):
         """ Update the historical course data for a symbol
             This symbol has already been downloaded in the past and now only the days that are missing in the df are requested
+            self.df contains only the new rows, which are appended to the course (append_course)
         :param file_path: path to the symbol df containing historical course data
         """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f'File "{file_path}" does not exist')
 
-        # load already existing df from file_path
-        df_existing = load_pandas_from_file_path(file_path)
-        #print(df_existing)
+        # Last date of the already existing course (only the end of the file is read)
+        last_date = get_course_last_date(file_path)
         # Calculate amount of days (diff) to request the missing data
-        n = (pd.Timestamp.today() - df_existing.index[-1]).days - 1
+        n = (pd.Timestamp.today() - last_date).days - 1
         if n == -1:                     # last_date = today -> no update needed
-            print('<Already up to date>')
+            self.status = 'Already up to date'
             return
         elif n == 0:                    # special case, 1 day is missing, that means to_ts must be None
             n = None
         # Download new data
-        print('<Update>')
-        df = API_request_course(self.symbol, None, n)
+        self.status = 'Update'
+        df = API_request_course(self.symbol, None, n, url=self.url, rate_limiter=self.rate_limiter)
         #print(df)
-        # Concat old with new data
-        self.df = pd.concat([df_existing, df], axis=0)
+        # Only the new data (appended in run(), rows from the last date on replace the old rows)
+        self.df = df.loc[df.index >= last_date]
 
 
 
-def main_routine_download_course_list_cc(symbols:list) -> None:
+def main_routine_download_course_list_cc(symbols:list, workers:int=1, requests_per_second:float=None,
+                                         url:str=URL_HISTODAY, folder_path:Path=None) -> None:
+    """ Download (or update) all symbols from the list
+    :param symbols: list of symbols
+    :param workers: number of threads (1 - serial)
+    :param requests_per_second: rate limit over all threads (None - no limit)
+    :param url: url of the histoday endpoint (e.g. a local test server)
+    :param folder_path: folder to save the courses (default data/course/crypto_compare/download)
+    """
+    rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+
+    def download(symbol:str) -> str:
+        dm = DownloadManagerCC(symbol, folder_path)
+        dm.url = url
+        dm.rate_limiter = rate_limiter
+        dm.run()
+        return dm.status
+
     # Download symbols from list
     print(f'Request: {symbols}')
     print(f'Start downloading ...', '\n')
-    for index, symbol in enumerate(symbols):
-        # Print
-        print(f'\r[{index + 1}/{len(symbols)}] - {symbol}')
-        # Download each symbol
-        dm = DownloadManagerCC(symbol)
-        dm.run()
-        print()
+    if workers <= 1:
+        for index, symbol in enumerate(symbols):
+            status = download(symbol)
+            print(f'[{index + 1}/{len(symbols)}] - {symbol} <{status}>')
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(download, symbol): symbol for symbol in symbols}
+            for index, future in enumerate(as_completed(futures)):
+                print(f'[{index + 1}/{len(symbols)}] - {futures[future]} <{future.result()}>')
+    print()
 
     # Print known errors
     output = json_dump_nicely(ACCEPTED_ERRORS)
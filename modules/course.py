@@ -1,7 +1,5 @@
 
 from modules.file_handler import *
-from modules.api.crypto_compare.download_csv_symbols import main_routine_download_available_symbols_cc
-from modules.api.crypto_compare.download_courses import main_routine_download_course_list_cc
 
 
 
@@ -64,7 +62,7 @@ def get_courses_paths(source_courses:str|list[str]) -> list:
 
 
     # Check if all courses are already downloaded
-    paths_pos, names_neg = founded_files_in_directory(get_path(), symbol_names, 'csv')
+    paths_pos, names_neg = founded_courses(symbol_names)
     if len(names_neg) == 0:
         # all courses already downloaded
         return paths_pos
@@ -73,7 +71,7 @@ def get_courses_paths(source_courses:str|list[str]) -> list:
     download_courses(symbol_names, False) # [update=True to update all, update=False to download only missing courses]
 
     # Check, if all courses are now downloaded
-    paths_pos, names_neg = founded_files_in_directory(get_path(), symbol_names, 'csv')
+    paths_pos, names_neg = founded_courses(symbol_names)
     if len(names_neg) == 0:
         return paths_pos
     else:
@@ -97,13 +95,14 @@ def download_courses(symbol_names:list, update=False) -> None:
 
     # Download symbols
     # (currently only one API - CC)
+    from modules.api.crypto_compare.download_courses import main_routine_download_course_list_cc  # requests only for downloads
     if update:
         # Update all courses (regardless of whether they were downloaded in the past) -> All courses are then up to date
         print('Update or download all needed courses')
         main_routine_download_course_list_cc(symbol_names)
     else:
         # Download only missing courses -> newly downloaded courses may have more data than already downloaded courses
-        paths_pos, names_neg = founded_files_in_directory(get_path(), symbol_names, 'csv')
+        paths_pos, names_neg = founded_courses(symbol_names)
         if len(names_neg) > 0:
             print('Download only missing courses ...')
             main_routine_download_course_list_cc(names_neg)
@@ -124,6 +123,7 @@ def get_csv_cc() -> pd.DataFrame:
         # Download file
         print(f'CSV file from CryptoCompare with all available symbols does not exist')
         print('Start downloading ...')
+        from modules.api.crypto_compare.download_csv_symbols import main_routine_download_available_symbols_cc
         main_routine_download_available_symbols_cc()
 
     # Load csv as pandas frame
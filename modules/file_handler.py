@@ -1,6 +1,8 @@
-
+import io
+import os
+import json
 from pathlib import Path
-import matplotlib.pyplot as plt
+import numpy as np
 import yaml
 
 from modules.utils import *
@@ -18,8 +20,10 @@ def get_path(key:str='ws') -> Path:
     folder_dict = {
         # Folders
         'ws': workspace_path,
+        'course': workspace_path / 'data/course',
         'cc': workspace_path / 'data/course/crypto_compare',
         'study': workspace_path / 'data/study',
+        'cache': workspace_path / 'data/cache',
 
         # Files
         'cc_symbols_api_csv': workspace_path / 'data/course/crypto_compare/cc_symbols_api.csv',
@@ -159,16 +163,24 @@ def get_names_from_paths(list_file_paths:list) -> list[str]:
 
 #---------------------- Pandas ----------------------#
 def load_pandas_from_symbol(symbol:str) -> pd.DataFrame:
-    # Find file path from symbol in folder
-    folder_dir = get_path()
-    file_path = get_file_in_directory(folder_dir, symbol, 'csv')
+    # Find file path from symbol in the course index
+    file_path = get_course_path(symbol)
 
     return load_pandas_from_file_path(file_path)
 
 
 def load_pandas_from_file_path(file_path:Path):
+    file_path = Path(file_path)  # Make sure path is a Path object
+    if file_path.suffix == '.npy':
+        return load_course_npy(file_path)
     if not file_path.exists():
         raise FileNotFoundError(f'File "{file_path}" does not exist')
+    recover_course_journal(file_path)  # update of the course was killed while writing -> roll back
+
+    # Course: load the binary store instead of parsing the csv (if it is up to date)
+    file_path_npy = get_course_npy_path(file_path)
+    if file_path_npy:
+        return load_course_npy(file_path_npy)
 
     # load data in pandas frame
     df = pd.read_csv(file_path)
@@ -211,13 +223,413 @@ def save_pandas_to_file(df:pd.DataFrame, folder_path:Path=None, name:str=None, e
     print(f'Saved {file_name} to {relative_folder}')
 
 
+#---------------------- Course index ----------------------#
+"""
+Symbol -> course path (csv) for all courses in data/course
+- built in one scan of the folder, persisted in data/cache/course_index.json
+- invalid, if the mtime of an indexed directory changed (file added, removed or renamed) -> new scan
+"""
+_course_index = {}  # loaded index {'dirs': {rel_dir: mtime_ns}, 'symbols': {symbol: [rel_path, ...]}}
+
+
+def get_course_path(symbol:str) -> Path:
+    """ Return the path of a course (csv) by its symbol
+    :param symbol: symbol name (file name without extension)
+    :return: course path (else raise Error)
+    """
+    rel_paths = _get_course_index()['symbols'].get(symbol, [])
+    if not rel_paths:
+        raise FileNotFoundError(f'Course "{symbol}" not found in directory "{get_path("course")}"')
+    if len(rel_paths) > 1:
+        raise ValueError(f'Multiple courses named "{symbol}" found in directory "{get_path("course")}": {rel_paths}')
+    return get_path('course') / rel_paths[0]
+
+
+def founded_courses(symbols:list) -> tuple[list[Path],list[str]]:
+    """ Return tuple of the courses, which are found in the course index and which are not
+    :param symbols: list of symbol names
+    :return: tuple(paths_available, symbols_unavailable)
+    """
+    paths_positive = []
+    symbols_negative = []
+    for symbol in symbols:
+        try:
+            paths_positive.append(get_course_path(symbol))
+        except FileNotFoundError:
+            symbols_negative.append(symbol)
+    return paths_positive, symbols_negative
+
+
+def _get_course_index() -> dict:
+    """ Return the valid course index (from memory, from the file or scan the course folder)
+    """
+    if _course_index and _course_index_valid(_course_index):
+        return _course_index
+
+    file_path = get_path('cache') / 'course_index.json'
+    index = None
+    if file_path.exists():
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+        except (json.JSONDecodeError, OSError):
+            index = None
+    if not index or not _course_index_valid(index):
+        index = _scan_course_index()
+        if index['dirs']:  # course folder exists
+            save_txt(json.dumps(index), file_path, atomic=True)
+
+    _course_index.clear()
+    _course_index.update(index)
+    return _course_index
+
+
+def _course_index_valid(index:dict) -> bool:
+    """ Index is valid, if no indexed directory changed since the scan
+    """
+    if not index.get('dirs'):
+        return False
+    folder_path = get_path('course')
+    try:
+        return all((folder_path / rel_dir).stat().st_mtime_ns == mtime for rel_dir, mtime in index['dirs'].items())
+    except FileNotFoundError:
+        return False
+
+
+def _scan_course_index() -> dict:
+    """ Scan the course folder once
+    :return: {'dirs': {rel_dir: mtime_ns}, 'symbols': {symbol: [rel_path, ...]}}
+    """
+    folder_path = get_path('course')
+    index = {'dirs': {}, 'symbols': {}}
+    for dir_path, dir_names, file_names in os.walk(folder_path):
+        rel_dir = Path(dir_path).relative_to(folder_path)
+        index['dirs'][rel_dir.as_posix()] = os.stat(dir_path).st_mtime_ns
+        for file_name in file_names:
+            file_stem, extension = os.path.splitext(file_name)
+            if extension == '.csv':
+                index['symbols'].setdefault(file_stem, []).append((rel_dir / file_name).as_posix())
+    return index
+
+
+#---------------------- Course store (npy) ----------------------#
+"""
+Binary store of a course next to its csv: <symbol>.npy (structured array, 1 record per day: date + numeric columns)
+- full float64 precision (the csv is saved with 3 decimals)
+- loading is a binary read and a copy per column (no parsing of text and dates, the npy header is parsed once per format)
+The csv remains the readable version. The npy is only used, if it is not older than the csv.
+"""
+_npy_header_cache = {}  # {raw header: (shape, dtype)} - parsing the header of a structured array is slower than reading the data
+
+def save_course_npy(df:pd.DataFrame, file_path:Path) -> None:
+    """ [file save] Save a course as structured npy array
+    :param df: df[<numeric columns>] with DatetimeIndex (e.g. df[time, high, low, open, volumefrom, volumeto, close])
+    :param file_path: file path (.npy)
+    """
+    file_path = Path(file_path)  # Make sure path is a Path object
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise ValueError(f'Index of the course is not a DatetimeIndex: {type(df.index)}')
+    dtype = [('date', 'datetime64[ns]')]
+    for col in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            raise ValueError(f'Column "{col}" is not numeric: {df[col].dtype}')
+        dtype.append((str(col), df[col].dtype))
+
+    data = np.empty(len(df), dtype=dtype)
+    data['date'] = df.index.to_numpy(dtype='datetime64[ns]')
+    for col in df.columns:
+        data[str(col)] = df[col].to_numpy()
+
+    # Write to a temp file and rename it (a reader never sees a half written file)
+    create_dir(file_path.parent)
+    file_path_temp = file_path.with_name(f'{file_path.stem}.{os.getpid()}.tmp')
+    with open(file_path_temp, 'wb') as file:
+        np.save(file, data)
+    os.replace(file_path_temp, file_path)
+
+
+def load_course_npy(file_path:Path) -> pd.DataFrame:
+    """ [file load] Load a course from the npy store
+    :param file_path: file path (.npy)
+    :return: df[<numeric columns>] with index date (same format as the csv loaded with load_pandas_from_file_path)
+    """
+    file_path = Path(file_path)  # Make sure path is a Path object
+    if not file_path.exists():
+        raise FileNotFoundError(f'File "{file_path}" does not exist')
+    data = _read_npy_records(file_path)
+    index = pd.DatetimeIndex(data['date'], name='date')
+    # Columns are views of the records (each load reads its own buffer)
+    return pd.DataFrame({name: data[name] for name in data.dtype.names if name != 'date'}, index=index, copy=False)
+
+
+def _read_npy_records(file_path:Path) -> np.ndarray:
+    """ np.load() for 1-D npy files, but the header is only parsed once per format
+    """
+    with open(file_path, 'rb') as file:
+        version = np.lib.format.read_magic(file)
+        size_header_len = 2 if version == (1, 0) else 4
+        header_len = int.from_bytes(file.read(size_header_len), 'little')
+        header = file.read(header_len)
+        if header not in _npy_header_cache:
+            file.seek(0)
+            np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            if len(shape) != 1:
+                raise ValueError(f'npy "{file_path}" is not 1-D: {shape}')
+            _npy_header_cache[header] = (shape, dtype)
+        shape, dtype = _npy_header_cache[header]
+        return np.fromfile(file, dtype=dtype, count=shape[0])
+
+
+def get_course_npy_path(file_path:Path) -> Path|None:
+    """ Return the npy store of a csv course, if it exists and is up to date
+    :param file_path: course path (.csv)
+    :return: path of the npy (None, if there is no up-to-date npy)
+    """
+    file_path = Path(file_path)  # Make sure path is a Path object
+    file_path_npy = file_path.with_suffix('.npy')
+    try:
+        if file_path_npy.stat().st_mtime_ns >= file_path.stat().st_mtime_ns:
+            return file_path_npy
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def convert_courses_to_npy(folder_path:Path) -> None:
+    """ Convert all csv courses in a folder to the npy store (one-shot for already downloaded courses)
+    The csv courses only have 3 decimals, so the npy has the same precision. New downloads save the full precision.
+    :param folder_path: folder with csv courses (e.g. get_path('cc') / 'download')
+    """
+    file_paths = sorted(list_file_paths_in_folder(folder_path, '.csv'))
+    for index, file_path in enumerate(file_paths):
+        df = pd.read_csv(file_path, parse_dates=['date'], index_col='date')
+        save_course_npy(df, file_path.with_suffix('.npy'))
+        print(f'[{index + 1}/{len(file_paths)}] {file_path.stem}: {len(df)} days')
+
+
+#---------------------- Course update (append) ----------------------#
+"""
+Daily update of a course: only the new rows are written (csv and npy in place, the old rows are not rewritten)
+- rows of the update with a date <= last date of the course replace the old rows (overlapping last day -> no duplicates)
+- undo journal <symbol>.journal.json: the replaced bytes (csv tail, npy tail and header) are saved before the files are changed
+  and the journal is removed afterwards. An update, which was killed while writing, is rolled back on the next load or update.
+"""
+JOURNAL_SUFFIX = '.journal.json'
+
+
+def append_course(df:pd.DataFrame, file_path:Path) -> int:
+    """ [file save] Append new rows to a course (csv and its npy, if the npy is up to date)
+    :param df: new rows - same columns as the course, DatetimeIndex
+    :param file_path: course path (.csv)
+    :return: amount of appended rows (without the replaced rows)
+    """
+    file_path = Path(file_path)  # Make sure path is a Path object
+    if not file_path.exists():
+        raise FileNotFoundError(f'File "{file_path}" does not exist')
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise ValueError(f'Index of the course is not a DatetimeIndex: {type(df.index)}')
+    recover_course_journal(file_path)
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    if df.empty:
+        return 0
+    file_path_npy = get_course_npy_path(file_path)
+    first_date = df.index[0]
+
+    # Changes: csv tail from the first replaced row, npy tail and header
+    with open(file_path, 'rb') as file:
+        columns = file.readline().decode().rstrip('\r\n').split(',')[1:]
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise ValueError(f'Columns {missing} of the course "{file_path.name}" are not in the new rows: {list(df.columns)}')
+    offset_csv, replaced = _csv_tail_offset(file_path, first_date)
+    data_csv = df[columns].to_csv(header=False, float_format='%.3f').encode()
+    changes = [(file_path, offset_csv, data_csv, True)]  # (file, offset, new bytes, cut the rest of the file)
+    if file_path_npy:
+        changes.extend(_npy_append_changes(df, file_path_npy, first_date))
+
+    # Journal (old bytes) -> write the new bytes -> remove the journal
+    journal = []
+    for path, offset, data, truncate in changes:
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            data_old = file.read() if truncate else file.read(len(data))
+        journal.append({'path': path.name, 'offset': offset, 'data': data_old.hex(), 'truncate': truncate})
+    file_path_journal = _course_journal_path(file_path)
+    save_txt(json.dumps(journal), file_path_journal, atomic=True)
+    for path, offset, data, truncate in changes:
+        _write_at(path, offset, data, truncate)
+    file_path_journal.unlink()
+    return len(df) - replaced
+
+
+def get_course_last_date(file_path:Path) -> pd.Timestamp:
+    """ Last date of a course (reads only the end of the csv)
+    :param file_path: course path (.csv)
+    :return: date of the last row
+    """
+    file_path = Path(file_path)  # Make sure path is a Path object
+    if not file_path.exists():
+        raise FileNotFoundError(f'File "{file_path}" does not exist')
+    recover_course_journal(file_path)
+    with open(file_path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        file.seek(max(0, file.tell() - 4096))
+        line = file.read().rstrip(b'\r\n').rsplit(b'\n', 1)[-1]
+    return pd.Timestamp(line.split(b',', 1)[0].decode())
+
+
+def recover_course_journal(file_path:Path) -> None:
+    """ Roll back an update of the course, which was not completed (journal exists)
+    :param file_path: course path (.csv)
+    """
+    file_path_journal = _course_journal_path(Path(file_path))
+    if not file_path_journal.exists():
+        return
+    with open(file_path_journal) as file:
+        journal = json.load(file)
+    for entry in journal:
+        _write_at(file_path_journal.parent / entry['path'], entry['offset'], bytes.fromhex(entry['data']), entry['truncate'])
+    file_path_journal.unlink()
+    print(f'Warning: Rolled back an incomplete update of "{Path(file_path).name}"')
+
+
+def _course_journal_path(file_path:Path) -> Path:
+    return file_path.with_name(f'{file_path.stem}{JOURNAL_SUFFIX}')
+
+
+def _write_at(file_path:Path, offset:int, data:bytes, truncate:bool) -> None:
+    """ Write data at offset (and cut the rest of the file)
+    """
+    with open(file_path, 'r+b') as file:
+        file.seek(offset)
+        file.write(data)
+        if truncate:
+            file.truncate()
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _csv_tail_offset(file_path:Path, first_date:pd.Timestamp) -> (int, int):
+    """ Byte offset of the first row with date >= first_date (rows from there on are replaced)
+    Reads the end of the file backwards (block size doubled until a row before first_date is found)
+    :return: offset, amount of replaced rows
+    """
+    with open(file_path, 'rb') as file:
+        header_size = len(file.readline())
+        end = file.seek(0, os.SEEK_END)
+        size = 4096
+        while True:
+            start = max(header_size, end - size)
+            file.seek(start)
+            rows = file.read(end - start).split(b'\n')
+            position = end - len(rows.pop())  # end of the last complete row
+            if start > header_size:
+                rows = rows[1:]  # first row can be incomplete
+            replaced = 0
+            for row in reversed(rows):
+                if row.strip():
+                    if pd.Timestamp(row.split(b',', 1)[0].decode()) < first_date:
+                        return position, replaced
+                    replaced += 1
+                position -= len(row) + 1
+            if start == header_size:
+                return header_size, replaced
+            size *= 2
+
+
+def _npy_append_changes(df:pd.DataFrame, file_path:Path, first_date:pd.Timestamp) -> list[tuple[Path, int, bytes, bool]]:
+    """ Changes of the npy store for appending df (tail from the first replaced record and the new header)
+    :return: [(file path, offset, bytes, truncate)]
+    """
+    with open(file_path, 'rb') as file:
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        data_offset = file.tell()
+    missing = [name for name in dtype.names if name != 'date' and name not in df.columns]
+    if missing:
+        raise ValueError(f'Columns {missing} of the course "{file_path.name}" are not in the new rows: {list(df.columns)}')
+    dates = np.memmap(file_path, dtype=dtype, mode='r', offset=data_offset, shape=shape)['date']
+    n_keep = int(np.searchsorted(dates, np.datetime64(first_date, 'ns')))
+    del dates
+
+    data = np.empty(len(df), dtype=dtype)
+    data['date'] = df.index.to_numpy(dtype='datetime64[ns]')
+    for name in dtype.names[1:]:
+        data[name] = df[name].to_numpy()
+    # Header with the new shape (numpy pads the header, so it keeps its size as long as the shape has enough digits)
+    header = io.BytesIO()
+    header_data = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (n_keep + len(data),)}
+    np.lib.format.write_array_header_1_0(header, header_data) if version == (1, 0) else \
+        np.lib.format.write_array_header_2_0(header, header_data)
+    header = header.getvalue()
+    if len(header) != data_offset:
+        raise ValueError(f'Header of "{file_path.name}" changed its size, save the course with save_course_npy()')
+    return [(file_path, data_offset + n_keep * dtype.itemsize, data.tobytes(), True), (file_path, 0, header, False)]
+
+
+#---------------------- Course cache ----------------------#
+"""
+Study-scoped cache of the courses (only df[close])
+The study manager fills the cache once, every params variation reads the course from the cache instead of parsing the csv again.
+key: (file path, modification time) -> a changed file is loaded again from the file
+"""
+_course_cache = {}
+
+
+def _course_cache_key(file_path:Path) -> tuple[str, int]:
+    file_path = Path(file_path)  # Make sure path is a Path object
+    if not file_path.exists():
+        raise FileNotFoundError(f'File "{file_path}" does not exist')
+    return str(file_path), file_path.stat().st_mtime_ns
+
+
+def get_course_cache_key(file_path:Path) -> tuple[str, int]:
+    """ Key of a course in the course cache (file path, modification time) - e.g. for other study-scoped caches of the course
+    """
+    return _course_cache_key(file_path)
+
+
+def fill_course_cache(file_paths:list) -> None:
+    """ Load the courses (only df[close]) into the cache (already cached courses are not loaded again)
+    :param file_paths: list of course paths
+    """
+    for file_path in file_paths:
+        key = _course_cache_key(file_path)
+        if key not in _course_cache:
+            _course_cache[key] = load_pandas_from_file_path(Path(file_path))[['close']]
+
+
+def clear_course_cache() -> None:
+    """ Release all cached courses (end of the study) """
+    _course_cache.clear()
+
+
+def load_course_close(file_path:Path) -> pd.DataFrame:
+    """ Return df[close] of a course - from the cache if it is filled, else from the file
+    :param file_path: course path
+    :return: df[close] (copy, so the caller can add columns)
+    """
+    key = _course_cache_key(file_path)
+    if key in _course_cache:
+        return _course_cache[key].copy()
+    return load_pandas_from_file_path(Path(file_path))[['close']]
+
+
 #---------------------- Matplotlib ----------------------#
-def save_matplotlib_figure(fig:plt.Figure, folder_path:Path, name:str, extension:str='png') -> None:
+def save_matplotlib_figure(fig:'matplotlib.figure.Figure', folder_path:Path, name:str, extension:str='png', dpi:int=300) -> None:
     """ Saves a Matplotlib figure to a file.
     :param fig: Matplotlib figure to save
     :param folder_path: Directory where the figure should be saved
     :param name: File name without extension
     :param extension: File format (default: 'png')
+    :param dpi: resolution (default: 300)
     """
     folder_path = Path(folder_path)  # Make sure path is a Path object
 
@@ -244,7 +656,7 @@ def save_matplotlib_figure(fig:plt.Figure, folder_path:Path, name:str, extension
 
     # Save figure
     fig.set_size_inches((8, 6))
-    fig.savefig(file_path, format=extension, dpi=300)
+    fig.savefig(file_path, format=extension, dpi=dpi)
     print(f'Saved {file_name} to {relative_folder}')
 
 
@@ -261,10 +673,62 @@ def load_yaml_from_file_path(file_path:Path) -> dict:
 
 
 #---------------------- txt ----------------------#
-def save_txt(data:str, file_path:Path, mode='w'):
+def save_txt(data:str, file_path:Path, mode='w', atomic=False):
+    """ Save text to a file
+    :param atomic: write to a temp file and rename it (readers never see a half written file, only mode 'w')
+    """
+    file_path = Path(file_path)  # Make sure path is a Path object
 
     # Create folder if it doesn't exist
     create_dir(file_path.parent)
 
+    if atomic:
+        file_path_temp = file_path.with_name(f'{file_path.stem}.{os.getpid()}.tmp')
+        with open(file_path_temp, mode='w') as file:
+            file.write(data)
+        os.replace(file_path_temp, file_path)
+        return
+
     with open(file_path, mode=mode) as file:
-        file.write(data)
\ No newline at end of file
+        file.write(data)
+
+#---------------------- Jsonl ----------------------#
+def append_jsonl(record:dict, file_path:Path) -> None:
+    """ Append one record as a line to a jsonl file (append-only, the file is never rewritten)
+    :param record: json serializable dict
+    :param file_path: file path
+    """
+    file_path = Path(file_path)  # Make sure path is a Path object
+    create_dir(file_path.parent)
+    with open(file_path, mode='a', encoding='utf-8') as file:
+        file.write(json.dumps(record) + '\n')
+
+
+def load_jsonl(file_path:Path) -> list[dict]:
+    """ Load all records of a jsonl file
+    A truncated last line (process was killed while writing) is removed from the file, so appending can continue
+    :param file_path: file path
+    :return: list of records (empty list, if the file does not exist)
+    """
+    file_path = Path(file_path)  # Make sure path is a Path object
+    if not file_path.exists():
+        return []
+
+    records = []
+    valid_size = 0  # bytes of the complete lines
+    with open(file_path, mode='rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            valid_size += len(line)
+
+    # Cut the truncated rest
+    if valid_size < file_path.stat().st_size:
+        print(f'Warning: Cut truncated line at the end of "{file_path.name}"')
+        with open(file_path, mode='r+b') as file:
+            file.truncate(valid_size)
+    return records
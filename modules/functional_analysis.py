@@ -1,40 +1,73 @@
 import pandas as pd
 import numpy as np
 
+
+#------------------------- Arrays -------------------------#
+
+def zero_crossings(values) -> (np.ndarray, np.ndarray):
+    """ [array] Zero crossings of a line
+    :param values: 1-D float array
+    :return: indices of the crossings (int64), directions of the crossings (int8: 1 - up, -1 - down)
+
+    The sign 0 (and NaN) is a problem, it is replaced with the last sign (leading ones with the first sign)
+    Input:  [2, 1, -1, -1, -2, 3, 5, 4, -4, 0]
+    Output: [2, 5, 8], [-1, 1, -1]
+    """
+    sign = np.sign(np.asarray(values, dtype=float))
+    valid = sign != 0
+    valid &= ~np.isnan(sign)
+    if not valid.any():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8)
+    # Fill sign 0/NaN: forward with the last valid sign, backward with the first valid sign
+    index_valid = np.where(valid, np.arange(len(sign)), 0)
+    np.maximum.accumulate(index_valid, out=index_valid)
+    index_valid[:np.argmax(valid)] = np.argmax(valid)
+    sign = sign[index_valid]
+    # Crossing, if the sign changes (multiplication with the last sign < 0)
+    indices = np.flatnonzero(sign[1:] * sign[:-1] < 0) + 1
+    return indices, sign[indices].astype(np.int8)
+
+
+def crossings(values1, values2) -> (np.ndarray, np.ndarray):
+    """ [array] Crossings between two lines (if line 1 crosses line 2, then the diff crosses the zero line)
+    :param values1: 1-D float array
+    :param values2: 1-D float array
+    :return: indices of the crossings (int64), directions of the crossings (int8: 1 - line 1 crosses from bottom to top, -1 - from top to bottom)
+    """
+    return zero_crossings(np.asarray(values1, dtype=float) - np.asarray(values2, dtype=float))
+
+
+def crossing_labels(indices, directions, length:int) -> np.ndarray:
+    """ [array] Crossings as strings per row ('up', 'down', '')
+    :param indices: indices of the crossings
+    :param directions: directions of the crossings (1, -1)
+    :param length: amount of rows
+    :return: object array
+    """
+    labels = np.full(length, '', dtype=object)
+    labels[indices[directions > 0]] = 'up'
+    labels[indices[directions < 0]] = 'down'
+    return labels
+
+
+#------------------------- DataFrame -------------------------#
+
 def zero_crossing(df, col):
-    df_calc = df.copy()
-    df_calc['sign'] = np.sign(df_calc[col]) # sign (-1, 0, 1), 0 is a problem, replace it with last value
-    df_calc['sign'] = df_calc['sign'].replace(0, np.nan).ffill().bfill() # replace 0 with last value
-    df_calc['sign_shift1'] = df_calc['sign'].shift(1) # shift 1
-    # Calculate zero crossing (True, False)
-    df_calc['zero_crossing'] = (df_calc['sign'] * df_calc['sign_shift1'] < 0) # advanced calculation - mult. with with last sign
-    # Calculate direction of crossing (up, down)
-    conditions = [
-        df_calc['zero_crossing'] & (df_calc['sign'] > 0),  # above 0 -> 'up'
-        df_calc['zero_crossing'] & (df_calc['sign'] < 0)  # below 0 -> 'down'
-    ]
-    values = ['up', 'down']
-    df_calc['zero_crossing_dir'] = np.select(conditions, values, default='')
-    #print(df_calc)
-    # Result
-    df = pd.merge(df, df_calc[['zero_crossing_dir']], on='date', how='left')
+    """ [df[zero_crossing_dir]] Zero crossings of a column (wrapper of zero_crossings)
+    :return: df (copy) with the new column, ['zero_crossing_dir']
+    """
+    indices, directions = zero_crossings(df[col].to_numpy(dtype=float))
     cols = ['zero_crossing_dir']
+    df = df.assign(**{cols[0]: crossing_labels(indices, directions, len(df))})
     return df, cols
 
 
 def calculate_crossings(df, col1, col2):
-    """ Calculate crossing between two lines (columns)
-    :return:
+    """ [df[Crossing_col1-col2]] Calculate crossing between two lines (columns) (wrapper of crossings)
+    :return: df (copy) with the new column ['up', 'down', ''], [name of the new column]
     """
     name_crossing = f'Crossing_{col1}-{col2}'
-    # Diff
-    df_calc = df.copy()
-    df_calc['diff'] = df[col1] - df[col2]
-    # If col1 crosses col2, then diff crosses the zero line
-    df_calc, cols = zero_crossing(df_calc, 'diff')      # cols = ['zero_crossing', 'zero_crossing_dir']
-    #print(df_calc)
-    # Result
-    df = pd.merge(df, df_calc[[cols[0]]], on='date', how='left')
-    df = df.rename(columns={cols[0]: name_crossing})
+    indices, directions = crossings(df[col1].to_numpy(dtype=float), df[col2].to_numpy(dtype=float))
+    df = df.assign(**{name_crossing: crossing_labels(indices, directions, len(df))})
     cols = [name_crossing]
-    return df, cols
\ No newline at end of file
+    return df, cols
@@ -0,0 +1,230 @@
+""" # Aim
+Cache for indicator results (content addressed)
+
+Key:    hash(df['close'] with index) + indicator name + params
+Value:  columns which the indicator adds to df[close]
+
+2 tiers:
+- memory: LRU (OrderedDict), evicted by size
+- disk: pickle files in data/cache/indicator, evicted by size (the oldest used files first)
+        shared by all processes (pool workers) -> every process rescans the folder size after it wrote
+        DISK_RESCAN_SHARE of the max size and evicts based on this total (the cap holds for all processes together)
+
+The cache is disabled by default -> enable_indicator_cache()
+func_indicator() reads through the cache, if it is enabled
+"""
+
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+import pandas as pd
+
+from modules.file_handler import get_path, create_dir
+
+
+DISK_RESCAN_SHARE = 0.1         # [disk] rescan the folder size after this share of disk_size_mb was written by the process
+
+
+_settings = {}                  # empty - cache disabled
+_memory_cache = OrderedDict()   # {key: (df_indicator, size)} - the last used entry at the end
+_state = {
+    'memory_size': 0,           # bytes of all df in _memory_cache
+    'disk_size': None,          # bytes of all files in the disk cache at the last scan (None - not scanned yet)
+    'disk_written': 0,          # bytes written by this process since the last scan
+    'hits_memory': 0,
+    'hits_disk': 0,
+    'misses': 0,
+}
+
+
+#---------------------- Settings ----------------------#
+def enable_indicator_cache(memory_size_mb:float=256, disk_size_mb:float=2048, folder_path:Path=None) -> None:
+    """ Enable the indicator cache
+    :param memory_size_mb: max size of the memory tier (0 - no memory tier)
+    :param disk_size_mb: max size of the disk tier (0 - no disk tier)
+    :param folder_path: folder of the disk tier (default data/cache/indicator)
+    """
+    if memory_size_mb < 0 or disk_size_mb < 0:
+        raise ValueError(f'Cache size must be >= 0: memory_size_mb={memory_size_mb}, disk_size_mb={disk_size_mb}')
+    if not folder_path:
+        folder_path = get_path('cache') / 'indicator'
+    _settings.clear()
+    _settings.update({
+        'memory_size_mb': memory_size_mb,
+        'disk_size_mb': disk_size_mb,
+        'folder_path': Path(folder_path),
+    })
+    _state['disk_size'] = None
+    _state['disk_written'] = 0
+
+
+def disable_indicator_cache() -> None:
+    """ Disable the indicator cache and clear the memory tier (the disk tier remains)
+    """
+    _settings.clear()
+    clear_indicator_cache(disk=False)
+
+
+def indicator_cache_enabled() -> bool:
+    return bool(_settings)
+
+
+def get_indicator_cache_settings() -> dict|None:
+    """ Settings to enable the same cache in another process - enable_indicator_cache(**settings)
+    :return: dict of the settings (None, if the cache is disabled)
+    """
+    return dict(_settings) if _settings else None
+
+
+def get_indicator_cache_info() -> dict:
+    """ Statistics of the cache
+    :return: {'hits_memory', 'hits_disk', 'misses', 'memory_entries', 'memory_size_mb'}
+    """
+    return {
+        'hits_memory': _state['hits_memory'],
+        'hits_disk': _state['hits_disk'],
+        'misses': _state['misses'],
+        'memory_entries': len(_memory_cache),
+        'memory_size_mb': round(_state['memory_size'] / 2**20, 2),
+    }
+
+
+def clear_indicator_cache(disk=False) -> None:
+    """ Clear the memory tier (and the disk tier)
+    :param disk: delete also all files of the disk tier
+    """
+    _memory_cache.clear()
+    _state['memory_size'] = 0
+    if disk and _settings and _settings['folder_path'].exists():
+        for file_path in _settings['folder_path'].glob('*.pkl'):
+            file_path.unlink(missing_ok=True)
+        _state['disk_size'] = 0
+        _state['disk_written'] = 0
+
+
+#---------------------- Read / Write ----------------------#
+def indicator_cache_key(indicator_name:str, df:pd.DataFrame, params=None, engine:str='pandas_ta') -> str:
+    """ Content address of an indicator result
+    :param indicator_name: indicator name
+    :param df: df[close]
+    :param params: params for the indicator [None, dict, list]
+    :param engine: engine of func_indicator() (the keys of 'pandas_ta' are the same as before the engines)
+    :return: hex digest
+
+    The params are not sorted, because func_indicator() passes the values of a dict in order
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(pd.util.hash_pandas_object(df['close'], index=True).to_numpy().tobytes())
+    h.update(indicator_name.encode())
+    h.update(json.dumps(params).encode())
+    if engine != 'pandas_ta':
+        h.update(engine.encode())
+    return h.hexdigest()
+
+
+def load_indicator_cache(key:str) -> pd.DataFrame|None:
+    """ Return the cached indicator columns (memory tier first, then disk tier)
+    :param key: indicator_cache_key()
+    :return: df_indicator (None, if not cached)
+    """
+    # Memory
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        _state['hits_memory'] += 1
+        return _memory_cache[key][0]
+
+    # Disk
+    if _settings['disk_size_mb']:
+        file_path = _settings['folder_path'] / f'{key}.pkl'
+        try:
+            df_indicator = pd.read_pickle(file_path)
+            os.utime(file_path)  # last used (for the eviction)
+        except (FileNotFoundError, EOFError, OSError, ValueError):
+            df_indicator = None
+        if df_indicator is not None:
+            _state['hits_disk'] += 1
+            _save_memory(key, df_indicator)
+            return df_indicator
+
+    _state['misses'] += 1
+    return None
+
+
+def save_indicator_cache(key:str, df_indicator:pd.DataFrame) -> None:
+    """ Save the indicator columns in both tiers
+    :param key: indicator_cache_key()
+    :param df_indicator: columns, which the indicator added to df[close]
+    """
+    df_indicator = df_indicator.copy()
+    _save_memory(key, df_indicator)
+    if _settings['disk_size_mb']:
+        _save_disk(key, df_indicator)
+
+
+def _save_memory(key:str, df_indicator:pd.DataFrame) -> None:
+    max_size = _settings['memory_size_mb'] * 2**20
+    size = int(df_indicator.memory_usage(index=True).sum())
+    if size > max_size:
+        return
+    if key in _memory_cache:
+        _state['memory_size'] -= _memory_cache.pop(key)[1]
+    _memory_cache[key] = (df_indicator, size)  # size at insert (memory_usage grows with the index engine)
+    _state['memory_size'] += size
+    # Evict the least recently used entries
+    while _state['memory_size'] > max_size:
+        _, (_, size_evicted) = _memory_cache.popitem(last=False)
+        _state['memory_size'] -= size_evicted
+
+
+def _save_disk(key:str, df_indicator:pd.DataFrame) -> None:
+    folder_path = _settings['folder_path']
+    max_size = _settings['disk_size_mb'] * 2**20
+    create_dir(folder_path)
+    if _state['disk_size'] is None:
+        _scan_disk()
+
+    # Write to a temp file and rename it (other processes never read a half written file)
+    file_path = folder_path / f'{key}.pkl'
+    file_path_temp = folder_path / f'{key}.{os.getpid()}.tmp'
+    df_indicator.to_pickle(file_path_temp)
+    os.replace(file_path_temp, file_path)
+    _state['disk_written'] += file_path.stat().st_size
+
+    # Other processes write to the same folder -> evict only based on a fresh scan of the folder
+    if _state['disk_written'] > DISK_RESCAN_SHARE * max_size or _state['disk_size'] + _state['disk_written'] > max_size:
+        files = _scan_disk()
+        if _state['disk_size'] > max_size:
+            _evict_disk(files)
+
+
+def _scan_disk() -> list:
+    """ Scan the files of the disk tier (all processes) and reset the bytes written since the last scan
+    :return: [(last used, size, file_path), ...] sorted by last used
+    """
+    files = []
+    for file_path in _settings['folder_path'].glob('*.pkl'):
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:  # evicted by another process
+            continue
+        files.append((stat.st_mtime, stat.st_size, file_path))
+    files.sort()
+    _state['disk_size'] = sum(size for _, size, _ in files)
+    _state['disk_written'] = 0
+    return files
+
+
+def _evict_disk(files:list) -> None:
+    """ Delete the least recently used files, until the disk tier is 80 % of the max size
+    :param files: _scan_disk()
+    """
+    disk_size = _state['disk_size']
+    target_size = 0.8 * _settings['disk_size_mb'] * 2**20
+    for _, size, file_path in files:
+        if disk_size <= target_size:
+            break
+        file_path.unlink(missing_ok=True)
+        disk_size -= size
+    _state['disk_size'] = disk_size
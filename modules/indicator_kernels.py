@@ -0,0 +1,182 @@
+""" # Aim
+NumPy kernels of the indicators BB, EMA, SMA, RSI and MACD (without pandas_ta and without pd.Series)
+
+Input:  close (1-D array) and one or more lengths
+Output: 2-D arrays [len(lengths), len(close)] - row i belongs to lengths[i], NaN in the leading time
+
+Same definitions as pandas_ta:
+- SMA:  rolling mean
+- EMA:  ewm(span=length, adjust=False), seeded with the SMA of the first length samples (ta.ema, EMABank)
+- MACD: EMA(fast) - EMA(slow), signal line = EMA of the MACD line after its leading NaN (ta.macd)
+- BB:   SMA +- std * rolling standard deviation (ddof=0 like pandas_ta 0.3.14b0, newer versions default to ddof=1)
+- RSI:  Wilder's moving average of the gains and losses like pandas_ta 0.3.14b0 (ewm(alpha=1/length, adjust=True),
+        valid from sample length) - newer versions use adjust=False, the difference decays slowly for long lengths
+
+The recursive filters (EMA, RSI) are calculated for all lengths at once with a prefix scan (vectorized steps instead of a loop)
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+DECAY_EPS = 1e-18  # [EMA, RSI] earlier samples with a weight below this factor are cut (below float64 precision)
+
+
+def sma_kernel(close, lengths) -> np.ndarray:
+    """ [2-D] Simple Moving Average
+    :param close: 1-D array
+    :param lengths: int or list of ints
+    :return: sma [len(lengths), len(close)]
+    """
+    close, lengths = _as_close(close), _as_lengths(lengths)
+    csum = np.concatenate([[0.0], np.cumsum(close)])
+    end = np.arange(1, len(close) + 1)
+    start = end[None, :] - lengths[:, None]
+    sma = (csum[None, end] - csum[np.maximum(start, 0)]) / lengths[:, None]
+    sma[start < 0] = np.nan
+    return sma
+
+
+def ema_kernel(close, lengths) -> np.ndarray:
+    """ [2-D] Exponential Moving Average (like ta.ema - seeded with the SMA of the first length samples)
+    :param close: 1-D array
+    :param lengths: int or list of ints
+    :return: ema [len(lengths), len(close)]
+    """
+    close, lengths = _as_close(close), _as_lengths(lengths)
+    values = np.broadcast_to(close, (len(lengths), len(close)))
+    return _ema_rows(values, lengths, np.zeros(len(lengths), dtype=np.int64))
+
+
+def macd_kernel(close, fast, slow, signal) -> (np.ndarray, np.ndarray, np.ndarray):
+    """ [2-D] Moving Average Convergence Divergence (like ta.macd, fast and slow are swapped if slow < fast)
+    :param close: 1-D array
+    :param fast: int or list of ints
+    :param slow: int or list of ints
+    :param signal: int or list of ints (fast, slow and signal are broadcast to the same amount of rows)
+    :return: macd, histogram, signal line - each [amount params, len(close)]
+
+    Every EMA length is calculated only once (params sweep)
+    """
+    close = _as_close(close)
+    fast, slow, signal = np.broadcast_arrays(_as_lengths(fast), _as_lengths(slow), _as_lengths(signal))
+    fast, slow = np.minimum(fast, slow), np.maximum(fast, slow)
+    lengths, inverse = np.unique(np.concatenate([fast, slow]), return_inverse=True)
+    emas = ema_kernel(close, lengths)
+    macd = emas[inverse[:len(fast)]] - emas[inverse[len(fast):]]
+    signalma = _ema_rows(macd, signal, slow - 1)  # EMA of the MACD line after its leading NaN
+    return macd, macd - signalma, signalma
+
+
+def bbands_kernel(close, lengths, std=2.0, ddof:int=0) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+    """ [2-D] Bollinger Bands
+    :param close: 1-D array
+    :param lengths: int or list of ints
+    :param std: factor of the standard deviation (float or one per length)
+    :param ddof: delta degrees of freedom of the standard deviation
+    :return: lower, mid, upper, bandwidth, percent - each [len(lengths), len(close)]
+    """
+    close, lengths = _as_close(close), _as_lengths(lengths)
+    std = np.broadcast_to(np.asarray(std, dtype=float), lengths.shape)
+    mid = np.full((len(lengths), len(close)), np.nan)
+    deviation = np.full((len(lengths), len(close)), np.nan)
+    for length in np.unique(lengths):
+        if length > len(close) or length <= ddof:
+            continue
+        # Windows as view (no copy), the standard deviation of every window is calculated around its own mean
+        windows = sliding_window_view(close, length)
+        rows = lengths == length
+        mid[rows, length - 1:] = windows.mean(axis=1)
+        deviation[rows, length - 1:] = windows.std(axis=1, ddof=ddof)
+    lower = mid - std[:, None] * deviation
+    upper = mid + std[:, None] * deviation
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bandwidth = 100 * (upper - lower) / mid
+        percent = (close[None, :] - lower) / (upper - lower)
+    return lower, mid, upper, bandwidth, percent
+
+
+def rsi_kernel(close, lengths, scalar:float=100) -> np.ndarray:
+    """ [2-D] Relative Strength Index
+    :param close: 1-D array
+    :param lengths: int or list of ints
+    :param scalar: upper limit of the RSI
+    :return: rsi [len(lengths), len(close)] (valid from sample length)
+    """
+    close, lengths = _as_close(close), _as_lengths(lengths)
+    n = len(close)
+    diff = np.diff(close, prepend=np.nan)
+    moves = np.stack([np.clip(diff, 0, None), np.clip(-diff, 0, None)])  # gains, losses
+    # Weighted mean from the first diff on (adjust=True): avg[t] = sum[t] / sum of the weights, sum[t] = (1 - alpha) * sum[t-1] + move[t]
+    # -> gains and losses have the same sum of the weights, the RSI is the ratio of the sums
+    decay = np.repeat(1.0 - 1.0 / lengths, 2)[:, None]
+    t = np.arange(n)[None, :]
+    values = np.where(t >= 1, np.tile(moves, (len(lengths), 1)), 0.0)
+    decay = np.where(t >= 2, decay, 0.0)
+    sums = _linear_scan(decay, values).reshape(len(lengths), 2, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = scalar * sums[:, 0] / (sums[:, 0] + sums[:, 1])
+    rsi[t < lengths[:, None]] = np.nan
+    return rsi
+
+
+#---------------------- Helper ----------------------#
+
+def _as_close(close) -> np.ndarray:
+    close = np.asarray(close, dtype=float)
+    if close.ndim != 1:
+        raise ValueError(f'close must be a 1-D array: {close.shape}')
+    return close
+
+
+def _as_lengths(lengths) -> np.ndarray:
+    lengths = np.atleast_1d(np.asarray(lengths))
+    if lengths.ndim != 1 or not np.all(lengths == np.round(lengths)) or np.any(lengths < 1):
+        raise ValueError(f'Lengths must be positive integers: {lengths}')
+    return lengths.astype(np.int64)
+
+
+def _ema_rows(values:np.ndarray, lengths:np.ndarray, starts:np.ndarray) -> np.ndarray:
+    """ [2-D] EMA of every row (row i: samples from starts[i] on, seeded with the mean of the first lengths[i] samples)
+    :param values: 2-D array [rows, n]
+    :param lengths: EMA length per row
+    :param starts: first sample per row (samples before are ignored)
+    :return: ema [rows, n] (NaN before the seed, all NaN if the row is too short)
+    """
+    rows, n = values.shape
+    seeds = starts + lengths - 1
+    alpha = (2.0 / (lengths + 1.0))[:, None]
+    t = np.arange(n)[None, :]
+    after_seed = t > seeds[:, None]
+    decay = np.where(after_seed, 1.0 - alpha, 0.0)
+    scan_values = np.where(after_seed, alpha * values, 0.0)
+    # Seed: mean of the first length samples
+    valid = seeds < n
+    csum = np.cumsum(np.where(t >= starts[:, None], values, 0.0), axis=1)
+    index = np.flatnonzero(valid)
+    scan_values[index, seeds[index]] = csum[index, seeds[index]] / lengths[index]
+    ema = _linear_scan(decay, scan_values)
+    ema[(t < seeds[:, None]) | ~valid[:, None]] = np.nan
+    return ema
+
+
+def _linear_scan(decay:np.ndarray, values:np.ndarray) -> np.ndarray:
+    """ [2-D] y[t] = decay[t] * y[t-1] + values[t] for every row (prefix scan, Hillis-Steele)
+    :param decay: 2-D array with values in [0, 1) (0 - restart at this sample)
+    :param values: 2-D array
+    :return: y
+
+    Step with shift s: every sample adds the partial sum s samples before (weighted with the product of the decays between)
+    -> log2(n) vectorized steps instead of a loop over n samples.
+    The products of the decays are at most max(decay) ** shift, the scan stops if they are below DECAY_EPS
+    (the rest of the sum is below the precision of float64 -> log2(~40 x length) steps, independent of n)
+    """
+    decay = decay.copy()
+    y = values.copy()
+    decay_max = float(decay.max(initial=0.0))
+    shift = 1
+    while shift < y.shape[1] and decay_max ** shift > DECAY_EPS:
+        y[:, shift:] += decay[:, shift:] * y[:, :-shift]
+        decay[:, shift:] *= decay[:, :-shift]
+        shift *= 2
+    return y
@@ -1,8 +1,11 @@
 import re
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
-import pandas_ta as ta
 
 from modules.utils import get_period
+from modules.indicator_cache import indicator_cache_enabled, indicator_cache_key, load_indicator_cache, save_indicator_cache
+from modules.indicator_kernels import sma_kernel, ema_kernel, macd_kernel, bbands_kernel, rsi_kernel
 
 INDICATOR_COL_NAMES = {
     'BB': [r'BBL.*', r'BBM.*', r'BBU.*'], # ['BBL_5_2.0', 'BBM_5_2.0', 'BBU_5_2.0', 'BBB_5_2.0', 'BBP_5_2.0'] - [Low, SMA, Up, Bandwith, Percentage]
@@ -15,19 +18,40 @@ INDICATOR_COL_NAMES = {
     'perc': [r'perc.*'],
 }
 
-def func_indicator(indicator_name:str, df:pd.DataFrame, params=None):
+INDICATOR_ENGINES = ['pandas_ta', 'numpy']  # numpy - kernels of modules/indicator_kernels.py (BB, EMA, MACD, RSI, SMA)
+
+_ema_bank = {'bank': None}  # active EMABank (set by ema_bank())
+_ema_banks = {}              # {course key: EMABank} - EMAs of every course for the whole study (until clear_ema_banks())
+_engine = {'engine': 'pandas_ta'}  # default engine of func_indicator() (set by set_indicator_engine())
+
+def func_indicator(indicator_name:str, df:pd.DataFrame, params=None, engine:str=None):
     """
     :param indicator_name: name for the indicator defined in this file
     :param df: df[close]
     :param params: params for the indicator [None, dict, list]
-    :return: _indicator_{indicator_name}(df, params)
+    :param engine: calculation of the indicator [None - set_indicator_engine(), 'pandas_ta', 'numpy']
+    :return: _indicator_{indicator_name}(df, params) - engine 'numpy': _numpy_indicator_{indicator_name}(df, params)
+
+    If the indicator cache is enabled, the indicator columns are read from / saved to the cache
+    Indicators without a NumPy kernel (e.g. CMA) are calculated the same way by both engines
     """
+    engine = engine or _engine['engine']
+    if engine not in INDICATOR_ENGINES:
+        raise ValueError(f'Engine "{engine}" not in {INDICATOR_ENGINES}')
     func_name = f'_indicator_{indicator_name}'
+    if engine == 'numpy' and callable(globals().get(f'_numpy_indicator_{indicator_name}')):
+        func_name = f'_numpy_indicator_{indicator_name}'
     n_col = len(df.columns)
     # Check if function is defined
     func = globals().get(func_name)
     if not callable(func):
         raise ValueError(f'The function "{func_name}" does not exist - define it in indicators.py')
+    # Cache
+    cache_key = indicator_cache_key(indicator_name, df, params, engine) if indicator_cache_enabled() else None
+    if cache_key:
+        df_indicator = load_indicator_cache(cache_key)
+        if df_indicator is not None:
+            return pd.concat([df, df_indicator], axis=1)
     # Return called function
     if params:
         if isinstance(params, dict):
@@ -47,9 +71,23 @@ def func_indicator(indicator_name:str, df:pd.DataFrame, params=None):
         """
         raise ValueError(f'Data for calculating the indicator {indicator_name} was to short: {len(df)} -> no calculation of the signals')
 
+    if cache_key:
+        save_indicator_cache(cache_key, df.iloc[:, n_col:])
     return df
 
 
+def set_indicator_engine(engine:str) -> None:
+    """ Default engine of func_indicator() ['pandas_ta', 'numpy']
+    """
+    if engine not in INDICATOR_ENGINES:
+        raise ValueError(f'Engine "{engine}" not in {INDICATOR_ENGINES}')
+    _engine['engine'] = engine
+
+
+def get_indicator_engine() -> str:
+    return _engine['engine']
+
+
 def keys_func_indicator():
     """ [func] Return all keys with which you can call the function func_indicator(key)
     :return: list[keys]
@@ -111,6 +149,14 @@ def _indicator_CMA(df):
 
 #------------- Indicators from pandas_ta -------------#
 
+def _ta():
+    """ pandas_ta - imported on first use (the import costs more than most indicator calculations and pulls in scipy,
+    a MACD sweep with ema_bank() does not need it at all)
+    """
+    import pandas_ta
+    return pandas_ta
+
+
 def _indicator_BB(df, length=6, std=2.0):
     """ Bollinger Bands (BB)
     :param length: SMA samples
@@ -121,7 +167,7 @@ def _indicator_BB(df, length=6, std=2.0):
     Bearish: close > upper band -> if course is larger than the upper band
     Bullish: close < lower band -> if course is smaller than the lower band
     """
-    df_indicator = ta.bbands(df['close'], length=length, std=std)
+    df_indicator = _ta().bbands(df['close'], length=length, std=std)
     df = pd.concat([df, df_indicator], axis=1)
     return df
 
@@ -131,7 +177,11 @@ def _indicator_EMA(df, length=2):
     :param length: samples
     :return: df['EMA_200']
     """
-    df[f'EMA_{length}'] = ta.ema(df['close'], length=length)
+    bank = _get_active_ema_bank(df['close'])
+    if bank:
+        df[f'EMA_{length}'] = bank.ema(length)
+    else:
+        df[f'EMA_{length}'] = _ta().ema(df['close'], length=length)
     return df
 
 
@@ -145,8 +195,14 @@ def _indicator_MACD(df, fast=12, slow=26, signal=9):
     Spot changes in the strength, direction, momentum, and duration of a trend in a stock
     buy: when the MACD crosses the signal line from bottom to top
     sell: when the MACD crosses the signal line from top to bottom
+
+    Inside ema_bank() the EMAs are taken from the bank (params sweep)
     """
-    df_indicator = ta.macd(df['close'], fast=fast, slow=slow, signal=signal)
+    bank = _get_active_ema_bank(df['close'])
+    if bank:
+        df_indicator = bank.macd(fast=fast, slow=slow, signal=signal)
+    else:
+        df_indicator = _ta().macd(df['close'], fast=fast, slow=slow, signal=signal)
     df = pd.concat([df, df_indicator], axis=1)
     return df
 
@@ -160,7 +216,7 @@ def _indicator_RSI(df, length=14, lower_border=30, upper_border=70):
     sell: RSI >= upper border -> too high -> sell | crossing from above under 70
     buy: RSI <= lower border -> too low -> buy | crossing from below over 30
     """
-    df[f'RSI_{length}'] = ta.rsi(df['close'], length=length)
+    df[f'RSI_{length}'] = _ta().rsi(df['close'], length=length)
     df[['border_lower_30', 'border_upper_70']] = [lower_border, upper_border]
     return df
 
@@ -170,5 +226,208 @@ def _indicator_SMA(df, length=200):
     :param length: samples
     :return: df['SMA_200']
     """
-    df[f'SMA_{length}'] = ta.sma(df['close'], length=length)
+    df[f'SMA_{length}'] = _ta().sma(df['close'], length=length)
+    return df
+
+
+#------------- Indicators from the NumPy kernels (engine='numpy') -------------#
+# Same columns as the pandas_ta indicators (names like pandas_ta 0.3.14b0), nothing is added if the course is too short
+
+def _numpy_indicator_BB(df, length=6, std=2.0):
+    """ Bollinger Bands (BB) - see _indicator_BB (standard deviation with ddof=0)
+    :return: df['BBL_5_2.0', 'BBM_5_2.0', 'BBU_5_2.0', 'BBB_5_2.0', 'BBP_5_2.0']
+    """
+    length, std = int(length), float(std)
+    close = df['close'].to_numpy(dtype=float)
+    if len(close) < length:
+        return df
+    props = f'_{length}_{std}'
+    lower, mid, upper, bandwidth, percent = bbands_kernel(close, length, std)
+    return df.assign(**{f'BBL{props}': lower[0], f'BBM{props}': mid[0], f'BBU{props}': upper[0],
+                        f'BBB{props}': bandwidth[0], f'BBP{props}': percent[0]})
+
+
+def _numpy_indicator_EMA(df, length=2):
+    """ Exponential Moving Average (EMA) - see _indicator_EMA
+    :return: df['EMA_200']
+    """
+    length = int(length)
+    close = df['close'].to_numpy(dtype=float)
+    if len(close) < length:
+        return df
+    df[f'EMA_{length}'] = ema_kernel(close, length)[0]
+    return df
+
+
+def _numpy_indicator_MACD(df, fast=12, slow=26, signal=9):
+    """ Moving Average Convergence Divergence (MACD) - see _indicator_MACD (default values and swap like ta.macd)
+    :return: df['MACD_12_26_9', 'MACDh_12_26_9', 'MACDs_12_26_9']
+    """
+    fast = int(fast) if fast and fast > 0 else 12
+    slow = int(slow) if slow and slow > 0 else 26
+    signal = int(signal) if signal and signal > 0 else 9
+    if slow < fast:
+        fast, slow = slow, fast
+    close = df['close'].to_numpy(dtype=float)
+    if len(close) < max(fast, slow, signal):
+        return df
+    props = f'_{fast}_{slow}_{signal}'
+    macd, histogram, signalma = macd_kernel(close, fast, slow, signal)
+    return df.assign(**{f'MACD{props}': macd[0], f'MACDh{props}': histogram[0], f'MACDs{props}': signalma[0]})
+
+
+def _numpy_indicator_RSI(df, length=14, lower_border=30, upper_border=70):
+    """ Relative Strength Index (RSI) - see _indicator_RSI (valid from sample length)
+    :return: df['RSI_14', 'border_lower_30', 'border_upper_70']
+    """
+    length = int(length)
+    close = df['close'].to_numpy(dtype=float)
+    if len(close) < length + 1:
+        return df
+    df[f'RSI_{length}'] = rsi_kernel(close, length)[0]
+    df[['border_lower_30', 'border_upper_70']] = [lower_border, upper_border]
+    return df
+
+
+def _numpy_indicator_SMA(df, length=200):
+    """ Simple Moving Average (SMA) - see _indicator_SMA
+    :return: df['SMA_200']
+    """
+    length = int(length)
+    close = df['close'].to_numpy(dtype=float)
+    if len(close) < length:
+        return df
+    df[f'SMA_{length}'] = sma_kernel(close, length)[0]
     return df
+
+
+#------------- EMA bank (params sweep) -------------#
+
+class EMABank:
+    """
+    EMAs of one close series - every EMA length (and every MACD line) is calculated only once.
+    In a MACD params sweep most (fast, slow, signal) variations share their EMA lengths.
+    The calculation is the same as in pandas_ta (ta.ema, ta.macd) -> same numbers and column names.
+    """
+
+    def __init__(self, close:pd.Series):
+        self.close = close.copy()           # close series of the bank
+
+        # Calculated at runtime
+        self._emas = {}                     # {length: ema}
+        self._macd_lines = {}               # {(fast, slow): ema(fast) - ema(slow) as array}
+
+
+    def matches(self, close:pd.Series) -> bool:
+        """ Return True, if close is the close series of the bank
+        Identity or copy of the same course (the bank belongs to one course key) - checked in O(1) by the length,
+        the first and last date and the first and last close (no compare of the whole series per lookup)
+        """
+        if close is self.close:
+            return True
+        if len(close) != len(self.close) or len(close) == 0:
+            return False
+        return (close.index[0] == self.close.index[0] and close.index[-1] == self.close.index[-1]
+                and close.iloc[0] == self.close.iloc[0] and close.iloc[-1] == self.close.iloc[-1])
+
+
+    def clear_macd_lines(self) -> None:
+        """ Release the MACD lines (only shared by the signal lengths of neighbouring params variations, the EMAs remain)
+        """
+        self._macd_lines.clear()
+
+
+    def ema(self, length=10) -> pd.Series|None:
+        """ ta.ema(close, length)
+        :return: ema (None, if the close series is too short)
+        """
+        length = int(length) if length and length > 0 else 10
+        if length not in self._emas:
+            self._emas[length] = _ema_sma_seeded(self.close, length)
+        return self._emas[length]
+
+
+    def macd(self, fast=12, slow=26, signal=9) -> pd.DataFrame|None:
+        """ ta.macd(close, fast, slow, signal)
+        :return: df['MACD_12_26_9', 'MACDh_12_26_9', 'MACDs_12_26_9'] (None, if the close series is too short)
+        """
+        fast = int(fast) if fast and fast > 0 else 12
+        slow = int(slow) if slow and slow > 0 else 26
+        signal = int(signal) if signal and signal > 0 else 9
+        if slow < fast:
+            fast, slow = slow, fast
+        if len(self.close) < max(fast, slow, signal):
+            return None
+
+        # MACD line (shared by all signal lengths)
+        if (fast, slow) not in self._macd_lines:
+            self._macd_lines[(fast, slow)] = (self.ema(fast) - self.ema(slow)).to_numpy()
+        macd = self._macd_lines[(fast, slow)]
+        # Signal line (EMA of the MACD line after its leading NaN)
+        first_valid = int(np.argmax(~np.isnan(macd)))
+        signalma_valid = _ema_sma_seeded(pd.Series(macd[first_valid:]), signal)
+        if signalma_valid is None:
+            return None
+        signalma = np.full(len(macd), np.nan)
+        signalma[first_valid:] = signalma_valid.to_numpy()
+        histogram = macd - signalma
+
+        props = f'_{fast}_{slow}_{signal}'
+        return pd.DataFrame({
+            f'MACD{props}': macd,
+            f'MACDh{props}': histogram,
+            f'MACDs{props}': signalma,
+        }, index=self.close.index)
+
+
+def _ema_sma_seeded(close:pd.Series, length:int) -> pd.Series|None:
+    """ EMA like ta.ema (seeded with the SMA of the first length samples)
+    :return: ema (None, if close is shorter than length)
+    """
+    if len(close) < length:
+        return None
+    close = close.copy()
+    sma_nth = close.iloc[0:length].mean()
+    close.iloc[:length - 1] = np.nan
+    close.iloc[length - 1] = sma_nth
+    return close.ewm(span=length, adjust=False).mean()
+
+
+@contextmanager
+def ema_bank(close:pd.Series, key=None):
+    """ [MACD sweep] Calculate the EMAs of close only once for all indicators in this block
+    :param close: df['close'] of the course
+    :param key: course key (e.g. get_course_cache_key()) - the bank is kept for further blocks of the same course
+                until clear_ema_banks() (end of the study), None - bank only for this block
+    :return: EMABank
+
+    with ema_bank(df['close'], get_course_cache_key(course_path)):
+        for params in params_variations:
+            df_params = func_indicator('MACD', df.copy(), params)   # EMAs from the bank
+    """
+    bank = _ema_banks.get(key) if key is not None else None
+    if bank is None or not bank.matches(close):
+        bank = EMABank(close)
+        if key is not None:
+            _ema_banks[key] = bank
+    previous = _ema_bank['bank']
+    _ema_bank['bank'] = bank
+    try:
+        yield bank
+    finally:
+        _ema_bank['bank'] = previous
+        bank.clear_macd_lines()  # memory - the (fast, slow) pairs of a study do not fit in memory
+
+
+def clear_ema_banks() -> None:
+    """ Release the EMA banks of all courses (end of the study) """
+    _ema_banks.clear()
+
+
+def _get_active_ema_bank(close:pd.Series) -> EMABank|None:
+    """ Return the active EMABank, if it belongs to close
+    """
+    bank = _ema_bank['bank']
+    if bank is not None and bank.matches(close):
+        return bank
+    return None
@@ -1,16 +1,18 @@
-import itertools
 import ast
+import math
 
 from modules.file_handler import get_path, load_yaml_from_file_path
 
 
-def get_params_variation(indicator_name, source_params:str|list|dict|None) -> list[dict|list[float]]:
+def get_params_variation(indicator_name, source_params:str|list|dict|None) -> 'list[dict|list[float]]|ParamSpace':
     """ Central function to get a list of params variations
     :param indicator_name: indicator name
-    :param source_params: source [key, list, dict]
-    :return: list of param variations
+    :param source_params: source [key, list, dict, ParamSpace]
+    :return: list of param variations (ParamSpace for a key from yaml - the combinations are calculated lazily)
     """
-    if isinstance(source_params, str):  # key from yaml (standard)
+    if isinstance(source_params, ParamSpace):  # already a params space
+        params_variations = source_params
+    elif isinstance(source_params, str):  # key from yaml (standard)
         # 'visualize' -> [{'m_fast': 10, 'm_slow': 20, 'm_signal': 30}, {'m_fast': 10, 'm_slow': 20, 'm_signal': 90}, ...]
         params_variations = get_all_params_variations_from_yaml(indicator_name, source_params)
     elif isinstance(source_params, list):
@@ -31,6 +33,37 @@ def get_params_variation(indicator_name, source_params:str|list|dict|None) -> li
     return params_variations
 
 
+def get_params_space(indicator_name, source_params:str|dict) -> dict[str, list]:
+    """ Grid of the params without calculating all combinations (for the model-guided search)
+    :param indicator_name: indicator name
+    :param source_params: source [key, dict]
+    :return: {key: [values]}
+
+    Input: ('MACD', 'brute_force')
+            brute_force: {
+              m_fast: (1, 100, 2)
+              m_slow: [15, 25]
+              m_signal: 9
+            }
+    Output: {'m_fast': [1.0, 3.0, ..., 99.0], 'm_slow': [15, 25], 'm_signal': [9]}
+    """
+    if isinstance(source_params, str):  # key from yaml (standard)
+        params = get_params_from_yaml(indicator_name, source_params)
+    elif isinstance(source_params, dict):
+        params = dict(source_params)
+    else:
+        raise ValueError(f'Wrong instance (not [str, dict] of source_params: {source_params}')
+    params_space = _set_param_variation(params)
+    for key, value in params_space.items():
+        if isinstance(value, (int, float)):
+            params_space[key] = [value]
+        elif not value:
+            raise ValueError(f'No values for {indicator_name} - {key}: {value}')
+        else:
+            params_space[key] = list(dict.fromkeys(value))  # without duplicates
+    return params_space
+
+
 def get_params_from_yaml(indicator_name, key_variant):
     """ Return params defined in indicator_params.yaml
     :param indicator_name: dict[key]
@@ -103,9 +136,98 @@ def get_all_params_variations_from_yaml(indicator_name, key_variant):
     for key, value in params_study.items():
         if isinstance(value, (int, float)):
             params_study[key] = [value]
-    # Calculate all combinations
-    keys = params_study.keys()
-    values = params_study.values()
-    combination = list(itertools.product(*values))
-    combinations_list = [dict(zip(keys, combi)) for combi in combination]  # combination_list = [{self.params1}, {self.params2}, ... ]
-    return combinations_list
+    # All combinations (calculated on access)
+    return ParamSpace(params_study)  # ParamSpace = [{self.params1}, {self.params2}, ... ]
+
+
+#---------------------- Params space ----------------------#
+
+class ParamSpace:
+    """
+    All combinations of a params grid {key: [values]} as lazy sequence - a params variation is only calculated on access.
+    Same order as itertools.product (the last key changes the fastest), so index i is always the same params variation.
+    The memory does not depend on the size of the grid (e.g. MACD brute_force ~ 280k params variations).
+    """
+
+    def __init__(self, grid:dict[str, list], start:int=0, stop:int=None):
+        self.grid = {key: list(values) for key, values in grid.items()}     # {key: [values]}
+        self.keys = list(self.grid.keys())
+        self.sizes = [len(values) for values in self.grid.values()]         # amount values per key
+        size = math.prod(self.sizes)
+        self.start = min(max(start, 0), size)                               # [start, stop) - range in the full grid
+        self.stop = size if stop is None else min(max(stop, self.start), size)
+
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+
+    def __getitem__(self, index:int|slice) -> 'dict|ParamSpace':
+        """ Params variation at index (slice -> ParamSpace of the range)
+        """
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError(f'ParamSpace only supports slices with step 1: {index}')
+            return ParamSpace(self.grid, self.start + start, self.start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f'ParamSpace index {index} out of range (len {len(self)})')
+        return self._params_at(self.start + index)
+
+
+    def __iter__(self):
+        for _, chunk in self.chunks():
+            yield from chunk
+
+
+    def __repr__(self) -> str:
+        return f'ParamSpace({self.grid}, start={self.start}, stop={self.stop})'
+
+
+    def chunks(self, size:int=1000):
+        """ [generator] Iterate over the params variations in chunks
+        :param size: params variations per chunk
+        :return: yield (index of the first params variation, list of params variations)
+        """
+        if size < 1:
+            raise ValueError(f'Chunk size must be >= 1: {size}')
+        for start in range(self.start, self.stop, size):
+            stop = min(start + size, self.stop)
+            # Only the first params variation of a chunk is decoded, the rest is counted up like itertools.product
+            positions = self._positions(start)
+            chunk = []
+            for _ in range(start, stop):
+                chunk.append({key: self.grid[key][i] for key, i in zip(self.keys, positions)})
+                for k in reversed(range(len(positions))):
+                    positions[k] += 1
+                    if positions[k] < self.sizes[k]:
+                        break
+                    positions[k] = 0
+            yield start - self.start, chunk
+
+
+    def shard(self, i:int, n:int) -> 'ParamSpace':
+        """ Part i of n (contiguous ranges of nearly the same size, together they cover the params space exactly once)
+        :param i: index of the shard (0 ... n-1)
+        :param n: amount of shards
+        :return: ParamSpace
+        """
+        if not (n >= 1 and 0 <= i < n):
+            raise ValueError(f'Wrong shard {i}/{n} - needs n >= 1 and 0 <= i < n')
+        return self[len(self) * i // n:len(self) * (i + 1) // n]
+
+
+    def _positions(self, index:int) -> list[int]:
+        """ Index in the full grid -> position in every value list
+        """
+        positions = []
+        for size in reversed(self.sizes):
+            index, position = divmod(index, size)
+            positions.append(position)
+        return positions[::-1]
+
+
+    def _params_at(self, index:int) -> dict:
+        return {key: self.grid[key][i] for key, i in zip(self.keys, self._positions(index))}
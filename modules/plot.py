@@ -1,36 +1,42 @@
 
 import numpy as np
+import matplotlib.pyplot as plt
 import matplotlib.patches as patches
-from matplotlib.pyplot import ylabel
-from scipy.stats import alpha
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PatchCollection, PolyCollection
 
 from modules.indicators import get_indicator_col_names
+from modules.strategy.df_signals_invested import get_invested_segments
 from modules.file_handler import *
 
 
 #---------------------- Lvl 2 - full figures (based on axes) ----------------------#
 
-def fig_invested_default(df, title=''):
+def fig_invested_default(df, title='', headless=False):
     """ [fig] Default plot
     - Plot 1: Course + Evaluation invested
+    :param headless: figure without pyplot (see get_subplots)
     """
     # Check columns
     minimal_columns = ['close', 'invested']
     if not set(minimal_columns).issubset(df.columns):
         raise AssertionError(f'Min requirement failed: not all columns {minimal_columns} in {df.columns}')
     # Default Plot
-    fig, ax = plt.subplots(1, 1)                     # 1 Plot
+    fig, ax = get_subplots(1, 1, headless=headless)  # 1 Plot
     # Plot 1 (Course with evaluation)
     ax_course(ax, df, True, True, True, True)  # Course
     ax_course_highlight_invested(ax, df, 'rect')             # Course with evaluation ['background', 'start_stop', 'interruption_line', 'rect']
     ax_properties(ax, title=title, xlabel='Date', ylabel='Chart') # Labels
-    plt_properties(plt)                                           # Labels
+    plt_properties(ax)                                            # Labels
     return fig
 
-def fig_invested_indicator(df, indicator_name, title1=None, title2=None, suptitle=None):
+def fig_invested_indicator(df, indicator_name, title1=None, title2=None, suptitle=None, headless=False):
     """ [fig] Plot indicator
     - Plot 1: Course + Evaluation invested
-    - Plot 2: Indicator + Evaluation signals (['buy', 'sell', 'bullish', 'bearish'] from indicators)
+    - Plot 2: Indicator + Evaluation signals (df[signal] [1, -1] from indicators)
+    :param headless: figure without pyplot (see get_subplots)
     """
     # Check columns
     minimal_columns = ['close', 'invested', 'signal']
@@ -38,20 +44,32 @@ def fig_invested_indicator(df, indicator_name, title1=None, title2=None, suptitl
         raise AssertionError(f'Min requirement failed: not all columns {minimal_columns} in {df.columns}')
 
     # Indicator
-    fig, ax = plt.subplots(2, 1, sharex=True)           # 2 Plots (share -> synch both plots during zoom)
+    fig, ax = get_subplots(2, 1, headless=headless, sharex=True)  # 2 Plots (share -> synch both plots during zoom)
     # Plot 1 (Course with evaluation)
     ax_course(ax[0], df, True, True, True, True) # Course
     ax_course_highlight_invested(ax[0], df, 'rect')             # Course with evaluation ['background', 'start_stop', 'interruption_line', 'rect']
     ax_properties(ax[0], title=title1, ylabel='Chart')               # Labels
     # Plot 2 (Indicator)
-    ax_highlight_signals_vertical_line(ax[1], df)                    # Evaluate df['signal'] -> [buy, sell, bullish, bearish]
+    ax_highlight_signals_vertical_line(ax[1], df)                    # Evaluate df['signal'] -> [1 buy/bullish, -1 sell/bearish]
     func_ax_indicator(indicator_name, ax[1], df)               # Indicator
     ax_properties(ax[1], title=title2, xlabel='Date', ylabel='Chart')# Labels
     fig_properties(fig, suptitle=suptitle)                           # Labels
-    plt_properties(plt)                                              # Labels
+    plt_properties(ax[1])                                            # Labels
     return fig
 
-def save_fig(fig, file_path=None):
+def get_subplots(nrows=1, ncols=1, headless=False, **kwargs):
+    """ [fig] plt.subplots() - or a headless figure
+    :param headless: Figure with the Agg canvas (object-oriented API, without pyplot and without GUI backend)
+        The figure is not retained by pyplot -> no plt.close() needed, it can be rendered in any (worker) process
+    :return: fig, ax
+    """
+    if headless:
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        return fig, fig.subplots(nrows, ncols, **kwargs)
+    return plt.subplots(nrows, ncols, **kwargs)
+
+def save_fig(fig, file_path=None, dpi:int=300):
     """ [fig] Save matplotlib fig
     Calculate folder path from strategy name (when this class is called first) | default temp
     Calculate file name (from global counter, symbol and params | default counter
@@ -73,7 +91,7 @@ def save_fig(fig, file_path=None):
         file_path = folder_path / f'{counter+1}.png'
 
     # Save plot
-    save_matplotlib_figure(fig, file_path.parent, file_path.stem, 'png')
+    save_matplotlib_figure(fig, file_path.parent, file_path.stem, 'png', dpi=dpi)
 
 
 #---------------------- Lvl 1.5 - highlight evaluation df[signal, invested]  ----------------------#
@@ -96,54 +114,93 @@ def ax_course_highlight_invested(ax, df, key='rect'):
 
 def _ax_course_highlight_invested_background(ax, df):
     """[ax]"""
-    # Background color for df[invested]
-    color_map = {1: 'green', 0: 'red', None: 'grey'}
-    for i in range(len(df) - 1):
-        color = color_map.get(df.iloc[i]['invested'], 'grey')
-        ax.axvspan(df.index[i], df.index[i + 1], color=color, alpha=0.1)
+    # Background color for df[invested] (day i until day i+1 in the color of day i)
+    invested = df['invested'].to_numpy(dtype=float)[:-1]
+    colors = np.where(invested == 1, 'green', np.where(invested == 0, 'red', 'grey'))
+    x = _x_values(df.index)
+    # 1 rect per run of the same color (instead of 1 axvspan per day)
+    change = np.flatnonzero(colors[1:] != colors[:-1]) + 1
+    starts = np.concatenate(([0], change)).astype(int)
+    ends = np.concatenate((change, [len(colors)])).astype(int)
+    rects = [patches.Rectangle((x[start], 0), x[end] - x[start], 1, color=colors[start], alpha=0.1)
+             for start, end in zip(starts, ends) if start < end]
+    # y in axes coordinates (full height like axvspan), the rects do not change the limits
+    ax.add_collection(PatchCollection(rects, match_original=True, transform=ax.get_xaxis_transform()), autolim=False)
 
 
 def _ax_course_highlight_invested_dots(ax, df):
     """[ax]"""
-    for index, group in df.groupby('group_invested'):
-        # Plot a dot at the first and last day of a invested group
-        ax.scatter(group.index[0], group.loc[group.index[0], 'close'], color='green', marker='o', label='buy' if index==1 else None)
-        ax.scatter(group.index[-1], group.loc[group.index[-1], 'close'], color='red', marker='o', label='sell' if index==1 else None)
+    segments = get_invested_segments(df)
+    if not segments:
+        return
+    starts, ends = map(list, zip(*segments))
+    # Plot a dot at the first and last day of a invested group
+    ax.scatter(df.index[starts], df['close'].iloc[starts], color='green', marker='o', label='buy')
+    ax.scatter(df.index[ends], df['close'].iloc[ends], color='red', marker='o', label='sell')
 
 
 def _ax_course_highlight_invested_interruption_line(ax, df):
     """[ax]"""
     # Groups of df[invested]
-    for index, group in df.groupby('group_invested'):
+    for index, (start, end) in enumerate(get_invested_segments(df), 1):
         # Plot green line only if df[invested] is 1
-        ax.plot(group.index, group['close'], linestyle='-', color='green', label='invested' if index==1 else None)
+        ax.plot(df.index[start:end + 1], df['close'].iloc[start:end + 1], linestyle='-', color='green', label='invested' if index==1 else None)
 
 
 def _ax_course_highlight_invested_rect(ax, df):
     """[ax]"""
     # Groups of df[invested]
-    for index, group in df.groupby('group_invested'):
-        # Plot rect from first to the last day of a invested group
-        x_start, x_end = group.index[0], group.index[-1]
-        y_start, y_end = group.loc[group.index[0], 'close'], group.loc[group.index[-1], 'close']
+    x = _x_values(df.index)
+    close = df['close'].to_numpy()
+    rects = []
+    for start, end in get_invested_segments(df):
+        # Rect from first to the last day of a invested group
+        x_start, x_end = x[start], x[end]
+        y_start, y_end = close[start], close[end]
         # Rect
         color = 'green' if y_end > y_start else 'red'
-        rect = patches.Rectangle(
+        rects.append(patches.Rectangle(
             (x_start, y_start),
             x_end - x_start,  # width
             y_end - y_start,  # height
             linewidth=1, edgecolor=color, facecolor=color, alpha=0.3
-        )
-        ax.add_patch(rect)
+        ))
+    # All rects as 1 collection (within the course, the limits do not change)
+    ax.add_collection(PatchCollection(rects, match_original=True), autolim=False)
 
 
 def ax_highlight_signals_vertical_line(ax, df):
-    # Vertical line for the signals
-    color_map = {'buy': 'green', 'sell': 'red',
-                 'bullish': 'green', 'bearish': 'red'}
-    for idx, row in df.iterrows():
-        if row['signal'] in ['buy', 'sell', 'bullish', 'bearish']:
-            ax.axvline(x=idx, color=color_map[row['signal']], linestyle='-', alpha=0.3)
+    # Vertical line for the signals (df[signal]: 1 buy/bullish, -1 sell/bearish)
+    signal = df['signal'].to_numpy()
+    x = _x_values(df.index)[signal != 0]
+    colors = np.where(signal[signal != 0] > 0, 'green', 'red')
+    # All lines as 1 collection (full height like axvline: y in axes coordinates)
+    lines = LineCollection([[(x_i, 0), (x_i, 1)] for x_i in x], colors=colors, linestyle='-', alpha=0.3,
+                           transform=ax.get_xaxis_transform())
+    ax.add_collection(lines, autolim=False)
+
+
+def _segments_line(x, y, segments) -> (np.ndarray, np.ndarray):
+    """ x, y of the segments as 1 line (NaN between the segments interrupts the line)
+    :param segments: [(start, end), ...] - end inclusive
+    """
+    positions = [np.append(np.arange(start, end + 1), -1) for start, end in segments]
+    if not positions:
+        return np.empty(0), np.empty(0)
+    positions = np.concatenate(positions)
+    gap = positions == -1
+    x_line, y_line = x[positions], y[positions]
+    x_line[gap] = np.nan
+    y_line[gap] = np.nan
+    return x_line, y_line
+
+
+def _x_values(index) -> np.ndarray:
+    """ x values of the df index for the collections (dates as matplotlib date numbers)
+    """
+    if isinstance(index, pd.DatetimeIndex):
+        return mdates.date2num(index)
+    return index.to_numpy(dtype=float)
 
 
 
@@ -175,10 +232,10 @@ def ax_course(ax, df, background=False, log=False, leading=False, invested=False
     # Color
     color = 'lightgray' if background else 'black'
 
-    # df[signal] is None
+    # df[signal] is not valid
     if leading:
-        # Plot None values interrupted
-        df['linestyle'] = df['signal'].notna().map({True: '-', False: '--'})
+        # Plot the leading time interrupted
+        df['linestyle'] = np.where(df['signal_valid'], '-', '--')
     else:
         # Plot everything as line
         df['linestyle'] = '-'
@@ -192,9 +249,10 @@ def ax_course(ax, df, background=False, log=False, leading=False, invested=False
 
     # Highlight df[invested]
     if invested:
-        for index, group in df.groupby('group_invested'):
-            # Plot highlighted line only if df[invested] is 1
-            plot_func(group.index, group['close'], linestyle='-', color='black') #label='invested' if index==1 else None
+        # Plot highlighted line only if df[invested] is 1 (all invested groups as 1 line, interrupted by NaN)
+        x_segments, y_segments = _segments_line(_x_values(df.index), df['close'].to_numpy(dtype=float), get_invested_segments(df))
+        if len(x_segments):
+            plot_func(x_segments, y_segments, linestyle='-', color='black') #label='invested'
 
 
 def ax_perc(ax, df):
@@ -237,7 +295,7 @@ def ax_MACD(ax, df):
     ax.plot(df.index, df[col_MACD], label=col_MACD, color='blue', linestyle='-')              # Line MACD
     ax.plot(df.index, df[col_signal], label=col_signal, color='magenta', linestyle='-')       # Line Signal
     #ax.plot(df.index, df[name_diff], label=name_diff, color='pink', linestyle='-')           # Line Diff
-    ax.bar(df.index, df[coll_diff], color='blue', label=coll_diff)                            # Bar Diff
+    ax_bars(ax, df.index, df[coll_diff], color='blue', label=coll_diff)                       # Bar Diff
 
 def ax_RSI(ax, df):
     """[ax]"""
@@ -258,6 +316,18 @@ def ax_SMA(ax, df):
 
 
 
+def ax_bars(ax, index, values, width=0.8, **kwargs):
+    """[ax] Bars like ax.bar() (align center), but all bars as 1 collection (instead of 1 Rectangle per bar)"""
+    x = _x_values(index)
+    y = np.nan_to_num(np.asarray(values, dtype=float))
+    left, right = x - width / 2, x + width / 2
+    vertices = np.stack([np.column_stack(corner) for corner in
+                         [(left, np.zeros_like(y)), (left, y), (right, y), (right, np.zeros_like(y))]], axis=1)
+    ax.add_collection(PolyCollection(vertices, linewidths=0, **kwargs))  # no edges like the bar patches
+    ax.autoscale_view()
+
+
+
 #--- ax Graph elements (title, xlim, xlabel, grid, legend) ---#
 
 def ax_ylim_threshold(values, ax, lower=0.05, upper=99.95):
@@ -284,5 +354,5 @@ def fig_properties(fig, suptitle=None):
 
 
 def plt_properties(plt, loc='upper left'):
-    """[plt]"""
+    """[plt, ax]"""
     plt.legend(loc=loc) # position legend
\ No newline at end of file
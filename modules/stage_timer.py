@@ -0,0 +1,140 @@
+""" # Aim
+Timing of the stages of a backtest (load, indicator, invested, evaluate, ...) summed up over a study
+
+Usage:  timer = start_stage_timer()        # None, if the timer is disabled
+        ...
+        if timer: timer.lap('indicator')   # time since the last lap -> stage 'indicator'
+        ...
+        if timer: timer.done(1)            # 1 finished backtest (1x params on 1x course)
+
+The timer is disabled by default -> enable_stage_timer()
+When disabled, the instrumented code only checks "if timer" (no clock reads)
+Worker processes send their times with the results to the main process (pop_stage_times -> add_stage_times)
+"""
+
+import time
+import pandas as pd
+
+
+_settings = {}          # empty - timer disabled
+_state = {
+    'stages': {},       # {stage: seconds} (in the order of the first lap)
+    'backtests': 0,     # finished backtests
+    'start': None,      # perf_counter at reset_stage_times() (wall time)
+}
+
+
+class StageTimer:
+    """
+    Lap timer of one backtest (or one block of backtests). Every lap adds the time since the last lap to its stage.
+    """
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+
+    def lap(self, stage:str) -> None:
+        """ Add the time since the last lap to the stage
+        """
+        now = time.perf_counter()
+        _state['stages'][stage] = _state['stages'].get(stage, 0.0) + now - self.last
+        self.last = now
+
+
+    def done(self, n:int=1) -> None:
+        """ Count n finished backtests
+        """
+        _state['backtests'] += n
+        self.last = time.perf_counter()
+
+
+#---------------------- Settings ----------------------#
+def enable_stage_timer() -> None:
+    """ Enable the stage timer (and reset the times)
+    """
+    _settings['enabled'] = True
+    reset_stage_times()
+
+
+def disable_stage_timer() -> None:
+    _settings.clear()
+
+
+def stage_timer_enabled() -> bool:
+    return bool(_settings)
+
+
+def start_stage_timer() -> StageTimer|None:
+    """ New lap timer
+    :return: StageTimer (None, if the timer is disabled)
+    """
+    return StageTimer() if _settings else None
+
+
+#---------------------- Times ----------------------#
+def reset_stage_times() -> None:
+    _state['stages'] = {}
+    _state['backtests'] = 0
+    _state['start'] = time.perf_counter()
+
+
+def pop_stage_times() -> dict|None:
+    """ Return the times since the last call and reset them (worker process -> main process)
+    :return: {'stages': {stage: seconds}, 'backtests': n} (None, if the timer is disabled)
+    """
+    if not _settings:
+        return None
+    stage_times = {'stages': _state['stages'], 'backtests': _state['backtests']}
+    _state['stages'] = {}
+    _state['backtests'] = 0
+    return stage_times
+
+
+def add_stage_times(stage_times:dict|None) -> None:
+    """ Add the times of another process (pop_stage_times)
+    """
+    if not stage_times or not _settings:
+        return
+    for stage, seconds in stage_times['stages'].items():
+        _state['stages'][stage] = _state['stages'].get(stage, 0.0) + seconds
+    _state['backtests'] += stage_times['backtests']
+
+
+def get_stage_times() -> pd.DataFrame:
+    """ Per-stage breakdown since reset_stage_times()
+    :return: df[seconds, share, ms_per_backtest] with index stage (+ row 'total' with the wall time and backtests_per_s)
+
+    Output:
+                         seconds  share  ms_per_backtest  backtests  backtests_per_s
+        stage
+        load               0.012  0.004            0.002        NaN              NaN
+        indicator          1.903  0.610            0.380        NaN              NaN
+        ...
+        total              3.120  1.000            0.624     5000.0           1602.6
+    With workers > 1 the sum of the stages is the time of all processes (can be more than the wall time)
+    """
+    backtests = _state['backtests']
+    wall = time.perf_counter() - _state['start'] if _state['start'] is not None else 0.0
+    df = pd.DataFrame({'seconds': pd.Series(_state['stages'], dtype=float)})
+    df.index.name = 'stage'
+    total = df['seconds'].sum()
+    df['share'] = df['seconds'] / total if total else 0.0
+    df['ms_per_backtest'] = df['seconds'] * 1000 / backtests if backtests else float('nan')
+    df.loc['total', ['seconds', 'share', 'ms_per_backtest']] = [wall, 1.0, wall * 1000 / backtests if backtests else float('nan')]
+    df.loc['total', 'backtests'] = backtests
+    df.loc['total', 'backtests_per_s'] = backtests / wall if wall else float('nan')
+    return df
+
+
+def format_stage_times(n:int=3) -> str:
+    """ Short summary for a progress line
+    :param n: the n stages with the most time
+    :return: '1603 backtests/s (indicator 61%, evaluate_cycles 18%, invested 9%)' ('' if the timer is disabled)
+    """
+    if not _settings:
+        return ''
+    wall = time.perf_counter() - _state['start']
+    total = sum(_state['stages'].values())
+    stages = sorted(_state['stages'].items(), key=lambda item: -item[1])[:n]
+    shares = ', '.join(f'{stage} {seconds / total:.0%}' for stage, seconds in stages) if total else ''
+    return f'{_state["backtests"] / wall if wall else 0:.0f} backtests/s ({shares})'
@@ -51,17 +51,28 @@ date
 2017-11-15  0.027      0.000382   3.260490e-04       0.000056                                                   1    0.038462             2.0
 2017-11-16  0.027      0.000432   3.256921e-04       0.000106                                                   1    0.000000             2.0
 2017-11-17  0.026      0.000281   1.517976e-04       0.000129                                                   1   -0.037037             2.0
+
+Encoding (the table above shows the labels of signal_labels())
+df[signal]:         int8 - 1 buy/bullish, -1 sell/bearish, 0 no signal
+df[signal_valid]:   bool - False in the leading time of the indicator (label None)
+df[invested]:       float - 1, 0, NaN in the leading time
 """
 
 import pandas as pd
 import numpy as np
 
 from modules.indicators import func_indicator, get_indicator_col_names
-from modules.functional_analysis import calculate_crossings
+from modules.functional_analysis import crossings
 
 
 pd.set_option('future.no_silent_downcasting', True) # if values are converted down (value to nan - when calculating df[invested] based on df[signal])
 
+SIGNAL_LABELS = {   # labels of df[signal] = [1, -1] (only for printing and plotting)
+    'BB': ('buy', 'sell'),
+    'MACD': ('buy', 'sell'),
+    'RSI': ('bullish', 'bearish'),
+}
+
 
 
 #------------------------ Signals from Indicators ------------------------#
@@ -109,12 +120,11 @@ def _get_signals_from_BB(df, params=None):
     col_l, col_m, col_u = get_indicator_col_names(df, 'BB')
 
     # Signals
-    conditions = [
-        (df['close'] <= df[col_l]),  # Bullish, if course is smaller than the lower band
-        (df['close'] >= df[col_u])   # Bearish, if course is larger than the upper band
-    ]
-    values = ['buy', 'sell']
-    df['signal'] = np.select(conditions, values, default='')
+    close = df['close'].to_numpy()
+    df = _set_signals(df,
+        close <= df[col_l].to_numpy(),  # Bullish, if course is smaller than the lower band
+        close >= df[col_u].to_numpy()   # Bearish, if course is larger than the upper band
+    )
 
     # Fill leading time with None
     df = _lead_time_signals(df)
@@ -127,15 +137,15 @@ def _get_signals_from_MACD(df, params=None):
     df = func_indicator('MACD', df, params)
     col_MACD, coll_diff, col_signal = get_indicator_col_names(df, 'MACD')
 
-    # Signals
-    df, col_crossing = calculate_crossings(df, col_MACD, col_signal)
+    # Signals (crossings as indices and directions - no string column in df)
+    indices, directions = crossings(df[col_MACD].to_numpy(), df[col_signal].to_numpy())
+    crossing = np.zeros(len(df), dtype=np.int8)
+    crossing[indices] = directions
 
-    conditions = [
-        (df[col_crossing] == 'up'),    # Buy, if MACD crosses the signal line from bottom to top
-        (df[col_crossing] == 'down')   # Sell, if MACD crosses the signal line from top to bottom
-    ]
-    values = ['buy', 'sell']
-    df['signal'] = np.select(conditions, values, default='')
+    df = _set_signals(df,
+        crossing > 0,   # Buy, if MACD crosses the signal line from bottom to top
+        crossing < 0    # Sell, if MACD crosses the signal line from top to bottom
+    )
 
     # Fill leading time with None
     df = _lead_time_signals(df)
@@ -149,22 +159,31 @@ def _get_signals_from_RSI(df, params=None):
     col_RSI, col_bl, col_bu = get_indicator_col_names(df, 'RSI')
 
     # Signals
-    conditions = [
-        (df[col_RSI] < params['bl']), # Bullish, if course is smaller than 30 (lower border)
-        (df[col_RSI] > params['bu'])  # Bearish, if course is bigger than 70 (upper border)
-    ]
-    values = ['bullish', 'bearish']
-    df['signal'] = np.select(conditions, values, default='')
+    rsi = df[col_RSI].to_numpy()
+    df = _set_signals(df,
+        rsi < params['bl'], # Bullish, if course is smaller than 30 (lower border)
+        rsi > params['bu']  # Bearish, if course is bigger than 70 (upper border)
+    )
 
     # Fill leading time with None
     df = _lead_time_signals(df)
     return df
 
 
+def _set_signals(df, buy, sell):
+    """ [df[signal]] Encode the signals as int8
+    :param buy: bool array - buy/bullish (wins, if both are True)
+    :param sell: bool array - sell/bearish
+    :return: df[signal] - [1, -1, 0]
+    """
+    df['signal'] = np.where(buy, 1, np.where(sell, -1, 0)).astype(np.int8)
+    return df
+
+
 def _lead_time_signals(df):
-    """ [df[signal]] Fill leading time for the signals with None values
+    """ [df[signal, signal_valid]] Mark the leading time for the signals as not valid
     Signals deliver values after a certain period of time.
-    Fill all values of df[signals] with None where no signals can be delivered
+    Set df[signal_valid] to False (and df[signal] to 0) where no signals can be delivered
 
     e.g. Leading None for MACD
     leading_nans = df.apply(lambda col: col.isna().cumprod().sum())
@@ -173,25 +192,46 @@ def _lead_time_signals(df):
         MACD_10_20_7                           19
         MACDh_10_20_7                          25
         MACDs_10_20_7                          25  <- after this leading time signals can be generated
-        Crossing_MACD_10_20_7-MACDs_10_20_7     0
         signal                                  0
 
     -> the first possible signal could be generated after 25 days (the first signal was after 40 days)
-    => fill the leading time of df[signals] with None values
+    => mark the leading time of df[signals] as not valid
     (this is important for benchmark comparison, because the comparison only makes sense if signals can actually be present)
     """
-    df_leading_nans = df.apply(lambda col: col.isna().cumprod().sum())  # lists all none values of all columns (except invested)
-    max_leading_nans = df_leading_nans.max()  # largest number of leading None values (from there on signals could deliver values)
-    df.loc[df.index[0:max_leading_nans], 'signal'] = None # set leading time of df[signals] to None
+    isna = df.isna().to_numpy()
+    leading_nans = np.where(isna.all(axis=0), len(df), isna.argmin(axis=0))  # all none values of all columns (except invested)
+    max_leading_nans = int(leading_nans.max(initial=0))  # largest number of leading None values (from there on signals could deliver values)
+    signal_valid = np.arange(len(df)) >= max_leading_nans
+    df['signal'] = np.where(signal_valid, df['signal'].to_numpy(), 0).astype(np.int8)
+    df['signal_valid'] = signal_valid
     return df
 
 
+def signal_labels(df, indicator_name:str=None) -> pd.Series:
+    """ [df[signal]] String labels of the signals (only for printing and plotting)
+    :param df: df[signal, signal_valid]
+    :param indicator_name: labels from SIGNAL_LABELS (default buy, sell)
+    :return: Series - ['buy'/'bullish', 'sell'/'bearish', '', None in the leading time]
+    """
+    label_up, label_down = SIGNAL_LABELS.get(indicator_name, ('buy', 'sell'))
+    signal = df['signal'].to_numpy()
+    labels = np.full(len(df), '', dtype=object)
+    labels[signal > 0] = label_up
+    labels[signal < 0] = label_down
+    if 'signal_valid' in df.columns:
+        labels[~df['signal_valid'].to_numpy(dtype=bool)] = None
+    return pd.Series(labels, index=df.index, name='signal')
+
+
+
+
+
 #------------------------ Invested from Indicators ------------------------#
 
 def df_invested_from_signal(df):
     """ [df[signal, invested]] Calculate status 'invested' from the signals
-    :param df: df[signal] - [buy/bullish , sell/bearish]
-    :return: df[invested]
+    :param df: df[signal, signal_valid] - [1 buy/bullish, -1 sell/bearish, 0]
+    :return: df[invested] - [1, 0, NaN where df[signal] is not valid]
 
         Input                      Output
                     close signal invested
@@ -220,17 +260,18 @@ def df_invested_from_signal(df):
         2017-10-22  0.028               1
     """
 
-    # Convert signals to invested status
-    df['invested'] = 0
-    if df['signal'].isin(['bullish', 'bearish']).any():
-        df['invested'] = df['signal'].replace({'bullish': 1, 'bearish': 0, '': None})
-    elif df['signal'].isin(['buy', 'sell']).any():
-        df['invested'] = df['signal'].replace({'buy': 1, 'sell': 0, '': None})
-
-    # fill all None values with 0
-    df['invested'] = df['invested'].ffill().fillna(0)
-    # set df[invested] to None if df[signal] is None
-    df.loc[df['signal'].isna(), 'invested'] = None
+    # Convert signals to invested status (NaN where there is no signal)
+    signal = df['signal'].to_numpy()
+    invested = np.where(signal > 0, 1.0, np.where(signal < 0, 0.0, np.nan))
+
+    # fill all NaN values with the last signal (0 before the first signal)
+    index_last = np.where(signal != 0, np.arange(len(signal)), 0)
+    np.maximum.accumulate(index_last, out=index_last)
+    invested = np.nan_to_num(invested[index_last], nan=0.0)
+    # set df[invested] to NaN if df[signal] is not valid
+    if 'signal_valid' in df.columns:
+        invested[~df['signal_valid'].to_numpy(dtype=bool)] = np.nan
+    df['invested'] = invested
     return df
 
 
@@ -291,14 +332,34 @@ def add_one_invested_after_selling(df):
         10     10                0          0
 
     """
-    i = 1
-    while i < len(df):
-        curr_idx = df.index[i]
-        prev_idx = df.index[i - 1]
-        if df.loc[curr_idx, 'invested'] == 0 and df.loc[prev_idx, 'invested'] == 1:
-            df.loc[curr_idx, 'invested'] = 1
-            df.loc[curr_idx, 'group_invested'] = df.loc[prev_idx, 'group_invested']
-            i += 2
-        else:
-            i += 1
+    invested = df['invested'].to_numpy(dtype=float, copy=True)
+    # Selling day: not invested and invested the day before (the day after selling is never extended)
+    selling = np.zeros(len(df), dtype=bool)
+    selling[1:] = (invested[1:] == 0) & (invested[:-1] == 1)
+    index_selling = np.flatnonzero(selling)
+    invested[index_selling] = 1
+    df['invested'] = invested
+    if 'group_invested' in df.columns:
+        group_invested = df['group_invested'].to_numpy(dtype=float, copy=True)
+        group_invested[index_selling] = group_invested[index_selling - 1]
+        df['group_invested'] = group_invested
     return df
+
+
+def get_invested_segments(df) -> list[tuple[int, int]]:
+    """ [segments] Positions of the invested groups (for plotting)
+    :param df: df[group_invested]
+    :return: [(start, end), ...] - iloc of the first and the last day of every invested group (end inclusive)
+
+    e.g. group_invested [NaN, 1, 1, 1, NaN, 2, 2, 3] -> [(1, 3), (5, 6), (7, 7)]
+    """
+    group_invested = df['group_invested'].to_numpy(dtype=float)
+    valid = ~np.isnan(group_invested)
+    # A new group starts, if the group differs from the day before
+    new_group = np.ones(len(group_invested), dtype=bool)
+    new_group[1:] = group_invested[1:] != group_invested[:-1]
+    starts = np.flatnonzero(valid & new_group)
+    last_day = np.ones(len(group_invested), dtype=bool)
+    last_day[:-1] = new_group[1:]
+    ends = np.flatnonzero(valid & last_day)
+    return list(zip(starts.tolist(), ends.tolist()))
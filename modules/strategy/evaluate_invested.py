@@ -1,10 +1,11 @@
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 
 from modules.utils import get_period, get_intervals, pandas_print_all, json_round_dict
-from modules.plot import fig_invested_default, save_fig
+
+
+FEE = 0.004  # 0.4 % trading fee per transaction
 
 
 def evaluate_invested(df) -> dict[str, any]:
@@ -30,69 +31,47 @@ def evaluate_invested(df) -> dict[str, any]:
         print(f'Warning, never invested')
     """
     # df[close_perc]
-    if 'close_perc' not in df.columns:
-        df['close_perc'] = df['close'].pct_change(periods=1)  # * 100
-
+    if 'close_perc' in df.columns:
+        close_perc = df['close_perc'].to_numpy(dtype=float)
+    else:
+        close_perc = df['close'].pct_change(periods=1).to_numpy(dtype=float)  # * 100
+    invested = df['invested'].to_numpy(dtype=float)  # None -> NaN
 
-    # Cut None values in df[invested]
-    """
-    df[invested] is not allowed to have None values, otherwise calculations in this function will fail.
-    - None values are where the indicator does not yet provide any signals
-    - Here to run the calculation, all None values re replaced with 0. But then this strategy (1x params of an indicator)
-      is not comparable with the other parameters that can already make decisions at this point. Therefore make sure 
-      beforehand that all parameters start with the same offset, so there are no None values
-    """
-    amount_none_values = df['invested'].isnull().sum()
+    # Cut None values in df[invested] (details in evaluate_invested_batch)
+    amount_none_values = np.isnan(invested).sum()
     if amount_none_values > 0:
         print(f'Warning: Cut {amount_none_values}/{len(df)} values from None to 0 where there was no signal')
-        df['invested'] = df['invested'].replace({None: 0})
-    df.loc[:, 'invested'] = df['invested'].astype(int)  # because there is no None value, the column can be set to int
-
-    # Shift close_perc by one (because the percentage change apply to the next day)
-    """
-          date invested  close_perc
-    2017-11-08        0    0.3
-    2017-11-09       <1>   0.5  <- first investment point, but close_perc refers to the percentage change from the last day (where you are not invested)
-    2017-11-10        1   <0.1> <- this is the first percentage change when invested from 2017-11-09 to 2017-11-10
-    2017-11-11        0    0.2  <- this is the second percentage
-    -> shift close_perc one row up
-    """
-    df['close_perc'] = df['close_perc'].shift(-1)
-    df = df.iloc[:-1] # delete the last row of df, because ot the shift(-1) there is no close_perc in the last column
 
 
     # Evaluation
-    # Main evaluation values
-    BaH = _calc_total_accumulated_perc(df, 0)  # Buy_and_Hold
-    S = _calc_total_accumulated_perc(df, 2)    # Strategy_with_fee
-
     # Dict of all evaluation values
     min_calculations = True
     if min_calculations:
-        result_dict = {
-            'S': S,
-            'BaH': BaH,
-            'diff': S - BaH,
-            '%_inv': (df['invested'] == 1).sum() / len(df)
-        }
+        # Main evaluation values (S - Strategy_with_fee, BaH - Buy_and_Hold)
+        result_batch = evaluate_invested_batch(invested[np.newaxis, :], close_perc)
+        result_dict = {key: float(value[0]) for key, value in result_batch.items()}
     else:
+        # Evaluation based on the df (shifted df[close_perc], without None values in df[invested])
+        df_eval = _prepare_df_evaluation(df, invested, close_perc)
+        BaH = _calc_total_accumulated_perc(df_eval, 0)  # Buy_and_Hold
+        S = _calc_total_accumulated_perc(df_eval, 2)    # Strategy_with_fee
         # Calculate different states based on [{in, out}, {+, -}]
-        portions_dict = _calc_all_investment_states(df)
+        portions_dict = _calc_all_investment_states(df_eval)
 
         result_dict = {
                 # Meta
-            'start': df.index.min(),
-            'end': df.index.max(),
-            'days': (df.index.min() - df.index.max()).days,
-            'transactions': _calc_amount_transactions(df),
+            'start': df_eval.index.min(),
+            'end': df_eval.index.max(),
+            'days': (df_eval.index.min() - df_eval.index.max()).days,
+            'transactions': _calc_amount_transactions(df_eval),
                 # Evaluation
             'in+': portions_dict['in+'],
             'in-': portions_dict['in-'],
             'out+': portions_dict['out+'],
             'out-': portions_dict['out-'],
-            'Buy_and_Hold': _calc_total_accumulated_perc(df, 0),
-            'Strategy_without_fee': _calc_total_accumulated_perc(df, 1),
-            'Strategy_with_fee': _calc_total_accumulated_perc(df, 2),
+            'Buy_and_Hold': _calc_total_accumulated_perc(df_eval, 0),
+            'Strategy_without_fee': _calc_total_accumulated_perc(df_eval, 1),
+            'Strategy_with_fee': _calc_total_accumulated_perc(df_eval, 2),
             #'Strategy_with_fees_and_tax': calc_total_accumulated_perc(self.df, 3),
                 # Comparability to the benchmark
             'diff_benchmark': S - BaH,
@@ -106,7 +85,9 @@ def evaluate_invested(df) -> dict[str, any]:
     save = False
     show = False
     if show or save:
-        fig = fig_invested_default(df, title=json_round_dict(result_dict))
+        import matplotlib.pyplot as plt
+        from modules.plot import fig_invested_default, save_fig
+        fig = fig_invested_default(_prepare_df_evaluation(df, invested, close_perc), title=json_round_dict(result_dict))
         if save:
          save_fig(fig, None)
         if show:
@@ -121,10 +102,116 @@ def evaluate_invested(df) -> dict[str, any]:
     return result_dict
 
 
+def evaluate_invested_batch(invested, close_perc) -> dict[str, np.ndarray]:
+    """ [eval_dict arrays] Vectorized evaluation of multiple invested rows over the same course (minimal evaluation_dict)
+    :param invested: 2-D array (variations x days) - [1, 0, None/NaN where there is no signal]
+    :param close_perc: 1-D array (days) - daily percentage change of the course (df[close_perc])
+    :return: {'S': array, 'BaH': array, 'diff': array, '%_inv': array} - one value per variation (row)
+
+    Input:
+        invested = [[nan, 0, 1, 1, 0],      close_perc = [nan, 0.1, -0.2, 0.3, 0.1]
+                    [nan, 1, 1, 0, 0]]
+    Output:
+        {'S': array([...]), 'BaH': array([...]), 'diff': array([...]), '%_inv': array([0.5, 0.5])}
+    """
+    invested = np.atleast_2d(np.asarray(invested, dtype=float))
+    close_perc = np.asarray(close_perc, dtype=float)
+    if invested.shape[1] != len(close_perc):
+        raise ValueError(f'invested {invested.shape} and close_perc {close_perc.shape} have different lengths')
+
+    # Cut None values in invested
+    """
+    invested is not allowed to have None values, otherwise calculations in this function will fail.
+    - None values are where the indicator does not yet provide any signals
+    - Here to run the calculation, all None values re replaced with 0. But then this strategy (1x params of an indicator)
+      is not comparable with the other parameters that can already make decisions at this point. Therefore make sure 
+      beforehand that all parameters start with the same offset, so there are no None values
+    """
+    invested = np.nan_to_num(invested, nan=0.0)
 
-def evaluate_invested_multiple_cycles(df) -> (dict[str,float], pd.DataFrame):
+    # Shift close_perc by one (because the percentage change apply to the next day)
+    """
+          date invested  close_perc
+    2017-11-08        0    0.3
+    2017-11-09       <1>   0.5  <- first investment point, but close_perc refers to the percentage change from the last day (where you are not invested)
+    2017-11-10        1   <0.1> <- this is the first percentage change when invested from 2017-11-09 to 2017-11-10
+    2017-11-11        0    0.2  <- this is the second percentage
+    -> shift close_perc one row up and delete the last day (there is no close_perc for it)
+    """
+    close_perc = close_perc[1:]
+    invested = invested[:, :-1]
+
+    # Buy and Hold
+    BaH = _total_product(1 + close_perc)
+    # Strategy with fees (fee on every change of invested)
+    trade_occurred = np.zeros(invested.shape, dtype=bool)
+    trade_occurred[:, 1:] = invested[:, 1:] != invested[:, :-1]
+    factor_trading_fee = np.where(trade_occurred, 1 - FEE, 1)
+    factor_without_fee = 1 + close_perc * invested
+    S = _total_product(factor_without_fee * factor_trading_fee)
+
+    return {
+        'S': S,
+        'BaH': np.full(S.shape, BaH),
+        'diff': S - BaH,
+        '%_inv': (invested == 1).sum(axis=-1) / invested.shape[1]
+    }
+
+
+def evaluate_invested_intervals_batch(invested, close_perc, intervals:list[tuple[int, int]]) -> dict[str, np.ndarray]:
+    """ [eval_dict arrays] Vectorized evaluation of multiple invested rows in multiple intervals
+    :param invested: 2-D array (variations x days)
+    :param close_perc: 1-D array (days)
+    :param intervals: [(start1, end1), (start2, end2), ...] - see get_intervals() (can mix different window sizes)
+    :return: {'S': array, 'BaH': array, 'diff': array, '%_inv': array} - 2-D arrays (variations x intervals)
+
+    Same values as evaluate_invested_batch() for every interval (rows start ... end, the row end is included
+    and cut by the shift of close_perc). Cumulative sums are built once per series, then every interval costs O(1):
+        product of the factors = exp(log_cum[end] - log_cum[start])  (factors 0 are counted separately)
+        fees                   = trades_cum[end] - trades_cum[start + 1]  (no fee on the first day of an interval)
+    """
+    invested = np.atleast_2d(np.asarray(invested, dtype=float))
+    close_perc = np.asarray(close_perc, dtype=float)
+    if invested.shape[1] != len(close_perc):
+        raise ValueError(f'invested {invested.shape} and close_perc {close_perc.shape} have different lengths')
+    invested = np.nan_to_num(invested, nan=0.0)
+
+    # Daily values (shifted like in evaluate_invested_batch) - day t: invested[t] with the change to day t+1
+    close_perc = close_perc[1:]
+    invested = invested[:, :-1]
+    trade_occurred = np.zeros(invested.shape, dtype=bool)
+    trade_occurred[:, 1:] = invested[:, 1:] != invested[:, :-1]
+
+    # Cumulative sums (with a leading 0 -> cum[k] = sum of the days < k)
+    log_cum_S, zeros_cum_S = _cumulative_log(1 + close_perc * invested)
+    log_cum_BaH, zeros_cum_BaH = _cumulative_log(1 + close_perc)
+    trades_cum = _cumulative_sum(trade_occurred)
+    invested_cum = _cumulative_sum(invested == 1)
+
+    # Intervals
+    starts = np.array([start for start, _ in intervals], dtype=int)
+    ends = np.minimum(np.array([end for _, end in intervals], dtype=int), invested.shape[1])  # last interval can reach the end
+    days = ends - starts
+    fees = trades_cum[:, ends] - trades_cum[:, np.minimum(starts + 1, ends)]
+
+    S = _window_product(log_cum_S, zeros_cum_S, starts, ends) * (1 - FEE) ** fees
+    BaH = _window_product(log_cum_BaH, zeros_cum_BaH, starts, ends)
+    BaH = np.broadcast_to(BaH, S.shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        perc_invested = (invested_cum[:, ends] - invested_cum[:, starts]) / days
+    return {
+        'S': S,
+        'BaH': BaH.copy(),
+        'diff': S - BaH,
+        '%_inv': perc_invested
+    }
+
+
+def evaluate_invested_multiple_cycles(df, window_size:int=350, overlap:int=100) -> (dict[str,float], pd.DataFrame):
     """ [eval_dict df] Run evaluation_dict multiple times in different periods and summarize the results
     :param df: df[close, invested]
+    :param window_size: days per period (see get_intervals)
+    :param overlap: days overlapping of the periods
     :return: evaluation dict as mean over multiple cycles and pd.DataFrame of all cycles
 
     Input:
@@ -153,25 +240,21 @@ def evaluate_invested_multiple_cycles(df) -> (dict[str,float], pd.DataFrame):
         b) only mean from multiple cycles
             result_dict = {'S': 12.53, 'BaH': 12.27, 'diff': 0.25}
     """
-
-    # Iterate over multiple periods
-    intervals = get_intervals(len(df))
-    summary_dict = {}
-    for index, interval in enumerate(intervals):
-        # Period (start, stop)
-        start = df.index[interval[0]]
-        end = df.index[interval[1]]
-        # Evaluation result of one specific interval
-        result = {
-            'start': interval[0],
-            'end': interval[1],
-            **evaluate_invested(df[start:end].copy())
-        }
-        # Append all results in one dict
-        for key, value in result.items():
-            if key not in summary_dict:
-                summary_dict[key] = []
-            summary_dict[key].append(value)
+    # df[close_perc]
+    if 'close_perc' in df.columns:
+        close_perc = df['close_perc'].to_numpy(dtype=float)
+    else:
+        close_perc = df['close'].pct_change(periods=1).to_numpy(dtype=float)
+    invested = df['invested'].to_numpy(dtype=float)
+
+    # Evaluate all intervals at once (start, stop)
+    intervals = get_intervals(len(df), window_size, overlap)
+    result_intervals = evaluate_invested_intervals_batch(invested[np.newaxis, :], close_perc, intervals)
+    summary_dict = {
+        'start': [interval[0] for interval in intervals],
+        'end': [interval[1] for interval in intervals],
+        **{key: value[0] for key, value in result_intervals.items()}
+    }
     df_summary = pd.DataFrame(summary_dict)
     #print(df_summary)
     #exit()
@@ -310,9 +393,8 @@ def _calc_accumulated_perc(df, n=2):
             df['factor'] = 1 + df['close_perc'] * df['invested']
         case 2:
             # Strategy with fees
-            FEE = 0.004  # 0.4 %
             df['trade_occurred'] = df['invested'].diff().fillna(0).ne(0)
-            df['factor_trading_fee'] = df['trade_occurred'].apply(lambda x: 1 - FEE if x else 1)
+            df['factor_trading_fee'] = np.where(df['trade_occurred'], 1 - FEE, 1)
             df['factor_without_fee'] = 1 + df['close_perc'] * df['invested']
             df['factor'] = df['factor_without_fee'] * df['factor_trading_fee']
         case 3:
@@ -326,6 +408,54 @@ def _calc_accumulated_perc(df, n=2):
     return df
 
 
+def _total_product(factor) -> np.ndarray:
+    """ Last value of the accumulated product over the last axis (NaN factors are skipped like pd.Series.cumprod)
+    :param factor: 1-D or 2-D array of daily factors
+    :return: total product (per row)
+    """
+    factor = np.where(np.isnan(factor), 1, factor)
+    return np.cumprod(factor, axis=-1)[..., -1]
+
+
+def _cumulative_sum(values) -> np.ndarray:
+    """ Cumulative sum over the last axis with a leading 0 -> cum[..., k] = sum(values[..., :k])
+    """
+    values = np.asarray(values, dtype=float)
+    cum = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=cum[..., 1:])
+    return cum
+
+
+def _cumulative_log(factor) -> (np.ndarray, np.ndarray):
+    """ Cumulative log of daily factors (NaN factors are skipped like in _total_product)
+    :return: cumulative log of the factors != 0, cumulative count of the factors == 0 (log(0) is not defined)
+    """
+    factor = np.where(np.isnan(factor), 1, factor)
+    zero = factor == 0
+    return _cumulative_sum(np.log(np.where(zero, 1, factor))), _cumulative_sum(zero)
+
+
+def _window_product(log_cum, zeros_cum, starts, ends) -> np.ndarray:
+    """ Product of the daily factors in the windows [start, end) from the cumulative arrays of _cumulative_log()
+    """
+    product = np.exp(log_cum[..., ends] - log_cum[..., starts])
+    return np.where(zeros_cum[..., ends] - zeros_cum[..., starts] > 0, 0.0, product)
+
+
+def _prepare_df_evaluation(df, invested, close_perc) -> pd.DataFrame:
+    """ [df] df for the evaluation functions below (copy): df[invested] without None, df[close_perc] shifted by one
+    :param df: df[close, invested]
+    :param invested: df[invested] as array
+    :param close_perc: df[close_perc] as array
+    :return: df[close, invested, close_perc] without the last day
+    """
+    df = df.copy()
+    df['invested'] = np.nan_to_num(invested, nan=0.0).astype(int)
+    df['close_perc'] = close_perc
+    df['close_perc'] = df['close_perc'].shift(-1)
+    return df.iloc[:-1]
+
+
 def _calc_total_accumulated_perc(df, n=2) -> float:
     """ Last value of accumulated return
     :param df: see calc_accumulated_perc()
@@ -0,0 +1,264 @@
+""" # Aim
+Signal table of a course (close, indicator, signal, invested) that is refreshed incrementally after course updates
+
+File:   data/cache/signals/<indicator>_<params>/<symbol>.csv   (rows are only appended)
+State:  data/cache/signals/<indicator>_<params>/<symbol>.json  (last indicator state per course, indicator and params)
+
+Refresh (refresh_signal_table):
+- no state / the course changed before the last date (or the table was not written completely) -> full calculation
+- new days in the course -> only the new rows are calculated from the state and appended to the table
+
+Indicator state:
+- MACD: last EMA values (fast, slow, signal) and the last sign of MACD - signal (crossings) -> exact recursion like EMABank
+- BB:   last length - 1 closes (rolling window)
+- RSI:  last RSI_WARMUP_FACTOR * length closes - the RSI averages are recalculated over this window, the influence of
+        older closes is below double precision (pandas_ta versions define the RSI average differently (adjust=True/False),
+        a window is correct for both)
+- invested: last invested status (forward fill of the signals)
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from modules.file_handler import get_path, create_dir, save_txt, load_course_close
+from modules.indicators import func_indicator, get_indicator_col_names
+from modules.strategy.df_signals_invested import func_df_signals_from_indicator, df_invested_from_signal
+
+
+RSI_WARMUP_FACTOR = 30      # [RSI] closes in the state: factor * length ((1 - 1/length) ** (30 * length) < 1e-13)
+
+
+def refresh_signal_table(indicator_name:str, course_path:Path, params:dict, folder_path:Path=None) -> pd.DataFrame:
+    """ [df[close, <indicators>, signal, invested]] Refresh the signal table of one course (incremental, if possible)
+    :param indicator_name: indicator name ['BB', 'MACD', 'RSI']
+    :param course_path: course path
+    :param params: params of the indicator (dict)
+    :param folder_path: storage folder (default data/cache/signals/<indicator>_<params>)
+    :return: new rows of the table (full table after a full calculation)
+    """
+    if indicator_name not in _STATE_FUNCS:
+        raise ValueError(f'No incremental signal table for {indicator_name} - not in {list(_STATE_FUNCS)}')
+    course_path = Path(course_path)  # Make sure path is a Path object
+    folder_path = folder_path or get_signal_table_folder(indicator_name, params)
+    file_path_table = folder_path / f'{course_path.stem}.csv'
+    file_path_state = folder_path / f'{course_path.stem}.json'
+    df_course = load_course_close(course_path)
+
+    # Incremental - only the new days
+    state = _load_state(file_path_state)
+    if _state_valid(state, indicator_name, params, df_course, file_path_table):
+        df_new_close = df_course.loc[df_course.index > pd.Timestamp(state['last_date'])]
+        if df_new_close.empty:
+            return df_new_close
+        df_new, state = _STATE_FUNCS[indicator_name][1](df_new_close, params, state)
+        df_new['invested'] = _continue_invested(df_new['signal'].to_numpy(), state['invested'])
+        df_new.to_csv(file_path_table, mode='a', header=False)
+        _save_state(_finish_state(state, df_new), file_path_state)
+        return df_new
+
+    # Full calculation
+    df = func_df_signals_from_indicator(indicator_name, df_course.copy(), params)
+    df = df_invested_from_signal(df)
+    df = df[['close', *_indicator_cols(df, indicator_name), 'signal', 'invested']]
+    create_dir(folder_path)
+    df.to_csv(file_path_table)
+    if df['invested'].notna().iloc[-1]:  # after the leading time -> state for the next refresh
+        state = _STATE_FUNCS[indicator_name][0](df, df_course, params)
+        state.update({'indicator': indicator_name, 'params': params})
+        _save_state(_finish_state(state, df), file_path_state)
+    else:
+        file_path_state.unlink(missing_ok=True)
+    return df
+
+
+def load_signal_table(indicator_name:str, course_path:Path, params:dict, folder_path:Path=None) -> pd.DataFrame:
+    """ [file load] Signal table of one course
+    :return: df[close, <indicators>, signal, invested]
+    """
+    folder_path = folder_path or get_signal_table_folder(indicator_name, params)
+    file_path = folder_path / f'{Path(course_path).stem}.csv'
+    if not file_path.exists():
+        raise FileNotFoundError(f'File "{file_path}" does not exist')
+    return pd.read_csv(file_path, parse_dates=['date'], index_col='date')
+
+
+def get_signal_table_folder(indicator_name:str, params:dict) -> Path:
+    """ data/cache/signals/<indicator>_<params> - e.g. data/cache/signals/MACD_12_26_9
+    """
+    return get_path('cache') / 'signals' / f'{indicator_name}_{"_".join(str(value) for value in params.values())}'
+
+
+def main_routine_refresh_signal_tables(course_paths:list, indicator_params:list[tuple[str, dict]]) -> None:
+    """ Refresh the signal tables of all courses and indicator params (e.g. after main_routine_download_course_list_cc)
+    :param course_paths: list of course paths
+    :param indicator_params: [(indicator_name, params), ...]
+    """
+    for index, course_path in enumerate(course_paths):
+        for indicator_name, params in indicator_params:
+            df_new = refresh_signal_table(indicator_name, course_path, params)
+            print(f'[{index + 1}/{len(course_paths)}] - {Path(course_path).stem} {indicator_name} {params}: {len(df_new)} new rows')
+
+
+#---------------------- State ----------------------#
+
+def _load_state(file_path:Path) -> dict|None:
+    if not file_path.exists():
+        return None
+    try:
+        with open(file_path) as file:
+            return json.load(file)
+    except (json.JSONDecodeError, OSError):
+        return None
+
+
+def _save_state(state:dict, file_path:Path) -> None:
+    save_txt(json.dumps(state), file_path, atomic=True)  # written after the rows -> a killed refresh leads to a full calculation
+
+
+def _state_valid(state:dict|None, indicator_name:str, params:dict, df_course:pd.DataFrame, file_path_table:Path) -> bool:
+    """ True, if the table can be continued from the state (same indicator and params, same course until the last date,
+    the table ends with the last date of the state)
+    """
+    if not state or state['indicator'] != indicator_name or state['params'] != params or not file_path_table.exists():
+        return False
+    last_date = pd.Timestamp(state['last_date'])
+    if last_date not in df_course.index or df_course.at[last_date, 'close'] != state['last_close']:
+        return False
+    if len(df_course.loc[:last_date]) != state['rows']:
+        return False
+    return _last_line_date(file_path_table) == last_date
+
+
+def _last_line_date(file_path:Path) -> pd.Timestamp|None:
+    """ Date of the last row of the table (without reading the whole file)
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(0, 2)
+        size = file.tell()
+        file.seek(max(0, size - 4096))
+        lines = file.read().splitlines()
+    try:
+        return pd.Timestamp(lines[-1].split(b',')[0].decode())
+    except (IndexError, ValueError):
+        return None
+
+
+def _finish_state(state:dict, df:pd.DataFrame) -> dict:
+    """ Common part of the state: last date, last close, last invested
+    """
+    state['last_date'] = df.index[-1].isoformat()
+    state['last_close'] = float(df['close'].iloc[-1])
+    state['invested'] = float(df['invested'].iloc[-1])
+    return state
+
+
+def _continue_invested(signal:np.ndarray, invested_last:float) -> np.ndarray:
+    """ df[invested] of the new rows - forward fill of the signals, starting with the last invested status
+    """
+    invested = np.where(signal > 0, 1.0, np.where(signal < 0, 0.0, np.nan))
+    invested = pd.Series(np.concatenate([[invested_last], invested])).ffill().to_numpy()
+    return invested[1:]
+
+
+def _indicator_cols(df:pd.DataFrame, indicator_name:str) -> list[str]:
+    cols = get_indicator_col_names(df, indicator_name)
+    return [cols] if isinstance(cols, str) else list(cols)
+
+
+#---------------------- Window indicators (BB, RSI) ----------------------#
+
+def _window_length(indicator_name:str, params:dict) -> int:
+    """ Amount of closes, which are needed to calculate the next row
+    """
+    length = int(list(params.values())[0])
+    if indicator_name == 'RSI':
+        return RSI_WARMUP_FACTOR * length + 1
+    return length - 1
+
+
+def _init_window_state(df:pd.DataFrame, df_course:pd.DataFrame, params:dict) -> dict:
+    indicator_name = 'BB' if any(col.startswith('BBL') for col in df.columns) else 'RSI'
+    window = _window_length(indicator_name, params)
+    return {'rows': len(df), 'closes': df_course['close'].iloc[len(df_course) - window:].tolist() if window > 0 else []}
+
+
+def _update_window(indicator_name:str):
+    """ Update function of a window indicator: calculate the signals over the window + new closes, keep the new rows
+    """
+    def update(df_new_close:pd.DataFrame, params:dict, state:dict) -> (pd.DataFrame, dict):
+        closes = np.concatenate([state['closes'], df_new_close['close'].to_numpy(dtype=float)])
+        index = pd.date_range(end=df_new_close.index[-1], periods=len(closes), freq='D')  # dates of the window are not used
+        df = func_df_signals_from_indicator(indicator_name, pd.DataFrame({'close': closes}, index=index), params)
+        df = df.iloc[-len(df_new_close):].set_axis(df_new_close.index)
+        df = df[['close', *_indicator_cols(df, indicator_name), 'signal']]
+        window = _window_length(indicator_name, params)
+        state = {**state, 'closes': closes[len(closes) - window:].tolist() if window > 0 else [],
+                 'rows': state['rows'] + len(df_new_close)}
+        return df, state
+    return update
+
+
+#---------------------- MACD ----------------------#
+
+def _macd_params(params:dict) -> (int, int, int):
+    """ Same as EMABank.macd (int, default values, swap fast and slow)
+    """
+    fast, slow, signal = (list(params.values()) + [None] * 3)[:3]
+    fast = int(fast) if fast and fast > 0 else 12
+    slow = int(slow) if slow and slow > 0 else 26
+    signal = int(signal) if signal and signal > 0 else 9
+    if slow < fast:
+        fast, slow = slow, fast
+    return fast, slow, signal
+
+
+def _ema_step(ema:float, value:float, length:int) -> float:
+    """ One step of ewm(span=length, adjust=False) - same operations as pandas
+    """
+    alpha = 2 / (length + 1)
+    return ((1 - alpha) * ema + alpha * value) / ((1 - alpha) + alpha)
+
+
+def _init_macd_state(df:pd.DataFrame, df_course:pd.DataFrame, params:dict) -> dict:
+    fast, slow, signal = _macd_params(params)
+    col_MACD, col_diff, col_signal = get_indicator_col_names(df, 'MACD')
+    ema_fast = func_indicator('EMA', df_course[['close']].copy(), [fast]).iloc[-1, -1]
+    ema_slow = func_indicator('EMA', df_course[['close']].copy(), [slow]).iloc[-1, -1]
+    # Last sign of MACD - signal (0 / NaN are replaced with the last sign like in zero_crossings)
+    diff = np.sign(df[col_MACD].to_numpy() - df[col_signal].to_numpy())
+    diff = diff[(diff != 0) & ~np.isnan(diff)]
+    return {'rows': len(df), 'ema_fast': float(ema_fast), 'ema_slow': float(ema_slow),
+            'ema_signal': float(df[col_signal].iloc[-1]), 'sign': float(diff[-1]) if len(diff) else 0.0}
+
+
+def _update_macd(df_new_close:pd.DataFrame, params:dict, state:dict) -> (pd.DataFrame, dict):
+    fast, slow, signal = _macd_params(params)
+    ema_fast, ema_slow, ema_signal, sign_last = state['ema_fast'], state['ema_slow'], state['ema_signal'], state['sign']
+    rows = []
+    for close in df_new_close['close'].to_numpy(dtype=float):
+        ema_fast = _ema_step(ema_fast, close, fast)
+        ema_slow = _ema_step(ema_slow, close, slow)
+        macd = ema_fast - ema_slow
+        ema_signal = _ema_step(ema_signal, macd, signal)
+        # Crossing of MACD and signal line
+        sign = np.sign(macd - ema_signal)
+        crossing = 0
+        if sign != 0 and not np.isnan(sign):
+            crossing = int(sign) if sign * sign_last < 0 else 0
+            sign_last = sign
+        rows.append((close, macd, macd - ema_signal, ema_signal, crossing))
+    props = f'_{fast}_{slow}_{signal}'
+    df = pd.DataFrame(rows, index=df_new_close.index, columns=['close', f'MACD{props}', f'MACDh{props}', f'MACDs{props}', 'signal'])
+    df['signal'] = df['signal'].astype(np.int8)
+    state = {**state, 'ema_fast': ema_fast, 'ema_slow': ema_slow, 'ema_signal': ema_signal, 'sign': float(sign_last),
+             'rows': state['rows'] + len(df_new_close)}
+    return df, state
+
+
+_STATE_FUNCS = {   # indicator: (init state from the full calculation, update with new closes)
+    'BB': (_init_window_state, _update_window('BB')),
+    'MACD': (_init_macd_state, _update_macd),
+    'RSI': (_init_window_state, _update_window('RSI')),
+}
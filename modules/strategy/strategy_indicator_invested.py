@@ -1,34 +1,45 @@
-import matplotlib.pyplot as plt
-
-from modules.plot import *
+from modules.utils import get_intervals
+from modules.indicators import ema_bank
+from modules.stage_timer import start_stage_timer
+from modules.file_handler import *
 from modules.strategy.df_signals_invested import *
-from modules.strategy.evaluate_invested import evaluate_invested, evaluate_invested_multiple_cycles
+from modules.strategy.evaluate_invested import evaluate_invested, evaluate_invested_multiple_cycles, \
+    evaluate_invested_batch, evaluate_invested_intervals_batch
 
 
 def indicator_invested(indicator_name, course_path, params=None, offset:int=0,
                        save_plot=False, show_plot=False, base_folder:Path=None):
 
+    timer = start_stage_timer()  # None, if the stage timer is disabled
+
     # 1. Calculate full df
-    # Load course
-    df = load_pandas_from_file_path(course_path)
-    df = df[['close']]
+    # Load course (df[close] from the course cache, if filled by the study)
+    df = load_course_close(course_path)
+    if timer: timer.lap('load')
     # df[<indicators>, signal] - Calculate indicators
     df = func_df_signals_from_indicator(indicator_name, df, params)
+    if timer: timer.lap('indicator')
     # cut offset for standardization (each parameter has a different leading time until they deliver signals)
     df = df.iloc[offset:]
+    if timer: timer.lap('offset')
     # df[invested] - Calculate invested
     df = df_invested_from_signal(df)
+    if timer: timer.lap('invested')
     # df[close_perc] - Calculate daily perc change from course
     df = df_close_perc(df)
+    if timer: timer.lap('close_perc')
     # df[group_invested] - Group invested
     df = df_group_invested(df)
+    if timer: timer.lap('group')
     #print(df)
     #exit()
 
 
     # 2. Calculate evaluation
     result_dict_all = evaluate_invested(df)
+    if timer: timer.lap('evaluate_all')
     result_dict_intervals, df_summary = evaluate_invested_multiple_cycles(df)
+    if timer: timer.lap('evaluate_cycles')
     #print(json_round_dict(result_dict_all))
     #print(json_round_dict(result_dict_intervals))
     #print(df_summary)
@@ -51,9 +62,76 @@ def indicator_invested(indicator_name, course_path, params=None, offset:int=0,
             result_dict = {k: v for k, v in row_dict.items() if k not in ['start', 'end', 'Index']}
             plot(df_i, indicator_name, course_path, params, study_type, result_dict,
                  index=row.Index, save_plot=save_plot, show_plot=show_plot, base_folder=base_folder)
+    if timer:
+        timer.lap('plot')
+        timer.done(1)
 
 
     # 4. Prepare evaluation information
+    return _result_dict(result_dict_all, result_dict_intervals)
+
+
+def indicator_invested_batch(indicator_name, course_path, params_block:list, offset:int=0) -> list[dict|Exception]:
+    """ [eval, invested, n params, 1x course] Evaluate a block of params variations for one course in a single call
+    Same results as indicator_invested() for every params (without plots), but the evaluation of all params variations
+    runs at once with the vectorized kernels of evaluate_invested.py
+
+    :param indicator_name: indicator name
+    :param course_path: course path
+    :param params_block: list of params variations
+    :param offset: cut leading time (see indicator_invested)
+    :return: list of result dicts (1x per params) - if a params variation fails, its exception is at its place in the list
+    """
+    timer = start_stage_timer()  # None, if the stage timer is disabled
+
+    # 1. Calculate df[invested] for every params variation
+    df_course = load_course_close(course_path)
+    if timer: timer.lap('load')
+    list_invested = []
+    list_results = [None] * len(params_block)
+    with ema_bank(df_course['close'], get_course_cache_key(course_path)):  # every EMA length once per course for the whole study (MACD sweep)
+        for index, params in enumerate(params_block):
+            try:
+                df = func_df_signals_from_indicator(indicator_name, df_course.copy(), params)
+                if timer: timer.lap('indicator')
+                df = df.iloc[offset:]
+                if timer: timer.lap('offset')
+                df = df_invested_from_signal(df)
+                list_invested.append((index, df['invested'].to_numpy(dtype=float)))
+                if timer: timer.lap('invested')
+            except Exception as e:
+                list_results[index] = e
+    if not list_invested:
+        return list_results
+    # df[close_perc] is the same for all params variations
+    close_perc = df_close_perc(df_course.iloc[offset:].copy())['close_perc'].to_numpy(dtype=float)
+    invested = np.vstack([row for index, row in list_invested])  # 2-D (variations x days)
+    if timer: timer.lap('close_perc')
+
+    # 2. Calculate evaluation (all params variations at once)
+    result_all = evaluate_invested_batch(invested, close_perc)
+    if timer: timer.lap('evaluate_all')
+    result_intervals = evaluate_invested_intervals_batch(invested, close_perc, get_intervals(invested.shape[1]))
+    result_intervals = {key: value.mean(axis=1) for key, value in result_intervals.items()}  # mean over multiple cycles
+    if timer: timer.lap('evaluate_cycles')
+
+    # 3. Prepare evaluation information
+    for row, (index, _) in enumerate(list_invested):
+        result_dict_all = {key: float(value[row]) for key, value in result_all.items()}
+        result_dict_intervals = {key: float(value[row]) for key, value in result_intervals.items()}
+        list_results[index] = _result_dict(result_dict_all, result_dict_intervals)
+    if timer:
+        timer.lap('result')
+        timer.done(len(list_invested))
+    return list_results
+
+
+def _result_dict(result_dict_all:dict, result_dict_intervals:dict) -> dict:
+    """ [eval] Summarize the evaluation of one params variation over one course
+    :param result_dict_all: result_dict over the entire period
+    :param result_dict_intervals: result_dict as mean values over multiple cycles
+    :return: {'sorting': x, 'all': {...}, 'intervals': {...}} (rounded)
+    """
     # sorting criteria
     sorting_criteria = 'all' # [all, intervals]
     if sorting_criteria == 'all':
@@ -78,16 +156,19 @@ def indicator_invested(indicator_name, course_path, params=None, offset:int=0,
 
 def plot(df, indicator_name, course_path, params, study_type, result_dict,
          index=-1, save_plot=False, show_plot=False, base_folder:Path=None):
-    # Figure
+    # Plotting modules are imported on first use (the backtest itself runs without matplotlib)
+    from modules.plot import fig_invested_default, fig_invested_indicator, save_fig
+    # Figure (headless, if it is only saved - no pyplot, so it can be rendered in the worker processes of a study)
+    headless = not show_plot
     plot_type = 'default'  # default, indicator
     evaluation_dict_str = _calc_evaluation_to_str(result_dict)
     if plot_type == 'default':
         # 1x1 fig - course with evaluation
-        fig = fig_invested_default(df, title=evaluation_dict_str)
+        fig = fig_invested_default(df, title=evaluation_dict_str, headless=headless)
     elif plot_type == 'indicator':
         # 2x1 fig - course with evaluation + indicator
         fig = fig_invested_indicator(df, indicator_name, title1=course_path.stem, title2=f'{indicator_name}: {params}',
-                                     suptitle=evaluation_dict_str)
+                                     suptitle=evaluation_dict_str, headless=headless)
     else:
         raise ValueError(f'Wrong plot type: {plot_type}')
 
@@ -96,8 +177,8 @@ def plot(df, indicator_name, course_path, params, study_type, result_dict,
         # file path [param/symbol -> data/analyse/visualize/... , study -> data/study/Study_newest/...]
         file_path = _calc_file_path(indicator_name, course_path.stem, params, study_type, index, base_folder)
         save_fig(fig, file_path)
-        plt.close() # close figure, else it is still in memory ("Figures created through the pyplot interface (`matplotlib.pyplot.figure`) are retained until explicitly closed and may consume too much memory"
     if show_plot:
+        import matplotlib.pyplot as plt
         plt.show()
 
 
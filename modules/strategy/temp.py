@@ -3,7 +3,7 @@ from scipy.ndimage import extrema
 
 from modules.utils import pandas_print_width, pandas_print_all
 from modules.file_handler import load_pandas_from_symbol
-from modules.strategy.df_signals_invested import func_df_signals_from_indicator
+from modules.strategy.df_signals_invested import func_df_signals_from_indicator, signal_labels
 from modules.params import get_params_from_yaml
 
 from modules.plot import *
@@ -21,7 +21,7 @@ def single_evaluation_states(df):
 
 
 def evaluate_single_signals(df):
-    for index, signal in enumerate(df['signal']):
+    for index, signal in enumerate(signal_labels(df)):
         if signal in ['buy', 'sell', 'bullish', 'bearish']:
             print(signal)
             exit()
@@ -43,7 +43,7 @@ def main():
 
     # Invested
     df = func_df_signals_from_indicator(indicator_name, df, [20, 30, 20])
-    df = df[['close', 'signal']]
+    df = df[['close']].assign(signal=signal_labels(df, indicator_name))
     print(df)
     exit()
 
@@ -0,0 +1,158 @@
+""" # Aim
+Model-guided search over a params space (a budget of n evaluations instead of the full grid)
+
+Surrogate:   Gaussian process (Matern 5/2, one length scale per param) on the grid positions scaled to [0, 1]
+Acquisition: expected improvement of sorting over random grid points and the neighbours of the best params
+Batch:       n params variations per call (kriging believer - the GP mean of a selected params variation is added
+             as observation before the next one is selected), so a batch fills the workers of the study
+
+The study calls suggest_params() with all evaluated params variations so far (search='optimize')
+"""
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+from scipy.stats import norm, qmc
+
+
+N_CANDIDATES = 4096         # random grid points per selected params variation
+N_NEIGHBOURS = 64           # + random neighbours of each of the best params variations
+N_BEST = 5                  # best params variations, whose neighbours are candidates
+MAX_NEIGHBOUR_STEP = 3      # neighbour: up to n grid steps in every param
+
+
+def suggest_params(params_space:dict[str, list], observations:list[tuple[dict, float|None]], n:int=1,
+                   rng:np.random.Generator=None) -> list[dict]:
+    """ [params] Next params variations to evaluate
+    :param params_space: {key: [values]} - grid of the params
+    :param observations: [(params, sorting), ...] evaluated params variations (sorting None - failed)
+    :param n: amount of params variations
+    :param rng: random generator
+    :return: list of params variations (not in observations - less than n, if the grid is exhausted)
+
+    Until 2 * (amount params) + 2 params variations were evaluated, the params variations are spread over the grid (Latin hypercube)
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    keys = list(params_space.keys())
+    sizes = np.array([len(params_space[key]) for key in keys])
+    value_positions = [{value: position for position, value in enumerate(params_space[key])} for key in keys]
+    to_params = lambda position: {key: params_space[key][int(i)] for key, i in zip(keys, position)}
+
+    # Grid positions of the observations
+    observed = set()
+    X, y = [], []
+    for params, sorting in observations:
+        position = tuple(value_positions[i][params[key]] for i, key in enumerate(keys))
+        observed.add(position)
+        if sorting is not None and np.isfinite(sorting):
+            X.append(position)
+            y.append(sorting)
+    n = min(n, int(np.prod(sizes, dtype=float) - len(observed)))
+    if n <= 0:
+        return []
+
+    # Initial design
+    if len(y) < 2 * len(keys) + 2:
+        samples = qmc.LatinHypercube(d=len(keys), seed=rng).random(n + len(observed))
+        candidates = _unique_positions(np.floor(samples * sizes).astype(int), observed)
+        candidates += _unique_positions(_random_positions(sizes, N_CANDIDATES, rng), observed | set(candidates))
+        return [to_params(position) for position in candidates[:n]]
+
+    # Surrogate on the scaled grid positions
+    scale = np.maximum(sizes - 1, 1)
+    X = np.array(X, dtype=int)
+    y = np.array(y, dtype=float)
+    gp = _fit_gp(X / scale, (y - y.mean()) / (y.std() or 1.0))
+    y_best = gp['y'].max()
+
+    # Candidates: random grid points + neighbours of the best params variations
+    best = X[np.argsort(-y, kind='stable')[:N_BEST]]
+    steps = rng.integers(-MAX_NEIGHBOUR_STEP, MAX_NEIGHBOUR_STEP + 1, size=(len(best), N_NEIGHBOURS, len(keys)))
+    neighbours = np.clip((best[:, np.newaxis, :] + steps).reshape(-1, len(keys)), 0, sizes - 1)
+    candidates = np.array(_unique_positions(np.vstack([neighbours, _random_positions(sizes, N_CANDIDATES, rng)]), observed))
+    if not len(candidates):
+        candidates = np.array(_unique_positions(_all_positions(sizes), observed))
+
+    # Select the params variations with the highest expected improvement (batch: kriging believer)
+    selected = []
+    for _ in range(min(n, len(candidates))):
+        mean, std = _predict_gp(gp, candidates / scale)
+        index = int(np.argmax(_expected_improvement(mean, std, y_best)))
+        selected.append(tuple(candidates[index]))
+        gp = _condition_gp(gp, np.vstack([gp['X'], candidates[index] / scale]), np.append(gp['y'], mean[index]))
+        candidates = np.delete(candidates, index, axis=0)
+    return [to_params(position) for position in selected]
+
+
+#---------------------- Gaussian process ----------------------#
+
+def _matern52(X1, X2, length_scales) -> np.ndarray:
+    """ Matern 5/2 kernel (variance 1)
+    """
+    d = np.sqrt((((X1[:, np.newaxis, :] - X2[np.newaxis, :, :]) / length_scales) ** 2).sum(axis=2) * 5)
+    return (1 + d + d ** 2 / 3) * np.exp(-d)
+
+
+def _fit_gp(X, y) -> dict:
+    """ Fit the length scales and the noise (maximum marginal likelihood)
+    :param X: 2-D positions scaled to [0, 1]
+    :param y: standardized sorting
+    :return: gp dict
+    """
+    n_dim = X.shape[1]
+
+    def negative_log_likelihood(theta):
+        K = _matern52(X, X, np.exp(theta[:n_dim])) + (np.exp(theta[n_dim]) + 1e-8) * np.eye(len(X))
+        try:
+            L = cho_factor(K, lower=True)
+        except np.linalg.LinAlgError:
+            return 1e10
+        return 0.5 * y @ cho_solve(L, y) + np.log(np.diag(L[0])).sum()
+
+    bounds = [(np.log(0.01), np.log(10))] * n_dim + [(np.log(1e-6), np.log(1.0))]
+    theta = min((minimize(negative_log_likelihood, start, method='L-BFGS-B', bounds=bounds)
+                 for start in [np.log([0.2] * n_dim + [1e-2]), np.log([1.0] * n_dim + [1e-1])]),
+                key=lambda result: result.fun).x
+    gp = {'length_scales': np.exp(theta[:n_dim]), 'noise': np.exp(theta[n_dim]) + 1e-8}
+    return _condition_gp(gp, X, y)
+
+
+def _condition_gp(gp:dict, X, y) -> dict:
+    """ GP with the same hyperparameters on the observations X, y
+    """
+    K = _matern52(X, X, gp['length_scales']) + gp['noise'] * np.eye(len(X))
+    L = cho_factor(K, lower=True)
+    return {**gp, 'X': X, 'y': y, 'L': L, 'alpha': cho_solve(L, y)}
+
+
+def _predict_gp(gp:dict, X) -> (np.ndarray, np.ndarray):
+    """ Mean and standard deviation of the GP at the positions X
+    """
+    K_s = _matern52(X, gp['X'], gp['length_scales'])
+    mean = K_s @ gp['alpha']
+    variance = 1 - np.einsum('ij,ji->i', K_s, cho_solve(gp['L'], K_s.T))
+    return mean, np.sqrt(np.maximum(variance, 1e-12))
+
+
+def _expected_improvement(mean, std, y_best, xi=0.01) -> np.ndarray:
+    """ Expected improvement over y_best (maximization)
+    """
+    improvement = mean - y_best - xi
+    z = improvement / std
+    return improvement * norm.cdf(z) + std * norm.pdf(z)
+
+
+#---------------------- Grid positions ----------------------#
+
+def _random_positions(sizes, n:int, rng:np.random.Generator) -> np.ndarray:
+    return rng.integers(0, sizes, size=(n, len(sizes)))
+
+
+def _all_positions(sizes) -> np.ndarray:
+    return np.stack(np.meshgrid(*[np.arange(size) for size in sizes], indexing='ij'), axis=-1).reshape(-1, len(sizes))
+
+
+def _unique_positions(positions, observed:set) -> list[tuple]:
+    """ Positions without duplicates and without the observed positions (order is kept)
+    """
+    return [position for position in dict.fromkeys(map(tuple, positions.tolist())) if position not in observed]
@@ -0,0 +1,198 @@
+""" # Aim
+Flat results table of the studies (sqlite, 1x file per meta study: <base_folder>/results.sqlite)
+
+Row:     1x params variation on 1x course
+Columns: study, indicator, variation, course, sorting_variation (mean over the courses), sorting,
+         param_<key> (1x column per param), all_<metric>, intervals_<metric> (1x column per metric)
+
+Instead of stringified dicts in csv cells, every value has its own typed column and the table can be queried
+without loading everything (e.g. load_results_table(file_path, indicator='MACD', course=['BTC', 'ETH']))
+New params or metrics add new columns. The param columns have no declared type, so 18 stays int and 18.0 stays float
+"""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+import pandas as pd
+
+from modules.file_handler import create_dir
+
+
+RESULTS_TABLE_FILE_NAME = 'results.sqlite'
+TABLE_NAME = 'results'
+PARAM_PREFIX = 'param_'
+KEY_COLUMNS = {'study': 'TEXT', 'indicator': 'TEXT', 'variation': 'INTEGER', 'course': 'TEXT',
+               'sorting_variation': 'REAL', 'sorting': 'REAL'}
+
+
+def flatten_results(list_results:list, study:str, indicator_name:str) -> pd.DataFrame:
+    """ [df] Flatten the results of a study (1x row per params variation and course)
+    :param list_results: result dicts of the study (see _summarize_course_results)
+    :param study: study name (e.g. 'MACD_default')
+    :param indicator_name: indicator name
+    :return: df[study, indicator, variation, course, sorting_variation, sorting, param_<key>, all_<metric>, intervals_<metric>]
+
+    Input:  [{'sorting': 0.7, 'params': {'m_fast': 12, ...}, 'list_results': [{'course': 'ADA', 'sorting': 0.13, 'all': {'S': 0.02, ...}, ...}, ...]}]
+    Output:       study indicator  variation course  sorting_variation  sorting  param_m_fast  ...  all_S  ...
+            0  MACD_default   MACD          0    ADA                0.7     0.13            12  ...   0.02  ...
+    """
+    rows = []
+    for variation, result in enumerate(list_results):
+        params = result['params']
+        params = params.items() if isinstance(params, dict) else enumerate(params)  # 1x params as list -> param_0, param_1, ...
+        row_variation = {'study': study, 'indicator': indicator_name, 'variation': variation,
+                         'sorting_variation': result['sorting'], **{f'{PARAM_PREFIX}{key}': value for key, value in params}}
+        for course_result in result['list_results']:
+            rows.append(_flatten_dict(course_result, dict(row_variation)))
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return pd.DataFrame(columns=list(KEY_COLUMNS))
+    columns = list(KEY_COLUMNS) + [col for col in df.columns if col not in KEY_COLUMNS]
+    return df[columns]
+
+
+def _flatten_dict(d:dict, row:dict, prefix:str='') -> dict:
+    """ Flatten nested dicts into row like pd.json_normalize(d, sep='_') - {'all': {'S': 1}} -> {'all_S': 1}
+    (plain dicts instead of 1x json_normalize per row - studies have ~100k rows)
+    """
+    for key, value in d.items():
+        if isinstance(value, dict):
+            _flatten_dict(value, row, f'{prefix}{key}_')
+        else:
+            row[f'{prefix}{key}'] = value
+    return row
+
+
+def save_results_table(df:pd.DataFrame, file_path:Path, study:str) -> None:
+    """ [file save] Write the rows of a study to the results table (rows of the same study are replaced)
+    :param df: flatten_results() of the study
+    :param file_path: sqlite file path
+    :param study: study name (the old rows are deleted also if df is empty - e.g. every params variation failed)
+    """
+    if not df.empty and not (df['study'] == study).all():
+        raise ValueError(f'df contains rows of other studies than "{study}": {list(df["study"].unique())}')
+    file_path = Path(file_path)  # Make sure path is a Path object
+    create_dir(file_path.parent)
+    with closing(sqlite3.connect(file_path)) as connection, connection:
+        _create_table(connection)
+        # New params / metrics -> new columns
+        columns = _get_columns(connection)
+        for col in df.columns:
+            if col not in columns:
+                connection.execute(f'ALTER TABLE {TABLE_NAME} ADD COLUMN {_quote(col)} {_column_type(col, df[col])}')
+        connection.execute(f'DELETE FROM {TABLE_NAME} WHERE study = ?', (study,))
+        if not df.empty:
+            cols = ', '.join(_quote(col) for col in df.columns)
+            placeholders = ', '.join('?' * len(df.columns))
+            values = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+            connection.executemany(f'INSERT INTO {TABLE_NAME} ({cols}) VALUES ({placeholders})', values)
+
+
+def load_results_table(file_path:Path, columns:list=None, **filters) -> pd.DataFrame:
+    """ [file load] Query the results table
+    :param file_path: sqlite file path
+    :param columns: selected columns (None - all)
+    :param filters: column=value or column=[values], e.g. indicator='MACD', course=['BTC', 'ETH']
+    :return: df (columns without any value in the selected rows are removed, if columns is None)
+    """
+    file_path = Path(file_path)  # Make sure path is a Path object
+    if not file_path.exists():
+        raise FileNotFoundError(f'File "{file_path}" does not exist')
+    where, values = _where(filters)
+    cols = ', '.join(_quote(col) for col in columns) if columns else '*'
+    with closing(sqlite3.connect(file_path)) as connection:
+        df = pd.read_sql_query(f'SELECT {cols} FROM {TABLE_NAME}{where}', connection, params=values)
+    if not columns:
+        df = df.dropna(axis=1, how='all')  # columns of other indicators
+    return df
+
+
+def get_ranking(file_path:Path, study:str) -> pd.DataFrame:
+    """ Ranking of the params variations of a study (mean over the courses, sorted by sorting_variation)
+    :param file_path: sqlite file path
+    :param study: study name
+    :return: df[sorting, param_<key>, ..., all_<metric>, intervals_<metric>, courses] - 1x row per params variation
+    """
+    return rank_results(load_results_table(file_path, study=study))
+
+
+def rank_results(df:pd.DataFrame) -> pd.DataFrame:
+    """ Ranking of the params variations of flat results (see get_ranking)
+    :param df: flatten_results() / load_results_table() of one study
+    :return: df[sorting, param_<key>, ..., all_<metric>, intervals_<metric>, courses] - 1x row per params variation
+    """
+    if df.empty:
+        return df
+    df = df.dropna(axis=1, how='all')
+    param_cols = [col for col in df.columns if col.startswith(PARAM_PREFIX)]
+    metric_cols = [col for col in df.columns if col not in KEY_COLUMNS and col not in param_cols]
+    group = df.groupby('variation', sort=False)
+    df_ranking = pd.concat([
+        group['sorting_variation'].first().rename('sorting'),
+        group[param_cols].first(),
+        group[metric_cols].mean(),
+        group['course'].count().rename('courses'),
+    ], axis=1)
+    return df_ranking.sort_values(by='sorting', ascending=False, kind='stable')
+
+
+def get_best_params_from_table(file_path:Path, study:str, n:int=5) -> list[dict|list]:
+    """ The best n params variations of a study
+    :param file_path: sqlite file path
+    :param study: study name
+    :param n: how many params
+    :return: list of params (same types as in the study)
+    """
+    with closing(sqlite3.connect(file_path)) as connection:
+        param_cols = [col for col in _get_columns(connection) if col.startswith(PARAM_PREFIX)]
+        rows = connection.execute(
+            f'SELECT {", ".join(_quote(col) for col in param_cols)} FROM {TABLE_NAME} WHERE study = ? '
+            f'GROUP BY variation ORDER BY MAX(sorting_variation) DESC, variation LIMIT ?', (study, n)).fetchall()
+    list_params = []
+    for row in rows:
+        params = {col[len(PARAM_PREFIX):]: value for col, value in zip(param_cols, row) if value is not None}
+        list_params.append(list(params.values()) if all(key.isdigit() for key in params) else params)
+    return list_params
+
+
+#---------------------- sqlite ----------------------#
+
+def _create_table(connection:sqlite3.Connection) -> None:
+    columns = ', '.join(f'{col} {col_type}' for col, col_type in KEY_COLUMNS.items())
+    connection.execute(f'CREATE TABLE IF NOT EXISTS {TABLE_NAME} ({columns})')
+    connection.execute(f'CREATE INDEX IF NOT EXISTS idx_study ON {TABLE_NAME} (study, variation)')
+    connection.execute(f'CREATE INDEX IF NOT EXISTS idx_indicator_course ON {TABLE_NAME} (indicator, course)')
+
+
+def _get_columns(connection:sqlite3.Connection) -> list[str]:
+    return [row[1] for row in connection.execute(f'PRAGMA table_info({TABLE_NAME})')]
+
+
+def _column_type(col:str, values:pd.Series) -> str:
+    """ Declared type of a new column (params: no type - every value keeps its own type)
+    """
+    if col.startswith(PARAM_PREFIX):
+        return ''
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_integer_dtype(values):
+        return 'INTEGER'
+    if pd.api.types.is_numeric_dtype(values):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _where(filters:dict) -> (str, list):
+    """ {'indicator': 'MACD', 'course': ['BTC', 'ETH']} -> ' WHERE "indicator" = ? AND "course" IN (?, ?)', ['MACD', 'BTC', 'ETH']
+    """
+    conditions, values = [], []
+    for col, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            conditions.append(f'{_quote(col)} IN ({", ".join("?" * len(value))})')
+            values.extend(value)
+        else:
+            conditions.append(f'{_quote(col)} = ?')
+            values.append(value)
+    return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), values
+
+
+def _quote(col:str) -> str:
+    return '"' + col.replace('"', '""') + '"'
@@ -1,29 +1,90 @@
 
 from typing import Any
+import json
+import math
+import itertools
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from functools import partial
 import pandas as pd
 from pathlib import Path
 
 from modules.utils import pandas_print_width, json_round_dict
-from modules.file_handler import get_path, save_pandas_to_file
+from modules.file_handler import get_path, save_pandas_to_file, fill_course_cache, clear_course_cache, \
+    append_jsonl, load_jsonl
 from modules.course import get_courses_paths
-from modules.params import get_params_variation
+from modules.params import get_params_variation, get_params_space, ParamSpace
 from modules.error_handling import log_error
-from modules.strategy.strategy_indicator_invested import indicator_invested
+from modules.indicator_cache import enable_indicator_cache, get_indicator_cache_settings
+from modules.indicators import set_indicator_engine, get_indicator_engine, clear_ema_banks
+from modules.stage_timer import enable_stage_timer, stage_timer_enabled, reset_stage_times, pop_stage_times, \
+    add_stage_times, get_stage_times, format_stage_times
+from modules.strategy.strategy_indicator_invested import indicator_invested, indicator_invested_batch
+from modules.study.results_table import RESULTS_TABLE_FILE_NAME, flatten_results, save_results_table, get_ranking, \
+    rank_results, get_best_params_from_table
+
+
+OFFSET = 200            # cut leading time for standardization (each parameter has a different leading time until they deliver signals)
+BLOCK_SIZE = 50         # params variations per work unit (evaluated in a single call for one course)
+BLOCK_SIZE_PLOT = 1     # [save_plot] params variations per work unit (rendering the figures is the expensive part -> small units spread evenly over the workers)
+PREFETCH_FACTOR = 4     # [workers > 1] submitted blocks per worker, before the results are collected in order
+CHECKPOINT_FILE_NAME = 'checkpoint.jsonl'   # append-only store of the finished params variations (in the study folder)
+SEARCH_MODES = ['grid', 'halving', 'optimize']  # grid - every params variation on every course, halving - successive halving over the courses, optimize - model-guided search
+HALVING_ETA = 3         # [halving] keep the best 1/eta params variations per round, widen the courses by the factor eta
+HALVING_MIN_COURSES = 2 # [halving] courses in the first round
+OPTIMIZE_BUDGET = 300   # [optimize] evaluated params variations (default)
+OPTIMIZE_SOURCE_PARAMS = 'brute_force'  # [optimize] params space, if source_params is None / 'default' (1x params variation - nothing to search)
+OPTIMIZE_BATCH = 10     # [optimize] params variations suggested at once (at least 1 per worker)
+N_BEST_PARAMS_PLOT = 2  # [save_evaluation] the best n params variations are plotted at the end of a study
+STAGE_TIMES_SUFFIX = '_stages'              # [stage timer] per-stage breakdown next to the result file (<result file>_stages.csv)
+
+_worker = {'active': False}                 # True in the worker processes of the study
 
 
 def manager_study_indicator_invested(indicator_name:str, source_courses:Any='default', source_params:Any='default',
-                                     save_evaluation=False, save_plot=False, base_folder:Path=None) -> None:
+                                     save_evaluation=False, save_plot=False, base_folder:Path=None, workers:int=1,
+                                     resume=False, search='grid', budget:int=OPTIMIZE_BUDGET, shard:tuple[int, int]=None) -> None:
     """ [Loop fig] Manager to plot and save (visualize) strategies
     :param indicator_name: indicator name
     :param source_courses: multiple sources possible: course_selection_key / list symbol_names / list symbol paths
     :param source_params: different sources possible - key_course_selection / list_params_variations / None (default key_course_selection) / 1x as dict / 1x as list
+                          [optimize] key_course_selection / dict of the params grid (None / 'default' - OPTIMIZE_SOURCE_PARAMS)
     :param save_evaluation: save evaluation results and visualize the best parameters
     :param save_plot: plot all parameters
     :param base_folder: base folder for the output
+    :param workers: number of processes (1 - serial, >1 - spread the (params x course) work units across a process pool)
+    :param resume: [save_evaluation] continue the study in base_folder - skip the params variations in the checkpoint
+    :param search: 'grid' - every params variation on every course, 'halving' - successive halving over the courses (see _search_halving),
+                   'optimize' - model-guided search in the params grid of source_params (see _search_optimize)
+    :param budget: [optimize] amount of evaluated params variations
+    :param shard: [grid] (i, n) - evaluate only part i of n of the params variations (multiple machines, same base_folder)
+                  -> own result file and checkpoint per shard, merge_study_shards() combines them and plots the best params
     """
+    if search not in SEARCH_MODES:
+        raise ValueError(f'Wrong search "{search}" - not in {SEARCH_MODES}')
+    if search != 'grid' and (resume or save_plot):
+        raise ValueError(f'search="{search}" does not support resume or save_plot (the best params are plotted after the search): '
+                         f'resume={resume}, save_plot={save_plot}')
+    if shard is not None:
+        if search != 'grid' or not save_evaluation:
+            raise ValueError(f'shard needs search="grid" and save_evaluation=True: search={search}, save_evaluation={save_evaluation}')
+        if not (len(shard) == 2 and shard[1] >= 1 and 0 <= shard[0] < shard[1]):
+            raise ValueError(f'Wrong shard {shard} - needs (i, n) with n >= 1 and 0 <= i < n')
     # Prepare variables (from different sources to one format)
     courses_paths = get_courses_paths(source_courses) # list of course paths for the study
-    params_variations = get_params_variation(indicator_name, source_params) # list of param variations
+    if search == 'optimize':
+        if source_params in [None, 'default']:
+            source_params = OPTIMIZE_SOURCE_PARAMS
+        params_space = get_params_space(indicator_name, source_params) # grid of the params (the combinations are not calculated)
+        params_variations = []
+    else:
+        params_variations = get_params_variation(indicator_name, source_params) # list of param variations (ParamSpace for a key from yaml - streamed, not calculated up front)
+    if shard is not None:
+        # Deterministic part of the params variations (contiguous range, same on every machine)
+        i, n = shard
+        params_variations = params_variations[len(params_variations) * i // n:len(params_variations) * (i + 1) // n]
+        print(f'Shard {i}/{n}: {len(params_variations)} params variations')
     #print('courses_paths:', courses_paths)
     #print('params_variations:', params_variations)
 
@@ -31,52 +92,315 @@ def manager_study_indicator_invested(indicator_name:str, source_courses:Any='def
     # Storage location for the results
     if not base_folder:
         base_folder = get_path() / f'data/study/_Temp'
-    if isinstance(source_courses, str):
-        folder_path_param_study = base_folder / f'{indicator_name}_{source_courses}'
-        file_name_param_study = f'{indicator_name}_{source_courses}_{pd.Timestamp.now().strftime("%Y-%m-%d_%H-%M-%S")}.csv'
+    folder_path_param_study, name_param_study = get_study_folder(indicator_name, source_courses, base_folder)
+    if shard is not None:
+        file_path_param_study = folder_path_param_study / f'{name_param_study}_shard-{shard[0]}-of-{shard[1]}.csv'
+        file_path_checkpoint = folder_path_param_study / _shard_checkpoint_file_name(*shard)
     else:
-        folder_path_param_study = base_folder / f'{indicator_name}'
-        file_name_param_study = f'{indicator_name}_{pd.Timestamp.now().strftime("%Y-%m-%d_%H-%M-%S")}.csv'
-    file_path_param_study = folder_path_param_study / file_name_param_study
+        file_path_param_study = folder_path_param_study / f'{name_param_study}_{pd.Timestamp.now().strftime("%Y-%m-%d_%H-%M-%S")}.csv'
+        file_path_checkpoint = folder_path_param_study / CHECKPOINT_FILE_NAME
 
 
-    # Run study over all params
+    # Checkpoint - every finished params variation is appended, so a killed study can be resumed
     list_results = []
-    for index, params in enumerate(params_variations):
-        try:
-            result = eval_indicator_invested_with_multiple_symbols(indicator_name, courses_paths, params, save_plot, folder_path_param_study)
-            result = json_round_dict(result)
-            print(
-                f'{index + 1}/{len(params_variations)}: \t\t'  # index
-                f"sorting: {result['sorting']}, params: {result['params']}"
-            )
-            list_results.append(result)
-
-            # Save intermediate results
-            if save_evaluation and index % 500 == 0:
-                save_evaluation_results(list_results, file_path_param_study)
-
-            """ Flatten result (of one param over multiple courses)
-            df = pd.json_normalize(result['list_results'], sep='_')
-            print(df)
-            exit()
-            """
-        except Exception as e:
-            print(f'Error occurred for param: {params}')
-            log_error(e, True, folder_path_param_study)
+    if resume:
+        if not save_evaluation:
+            raise ValueError(f'resume needs save_evaluation=True (checkpoint), got save_evaluation={save_evaluation}')
+        checkpoint = load_checkpoint(file_path_checkpoint)
+        amount_variations = len(params_variations)
+        params_variations = _skip_checkpoint(params_variations, checkpoint, list_results)  # lazy (streamed, one pass)
+        print(f'Resume: {len(checkpoint)} params variations in the checkpoint, {amount_variations} params variations in total')
+    else:
+        if save_evaluation:
+            file_path_checkpoint.unlink(missing_ok=True)  # new study
+        amount_variations = len(params_variations)
+
+
+    # Load every course once for the whole study (instead of once per params variation)
+    fill_course_cache(courses_paths)
+    if stage_timer_enabled():
+        reset_stage_times()
+
+    # Run study over all params
+    if search == 'halving':
+        # Successive halving - only the remaining params variations of the last round (evaluated on all courses)
+        list_results = _search_halving(indicator_name, courses_paths, params_variations, folder_path_param_study, workers)
+    elif search == 'optimize':
+        # Model-guided search - the budget of params variations (evaluated on all courses)
+        list_results = _search_optimize(indicator_name, courses_paths, params_space, budget, folder_path_param_study, workers)
+    else:
+        evaluations = _iter_params_evaluations(indicator_name, courses_paths, params_variations, save_plot,
+                                               folder_path_param_study, workers)
+        for index, params, get_result in evaluations:
+            try:
+                result = get_result()
+                result = json_round_dict(result)
+                list_results.append(result)
+                print(
+                    f'{len(list_results)}/{amount_variations}: \t\t'  # index
+                    f"sorting: {result['sorting']}, params: {result['params']}"
+                    + (f' \t\t{format_stage_times()}' if stage_timer_enabled() else '')
+                )
+
+                # Save result to the checkpoint
+                if save_evaluation:
+                    append_jsonl({'key': _params_key(params), 'result': result}, file_path_checkpoint)
+
+                """ Flatten result (of one param over multiple courses)
+                df = pd.json_normalize(result['list_results'], sep='_')
+                print(df)
+                exit()
+                """
+            except Exception as e:
+                print(f'Error occurred for param: {params}')
+                log_error(e, True, folder_path_param_study)
 
 
     # Finish
+    clear_course_cache()
+    clear_ema_banks()
     if save_evaluation:
-        # Save all evaluations
-        save_evaluation_results(list_results, file_path_param_study)
-        if not save_plot: # if save_plot then all parameters are already saved
-            # Plot the best params (call this currently running function again)
-            n = 2
-            list_params = get_best_params(list_results, n)
-            print(f'Start visualizing the best {n} params for the indicator {indicator_name}: {list_params}')
-            manager_study_indicator_invested(indicator_name, source_courses, list_params,
-                                         save_evaluation=False, save_plot=True, base_folder=base_folder)
+        # Save all evaluations (results table of the meta study + sorted ranking; shard: only the ranking, the table after merge_study_shards)
+        file_path_table = base_folder / RESULTS_TABLE_FILE_NAME if shard is None else None
+        save_evaluation_results(list_results, file_path_param_study, name_param_study, indicator_name, file_path_table)
+        if stage_timer_enabled():
+            save_pandas_to_file(get_stage_times(), file_path_param_study.parent, file_path_param_study.stem + STAGE_TIMES_SUFFIX)
+        if not save_plot and shard is None: # if save_plot then all parameters are already saved (shard: after merge_study_shards)
+            _plot_best_params(indicator_name, source_courses, file_path_table, name_param_study, base_folder, workers)
+
+
+def _plot_best_params(indicator_name:str, source_courses:Any, file_path_table:Path, study:str, base_folder:Path,
+                      workers:int=1) -> None:
+    """ Plot the best params of a study (call manager_study_indicator_invested again)
+    """
+    n = N_BEST_PARAMS_PLOT
+    list_params = get_best_params(file_path_table, n, study)
+    if not list_params:  # no results (every params variation failed)
+        print(f'No params to visualize for the indicator {indicator_name}')
+        return
+    print(f'Start visualizing the best {n} params for the indicator {indicator_name}: {list_params}')
+    manager_study_indicator_invested(indicator_name, source_courses, list_params,
+                                     save_evaluation=False, save_plot=True, base_folder=base_folder, workers=workers)
+
+
+def get_study_folder(indicator_name:str, source_courses:Any, base_folder:Path) -> (Path, str):
+    """ Folder and file name prefix of the study of one indicator
+    :return: folder path, name ('BB_default' for a course_selection_key, else 'BB')
+    """
+    name = f'{indicator_name}_{source_courses}' if isinstance(source_courses, str) else f'{indicator_name}'
+    return base_folder / name, name
+
+
+def _shard_checkpoint_file_name(i:int, n:int) -> str:
+    return f'{Path(CHECKPOINT_FILE_NAME).stem}_shard-{i}-of-{n}{Path(CHECKPOINT_FILE_NAME).suffix}'
+
+
+def merge_study_shards(indicator_name:str, source_courses:Any, base_folder:Path, n_shards:int,
+                       plot_best_params=True, workers:int=1) -> Path:
+    """ Merge the results of a sharded study (manager_study_indicator_invested(..., shard=(i, n)) on multiple machines)
+    into the same sorted result file and best params plots as a single study
+    :param indicator_name: indicator name
+    :param source_courses: source_courses of the study (folder name)
+    :param base_folder: base folder of the study (shared by all shards)
+    :param n_shards: amount of shards n
+    :param plot_best_params: plot the best params (like a single study)
+    :param workers: number of processes for the plots
+    :return: file path of the merged result file
+
+    A shard is finished, if its result file exists. The results are read from the checkpoints (not rounded by the csv)
+    in the order of the shards -> same order as a single study
+    """
+    folder_path_param_study, name_param_study = get_study_folder(indicator_name, source_courses, base_folder)
+    missing = [i for i in range(n_shards) if not (folder_path_param_study / f'{name_param_study}_shard-{i}-of-{n_shards}.csv').exists()]
+    if missing:
+        raise FileNotFoundError(f'Shards {missing} of {n_shards} are not finished in "{folder_path_param_study}"')
+    list_results = []
+    for i in range(n_shards):
+        checkpoint = load_checkpoint(folder_path_param_study / _shard_checkpoint_file_name(i, n_shards))
+        list_results.extend(checkpoint.values())
+    print(f'Merge {n_shards} shards of {name_param_study}: {len(list_results)} params variations')
+
+    file_path_param_study = folder_path_param_study / f'{name_param_study}_{pd.Timestamp.now().strftime("%Y-%m-%d_%H-%M-%S")}.csv'
+    file_path_table = base_folder / RESULTS_TABLE_FILE_NAME
+    save_evaluation_results(list_results, file_path_param_study, name_param_study, indicator_name, file_path_table)
+    if plot_best_params:
+        _plot_best_params(indicator_name, source_courses, file_path_table, name_param_study, base_folder, workers)
+    return file_path_param_study
+
+
+def _iter_params_evaluations(indicator_name:str, course_paths:list, params_variations,
+                             save_plot=False, base_folder:Path=None, workers:int=1):
+    """ [generator] Evaluate all params variations (serial or in a process pool)
+    :param indicator_name: indicator name
+    :param course_paths: list of course paths
+    :param params_variations: list / ParamSpace / iterable of param variations (streamed in blocks)
+    :param save_plot: save plot
+    :param base_folder: storage base folder
+    :param workers: number of processes (1 - serial)
+    :return: yield (index, params, get_result) in the order of params_variations
+
+    Work unit: (block of params variations, course) -> _eval_course_block()
+    get_result() returns the result dict of one params variation over all courses or raises its error,
+    so the caller handles errors the same way for both modes
+    """
+    block_size = BLOCK_SIZE_PLOT if save_plot else BLOCK_SIZE
+    blocks = _iter_blocks(params_variations, block_size)
+
+    # Serial - evaluate block by block
+    if workers <= 1:
+        for start, params_block in blocks:
+            futures = []
+            for course_path in course_paths:
+                future = Future()
+                try:
+                    future.set_result(_eval_course_block(indicator_name, course_path, params_block, save_plot, base_folder))
+                except Exception as e:
+                    future.set_exception(e)
+                futures.append(future)
+            yield from _iter_block_results(start, params_block, futures)
+        return
+
+    # Parallel - results are collected in the order of params_variations
+    # (every worker process fills its own course cache once)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(course_paths, get_indicator_cache_settings(), stage_timer_enabled(),
+                                       get_indicator_engine())) as executor:
+        pending = deque()
+        for start, params_block in blocks:
+            futures = [executor.submit(_eval_course_block, indicator_name, course_path, params_block, save_plot, base_folder)
+                       for course_path in course_paths]
+            pending.append((start, params_block, futures))
+            # Limit the amount of submitted work units (memory)
+            if len(pending) >= workers * PREFETCH_FACTOR:
+                yield from _iter_block_results(*pending.popleft())
+        while pending:
+            yield from _iter_block_results(*pending.popleft())
+
+
+def _iter_blocks(params_variations, block_size:int):
+    """ [generator] Split the params variations into blocks (only one block is in memory)
+    :return: yield (index of the first params variation, list of params variations)
+    """
+    if isinstance(params_variations, ParamSpace):
+        yield from params_variations.chunks(block_size)
+        return
+    iterator = iter(params_variations)
+    start = 0
+    while params_block := list(itertools.islice(iterator, block_size)):
+        yield start, params_block
+        start += len(params_block)
+
+
+def _search_halving(indicator_name:str, course_paths:list, params_variations:list,
+                    base_folder:Path=None, workers:int=1) -> list[dict]:
+    """ [search] Successive halving over the courses
+    :param indicator_name: indicator name
+    :param course_paths: list of course paths (the first ones are used in the first rounds)
+    :param params_variations: list / ParamSpace of param variations
+    :param base_folder: storage base folder (errors)
+    :param workers: number of processes (1 - serial)
+    :return: list of result dicts of the params variations in the last round (evaluated on all courses)
+
+    Round 1:     all params variations on the first HALVING_MIN_COURSES courses
+    Next rounds: the best 1/HALVING_ETA params variations (by sorting) on HALVING_ETA times more courses
+                 (only the new courses are evaluated, the results of the former rounds are kept)
+    Last round:  the remaining params variations on all courses -> same result dicts as the grid search
+
+    e.g. 200 courses, eta 3: 2 -> 6 -> 18 -> 54 -> 162 -> 200 courses, ~7 instead of 200 evaluations per params variation
+    """
+    candidates = {_params_key(params): (params, []) for params in params_variations}  # {key: (params, list_results of the evaluated courses)}
+    n_evaluated, n_courses = 0, min(HALVING_MIN_COURSES, len(course_paths))
+    while True:
+        # Evaluate the candidates on the new courses
+        results = {}
+        evaluations = _iter_params_evaluations(indicator_name, course_paths[n_evaluated:n_courses],
+                                               [params for params, _ in candidates.values()], False, base_folder, workers)
+        for index, params, get_result in evaluations:
+            try:
+                list_results = candidates[_params_key(params)][1] + get_result()['list_results']
+                results[_params_key(params)] = _summarize_course_results(params, list_results)
+            except Exception as e:
+                print(f'Error occurred for param: {params}')
+                log_error(e, True, base_folder)
+        n_evaluated = n_courses
+        ranking = sorted(results.values(), key=lambda result: result['sorting'], reverse=True)
+        print(f'Halving: {len(ranking)} params variations on {n_courses}/{len(course_paths)} courses'
+              + (f" - best sorting: {ranking[0]['sorting']:.3f}, params: {ranking[0]['params']}" if ranking else '')
+              + (f' - {format_stage_times()}' if stage_timer_enabled() else ''))
+        if n_evaluated >= len(course_paths) or not ranking:
+            return [json_round_dict(result) for result in ranking]
+
+        # Keep the best 1/eta and widen the courses
+        ranking = ranking[:math.ceil(len(ranking) / HALVING_ETA)]
+        candidates = {_params_key(result['params']): (result['params'], result['list_results']) for result in ranking}
+        n_courses = min(n_courses * HALVING_ETA, len(course_paths))
+
+
+def _search_optimize(indicator_name:str, course_paths:list, params_space:dict[str, list], budget:int=OPTIMIZE_BUDGET,
+                     base_folder:Path=None, workers:int=1) -> list[dict]:
+    """ [search] Model-guided search in the params grid
+    :param indicator_name: indicator name
+    :param course_paths: list of course paths
+    :param params_space: {key: [values]} - grid of the params
+    :param budget: amount of evaluated params variations
+    :param base_folder: storage base folder (errors)
+    :param workers: number of processes (1 - serial)
+    :return: list of result dicts of all evaluated params variations (evaluated on all courses)
+
+    Every round the surrogate (modules/study/optimizer.py) suggests the next OPTIMIZE_BATCH params variations
+    from the sorting of all params variations evaluated so far
+    """
+    from modules.study.optimizer import suggest_params  # scipy is only imported for the model guided search
+    rng = np.random.default_rng()
+    list_results = []
+    observations = []   # [(params, sorting)] - sorting None, if the params variation failed
+    while len(observations) < budget:
+        params_batch = suggest_params(params_space, observations, min(max(OPTIMIZE_BATCH, workers), budget - len(observations)), rng)
+        if not params_batch:
+            break  # every params variation of the grid is evaluated
+        for index, params, get_result in _iter_params_evaluations(indicator_name, course_paths, params_batch, False,
+                                                                   base_folder, workers):
+            try:
+                result = get_result()
+                observations.append((params, result['sorting']))
+                list_results.append(json_round_dict(result))
+                print(
+                    f'{len(observations)}/{budget}: \t\t'  # index
+                    f"sorting: {list_results[-1]['sorting']}, params: {params}"
+                    + (f' \t\t{format_stage_times()}' if stage_timer_enabled() else '')
+                )
+            except Exception as e:
+                observations.append((params, None))
+                print(f'Error occurred for param: {params}')
+                log_error(e, True, base_folder)
+    return list_results
+
+
+def _init_worker(course_paths:list, indicator_cache_settings:dict|None, stage_timer:bool=False,
+                 indicator_engine:str='pandas_ta') -> None:
+    """ Initialize a worker process like the main process (course cache, indicator cache, stage timer, indicator engine)
+    """
+    _worker['active'] = True
+    fill_course_cache(course_paths)
+    if indicator_cache_settings:
+        enable_indicator_cache(**indicator_cache_settings)
+    if stage_timer:
+        enable_stage_timer()
+    set_indicator_engine(indicator_engine)
+
+
+def _iter_block_results(start:int, params_block:list, futures:list):
+    """ [generator] Yield (index, params, get_result) for every params variation of one block
+    :param start: index of the first params variation of the block
+    :param params_block: list of params variations
+    :param futures: 1x future per course - result of _eval_course_block()
+    """
+    for offset, params in enumerate(params_block):
+        yield start + offset, params, partial(_collect_course_results, params, offset, futures)
+    # Stage times of the worker processes
+    for future in futures:
+        if future.done() and not future.exception():
+            add_stage_times(future.result()[1])
 
 
 def eval_indicator_invested_with_multiple_symbols(
@@ -90,19 +414,72 @@ def eval_indicator_invested_with_multiple_symbols(
     :param base_folder: storage base folder
     :return: result dict (evaluation for 1x params over multiple courses)
     """
-    OFFSET = 200
     list_results = []
     for index, course_path in enumerate(course_paths):
         #print(f'{index + 1}/{len(course_paths)}: {course_path.stem}')
-        result = {
-            'course': course_path.stem,
-            **indicator_invested(indicator_name, course_path, params=params, offset=OFFSET,
-                                 save_plot=save_plot, base_folder=base_folder)
-        }
+        result = _eval_course(indicator_name, course_path, params, save_plot, base_folder)
         list_results.append(result)
     #print(list_results)
     #exit()
+    return _summarize_course_results(params, list_results)
+
+
+def _eval_course(indicator_name:str, course_path:Path, params:dict|list, save_plot=False, base_folder:Path=None) -> dict:
+    """ [eval, invested, 1x param, 1x course] Evaluate one params variation for one course
+    :return: result dict of indicator_invested() with the course name
+    """
+    return {
+        'course': course_path.stem,
+        **indicator_invested(indicator_name, course_path, params=params, offset=OFFSET,
+                             save_plot=save_plot, base_folder=base_folder)
+    }
+
+
+def _eval_course_block(indicator_name:str, course_path:Path, params_block:list,
+                       save_plot=False, base_folder:Path=None) -> (list[dict|Exception], dict|None):
+    """ [eval, invested, n params, 1x course] Work unit of the study (also called in the worker processes)
+    :return: list of result dicts with the course name (1x per params) - exception at the place of a failed params variation,
+             stage times of the work unit (only in a worker process with the stage timer, else None)
+    """
+    if save_plot:
+        # Every params variation on its own (plots need the full df)
+        list_results = []
+        for params in params_block:
+            try:
+                list_results.append(_eval_course(indicator_name, course_path, params, save_plot, base_folder))
+            except Exception as e:
+                list_results.append(e)
+    else:
+        # All params variations in a single call
+        list_results = indicator_invested_batch(indicator_name, course_path, params_block, offset=OFFSET)
+        list_results = [result if isinstance(result, Exception) else {'course': course_path.stem, **result}
+                        for result in list_results]
+    return list_results, pop_stage_times() if _worker['active'] else None
+
 
+def _collect_course_results(params:dict|list, index:int, futures:list) -> dict:
+    """ Wait for the work units of one params variation and summarize them
+    future.result() raises the error of a failed work unit (or of the worker process)
+    :param params: 1x params
+    :param index: index of the params variation in the block
+    :param futures: 1x future per course - result of _eval_course_block()
+    :return: result dict of the params variation over all courses
+    """
+    list_results = []
+    for future in futures:
+        result = future.result()[0][index]
+        if isinstance(result, Exception):
+            raise result
+        list_results.append(result)
+    return _summarize_course_results(params, list_results)
+
+
+def _summarize_course_results(params:dict|list, list_results:list) -> dict:
+    """ Summarize the results of one params variation over multiple courses
+    :param params: 1x params
+    :param list_results: list of result dicts (1x per course)
+    :return: result dict
+    """
     df_summary = pd.DataFrame(list_results)
     #print(df_summary)
     #exit()
@@ -117,28 +494,75 @@ def eval_indicator_invested_with_multiple_symbols(
     return result_dict
 
 
-def save_evaluation_results(list_results:list, file_path:Path) -> None:
-    """ [file save] Save evaluation results (intermediate or full)
-    list_results -> convert to df -> sort df -> save df to file
+def _params_key(params:dict|list) -> str:
+    """ Unique key of a params variation (independent of the dict order)
+    {'m_slow': 20, 'm_fast': 10} -> '{"m_fast": 10, "m_slow": 20}'
+    """
+    return json.dumps(params, sort_keys=True)
+
+
+def _skip_checkpoint(params_variations, checkpoint:dict, list_results:list):
+    """ [generator] Stream the params variations, which are not in the checkpoint (one pass, no key list of the grid)
+    :param params_variations: list / ParamSpace / iterable of param variations
+    :param checkpoint: load_checkpoint()
+    :param list_results: the results of the checkpointed params variations are appended (once per key, in grid order)
+    :return: yield params
+    """
+    seen = set()  # keys of the checkpoint already taken (bounded by the size of the checkpoint)
+    for params in params_variations:
+        key = _params_key(params)
+        if key not in checkpoint:
+            yield params
+        elif key not in seen:
+            seen.add(key)
+            list_results.append(checkpoint[key])
+
+
+def load_checkpoint(file_path:Path) -> dict:
+    """ [file load] Load the finished params variations of a study
+    :param file_path: checkpoint file path
+    :return: {params_key: result} (empty, if there is no checkpoint)
+    """
+    return {record['key']: record['result'] for record in load_jsonl(file_path)}
+
+
+def save_evaluation_results(list_results:list, file_path:Path, study:str=None, indicator_name:str=None,
+                            file_path_table:Path=None) -> None:
+    """ [file save] Save evaluation results (at the end of the study)
+    list_results -> flat rows (1x per params variation and course) -> results table -> ranking -> save ranking to file
 
     :param list_results: evaluation results (over multiple symbols)
-    :param file_path: file path
+    :param file_path: file path of the ranking (csv: 1x row per params variation with the param and metric columns)
+    :param study: study name in the results table (default file name)
+    :param indicator_name: indicator name in the results table
+    :param file_path_table: results table (sqlite, see results_table.py) - None: only the ranking
     :return: None
     """
-    # Summaries all results in one df
-    df_summary = pd.DataFrame(list_results)
-    # Sort dict
-    df_sorted = df_summary.sort_values(by='sorting', ascending=False)
+    study = study or file_path.stem
+    # Flat results (no dicts in the cells)
+    df_results = flatten_results(list_results, study, indicator_name)
+    # Ranking (read from the results table)
+    if file_path_table:
+        save_results_table(df_results, file_path_table, study)
+        df_ranking = get_ranking(file_path_table, study)
+    else:
+        df_ranking = rank_results(df_results)
     # Save result to file
-    save_pandas_to_file(df_sorted, file_path.parent, file_path.stem)
+    save_pandas_to_file(df_ranking, file_path.parent, file_path.stem)
 
 
-def get_best_params(list_results:list, n=5):
+def get_best_params(source_results:list|Path, n=5, study:str=None):
     """ Return the best n params from study
-    :param list_results: evaluation results (over multiple symbols)
+    :param source_results: evaluation results (over multiple symbols) / results table (sqlite file path)
     :param n: how many params
+    :param study: [results table] study name
     :return: list of the best n params
     """
+    if isinstance(source_results, (str, Path)):
+        if not study:
+            raise ValueError(f'get_best_params from the results table "{source_results}" needs a study name')
+        return get_best_params_from_table(source_results, study, n)
+    list_results = source_results
     # Summaries all results in one df
     df_summary = pd.DataFrame(list_results)
     # Sort dict
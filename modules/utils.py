@@ -79,16 +79,18 @@ def get_period(period='D'):
     return freq
 
 
-def get_intervals(data_length):
+def get_intervals(data_length, window_size=350, overlap=100):
     """ [util cycle] Calculate intervals with fixed length
     :param data_length: len(df)
+    :param window_size: const period days
+    :param overlap: days overlapping
     :return: intervals -> [(start1, end1), (start2, end2), ...]
 
     Input: 1000
     Output: [(0, 350), (250, 600), (500, 850)]
     """
-    window_size = 350   # const period days
-    overlap = 100       # days overlapping
+    if not 0 <= overlap < window_size:
+        raise ValueError(f'Overlap must be in [0, window_size): window_size={window_size}, overlap={overlap}')
     intervals = []      # summary of all intervals
 
     # Return only 1 interval, if length < window_size
@@ -1,6 +1,7 @@
 
 from modules.file_handler import *
 from modules.indicators import *
+from modules.indicator_cache import enable_indicator_cache
 
 from test import *
 from modules.plot import *
@@ -69,6 +70,7 @@ if __name__ == "__main__":
     """
     symbol = 'BTC'
     folder_path = get_path() / 'data/analyse/all_indicators'
+    enable_indicator_cache()
 
     all_indicators()
     all_perc()
\ No newline at end of file
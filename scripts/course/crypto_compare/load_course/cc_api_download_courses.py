@@ -16,6 +16,7 @@ if __name__ == "__main__":
     - set source
     - set order and n, if source = api
     - (if existing symbols should be requested completely new (overwrite) and should not only be updated: set self.allow_update = False)
+    - set workers and requests_per_second (concurrent download with a shared rate limit)
     """
 
     source = 'api' # [list, api]
@@ -31,7 +32,10 @@ if __name__ == "__main__":
         case _:
             raise ValueError(f'Wrong source: {source}')
 
-    main_routine_download_course_list_cc(symbols)
+    workers = 8                     # threads (1 - serial)
+    requests_per_second = 20        # rate limit over all threads (None - no limit)
+
+    main_routine_download_course_list_cc(symbols, workers, requests_per_second)
 
 
 
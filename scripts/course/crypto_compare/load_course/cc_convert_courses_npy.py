@@ -0,0 +1,11 @@
+
+from modules.file_handler import *
+
+if __name__ == "__main__":
+    """ # Explanation
+    Convert the already downloaded courses (csv) to the binary course store (npy next to the csv)
+    - load_pandas_from_symbol / load_pandas_from_file_path use the npy, if it is not older than the csv
+    - new downloads (cc_api_download_courses.py) save both files
+    """
+    folder_path = get_path('cc') / 'download'
+    convert_courses_to_npy(folder_path)
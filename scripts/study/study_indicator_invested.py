@@ -1,34 +1,85 @@
 
+import argparse
 import itertools
 import pandas as pd
 
-from modules.file_handler import get_path
-from modules.study.study_indicator_invested import manager_study_indicator_invested, save_evaluation_results
+from modules.file_handler import get_path, get_last_created_folder_in_dir
+from modules.indicator_cache import enable_indicator_cache
+from modules.indicators import set_indicator_engine
+from modules.stage_timer import enable_stage_timer
+from modules.study.study_indicator_invested import manager_study_indicator_invested, merge_study_shards, save_evaluation_results
 
 
-def meta_study():
+# Parameters for the meta study
+# Indicator
+INDICATOR_NAMES = ['BB', 'MACD', 'RSI']
+
+# Symbols
+SOURCES_COURSES = ['default']
+
+# Params
+SOURCE_PARAMS = 'brute_force'  # default, visualize, brute_force, optimization
+
+
+def meta_study(shard:tuple[int, int]=None, name:str=None):
     """ Meta study -> multiple studies
+    :param shard: (i, n) - run only part i of n of every study (e.g. one machine of n, see merge_meta_study())
+    :param name: folder name of the study in data/study (needed for shards - all machines write into the same folder)
     :return: None
     """
     # Parameters for the study
-    # Indicator
-    indicator_names = ['BB', 'MACD', 'RSI']
+    indicator_names = INDICATOR_NAMES
+    sources_courses = SOURCES_COURSES
+    source_params = SOURCE_PARAMS
 
-    # Symbols
-    sources_courses = ['default']
+    # Search over the params variations (grid - every params variation on every course, halving - drop the worst params variations on a few courses first,
+    # optimize - model-guided search with a budget of params variations in the grid of source_params, e.g. 'brute_force')
+    search = 'grid'
+    budget = 300
 
-    # Params
-    source_params = 'brute_force'  # default, visualize, brute_force, optimization
+    # Number of processes (1 - serial, e.g. os.cpu_count())
+    workers = 1
+
+    # Continue the last (killed) meta study - finished params variations are skipped
+    resume = False
+
+    # Reuse indicator results of earlier studies (data/cache/indicator)
+    enable_indicator_cache()
+
+    # Calculation of the indicators ('pandas_ta', 'numpy' - NumPy kernels of modules/indicator_kernels.py)
+    set_indicator_engine('pandas_ta')
+
+    # Time the stages of the backtests (progress line and <result file>_stages.csv next to the result file)
+    stage_timer = False
+    if stage_timer:
+        enable_stage_timer()
 
     # Start study over all combinations
-    base_folder = get_path('study') / f'Study_{pd.Timestamp.now().strftime("%Y-%m-%d_%H-%M-%S")}'
+    if name:
+        base_folder = get_path('study') / name
+    elif resume:
+        base_folder = get_last_created_folder_in_dir(get_path('study'))
+    else:
+        base_folder = get_path('study') / f'Study_{pd.Timestamp.now().strftime("%Y-%m-%d_%H-%M-%S")}'
     for indicator_name, source_courses in itertools.product(indicator_names, sources_courses):
         manager_study_indicator_invested(
             indicator_name, source_courses, source_params,
-            save_evaluation=True, save_plot=False, base_folder=base_folder
+            save_evaluation=True, save_plot=False, base_folder=base_folder, workers=workers, resume=resume, search=search, budget=budget,
+            shard=shard
         )
 
 
+def merge_meta_study(name:str, n_shards:int):
+    """ Merge the shards of a meta study (after all machines are finished) -> same result files and plots as meta_study()
+    :param name: folder name of the study in data/study
+    :param n_shards: amount of shards n
+    :return: None
+    """
+    base_folder = get_path('study') / name
+    for indicator_name, source_courses in itertools.product(INDICATOR_NAMES, SOURCES_COURSES):
+        merge_study_shards(indicator_name, source_courses, base_folder, n_shards)
+
+
 
 def study():
     """ 1x study with specific selected parameters
@@ -57,15 +108,46 @@ def study():
     # Params
     source_params = 'visualize'  # default, visualize, (brute_force, optimization)
 
+    # Number of processes (1 - serial, e.g. os.cpu_count())
+    workers = 1
+
     # Start study over all combinations
     manager_study_indicator_invested(
         indicator_name, source_courses, source_params,
-        save_evaluation, save_plot, base_folder
+        save_evaluation, save_plot, base_folder, workers
     )
 
 
 
 
+def parse_shard(value:str) -> tuple[int, int]:
+    """ '2/4' -> (1, 4) - shard i of n (1-based on the command line)
+    """
+    try:
+        i, n = map(int, value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Wrong shard "{value}" - format i/n, e.g. 1/4')
+    if not 1 <= i <= n:
+        raise argparse.ArgumentTypeError(f'Wrong shard "{value}" - needs 1 <= i <= n')
+    return i - 1, n
+
+
+
+
 if __name__ == "__main__":
-    meta_study()
+    # python scripts/study/study_indicator_invested.py                                -> meta study on this machine
+    # python scripts/study/study_indicator_invested.py --shard 1/4 --name Study_A     -> part 1 of 4 (on every machine another part)
+    # python scripts/study/study_indicator_invested.py --merge 4 --name Study_A       -> merge the 4 parts (after all are finished)
+    parser = argparse.ArgumentParser(description='Meta study of the indicators')
+    parser.add_argument('--shard', type=parse_shard, help='run only part i of n of the params variations, e.g. 1/4')
+    parser.add_argument('--merge', type=int, metavar='N', help='merge the results of N shards')
+    parser.add_argument('--name', help='folder name of the study in data/study (shared by all shards)')
+    args = parser.parse_args()
+    if (args.shard or args.merge) and not args.name:
+        parser.error('--shard and --merge need --name (all machines use the same study folder)')
+
+    if args.merge:
+        merge_meta_study(args.name, args.merge)
+    else:
+        meta_study(args.shard, args.name)
     #study()
\ No newline at end of file
@@ -0,0 +1,152 @@
+""" # Aim
+Benchmark of the backtest hot path (one params variation on one course)
+
+Stages:     func_indicator -> func_df_signals_from_indicator -> df_invested_from_signal -> evaluate_invested,
+            evaluate_invested_multiple_cycles and the full indicator_invested() call
+Courses:    synthetic courses (random walk) with 1k, 10k and 100k rows
+Result:     data/analyse/benchmark/benchmark_<timestamp>.json - compared with the last run, slower stages are flagged
+
+python scripts/tests/benchmark.py
+"""
+
+import json
+import platform
+import statistics
+import time
+from pathlib import Path
+
+from test import *
+from modules.file_handler import get_path, save_pandas_to_file, save_txt, list_file_paths_in_folder, \
+    fill_course_cache, clear_course_cache
+from modules.params import get_params_from_yaml
+from modules.indicators import func_indicator
+from modules.strategy.df_signals_invested import func_df_signals_from_indicator, df_invested_from_signal, \
+    df_close_perc, df_group_invested
+from modules.strategy.evaluate_invested import evaluate_invested, evaluate_invested_multiple_cycles
+from modules.strategy.strategy_indicator_invested import indicator_invested
+from modules.study.study_indicator_invested import OFFSET
+
+
+BENCHMARK_SIZES = [1_000, 10_000, 100_000]  # rows of the synthetic courses
+BENCHMARK_INDICATORS = ['BB', 'MACD', 'RSI']  # default params of indicator_params.yaml
+BENCHMARK_REPEAT = 5                          # runs per stage (the minimum is compared)
+REGRESSION_FACTOR = 1.25                      # flag a stage, if it is slower than factor * last run
+REGRESSION_MIN_S = 0.0005                     # ... and slower by at least this duration (sub-ms stages are noisy)
+
+
+def get_synthetic_course(n:int, seed:int=0) -> pd.DataFrame:
+    """ Synthetic course (geometric random walk)
+    :param n: rows
+    :param seed: random seed (same course for every run)
+    :return: df[close]
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.03, n)))
+    return get_df_from_list(close.tolist(), start='1900-01-01')
+
+
+def _time_stage(func, setup, repeat:int) -> dict[str, float]:
+    """ Run func(*setup()) repeat times (setup is not timed)
+    :return: {'min': s, 'median': s}
+    """
+    durations = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - start)
+    return {'min': min(durations), 'median': statistics.median(durations)}
+
+
+def run_benchmark(sizes:list=None, indicator_names:list=None, repeat:int=BENCHMARK_REPEAT) -> dict:
+    """ Time every stage on every synthetic course
+    :param sizes: rows of the synthetic courses
+    :param indicator_names: indicators
+    :param repeat: runs per stage
+    :return: {'meta': {...}, 'results': {'<indicator>/<rows>/<stage>': {'min': s, 'median': s}}}
+    """
+    sizes = sizes or BENCHMARK_SIZES
+    indicator_names = indicator_names or BENCHMARK_INDICATORS
+    folder_path = get_path() / 'data/analyse/benchmark/course'
+    results = {}
+    for n in sizes:
+        df_course = get_synthetic_course(n)
+        save_pandas_to_file(df_course, folder_path, f'SYN_{n}')
+        course_path = folder_path / f'SYN_{n}.csv'
+        fill_course_cache([course_path])  # like in the study (indicator_invested without loading the file)
+        for indicator_name in indicator_names:
+            # Inputs of the stages (like in indicator_invested)
+            params = get_params_from_yaml(indicator_name, 'default')
+            df_signals = func_df_signals_from_indicator(indicator_name, df_course.copy(), params)
+            df_invested = df_invested_from_signal(df_signals.iloc[OFFSET:].copy())
+            df_evaluation = df_group_invested(df_close_perc(df_invested.copy()))
+            stages = {
+                'func_indicator': (func_indicator, lambda: (indicator_name, df_course.copy(), params)),
+                'func_df_signals_from_indicator': (func_df_signals_from_indicator, lambda: (indicator_name, df_course.copy(), params)),
+                'df_invested_from_signal': (df_invested_from_signal, lambda: (df_signals.iloc[OFFSET:].copy(),)),
+                'evaluate_invested': (evaluate_invested, lambda: (df_evaluation.copy(),)),
+                'evaluate_invested_multiple_cycles': (evaluate_invested_multiple_cycles, lambda: (df_evaluation.copy(),)),
+                'indicator_invested': (indicator_invested, lambda: (indicator_name, course_path, params, OFFSET)),
+            }
+            for stage, (func, setup) in stages.items():
+                key = f'{indicator_name}/{n}/{stage}'
+                results[key] = _time_stage(func, setup, repeat)
+                print(f'{key:<55} {results[key]["min"] * 1000:10.3f} ms')
+        clear_course_cache()
+    meta = {
+        'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+        'machine': platform.machine(), 'node': platform.node(), 'repeat': repeat,
+    }
+    return {'meta': meta, 'results': results}
+
+
+def save_benchmark(benchmark:dict, folder_path:Path=None) -> Path:
+    """ [file save] Save a benchmark run as json
+    :return: file path
+    """
+    folder_path = folder_path or get_path() / 'data/analyse/benchmark'
+    file_path = folder_path / f'benchmark_{pd.Timestamp.now().strftime("%Y-%m-%d_%H-%M-%S")}.json'
+    save_txt(json.dumps(benchmark, indent=2), file_path, atomic=True)
+    print(f'Saved {file_path.name} to {file_path}')
+    return file_path
+
+
+def compare_benchmarks(benchmark_old:dict, benchmark_new:dict, factor:float=REGRESSION_FACTOR) -> list[str]:
+    """ Compare two benchmark runs (minimum duration per stage)
+    :param benchmark_old: reference run
+    :param benchmark_new: new run
+    :param factor: a stage is a regression, if new > factor * old (and new - old > REGRESSION_MIN_S)
+    :return: keys of the regressions
+    """
+    regressions = []
+    for key, new in benchmark_new['results'].items():
+        old = benchmark_old['results'].get(key)
+        if old is None:
+            continue
+        ratio = new['min'] / old['min'] if old['min'] > 0 else float('inf')
+        regression = ratio > factor and new['min'] - old['min'] > REGRESSION_MIN_S
+        flag = 'REGRESSION' if regression else ('faster' if ratio < 1 / factor else '')
+        print(f'{key:<55} {old["min"] * 1000:10.3f} ms -> {new["min"] * 1000:10.3f} ms  x{ratio:6.2f}  {flag}')
+        if regression:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    folder_path = get_path() / 'data/analyse/benchmark'
+    file_paths_old = list_file_paths_in_folder(folder_path, '.json') if folder_path.exists() else []
+    benchmark = run_benchmark()
+    save_benchmark(benchmark, folder_path)
+    # Compare with the last run
+    if file_paths_old:
+        file_path_old = max(file_paths_old, key=lambda file_path: file_path.name)
+        print(f'\nCompare with {file_path_old.name}')
+        with open(file_path_old) as file:
+            regressions = compare_benchmarks(json.load(file), benchmark)
+        print(f'{len(regressions)} regressions: {regressions}')
+
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,15 @@ import numpy as np
 from modules.file_handler import get_path, load_pandas_from_file_path
 from modules.strategy.df_signals_invested import func_df_signals_from_indicator
 
-def get_df_from_list(list_data, col='close'):
+def get_df_from_list(list_data, col='close', start='2023-01-01'):
     """ Convert a list into a df with date as index
     :param list_data: list[int]
     :param col: name
+    :param start: first date (long lists need an early start - pandas dates end in 2262)
     :return: df[index, name]
     """
     # Daily dates with lengeth list_data
-    dates = pd.date_range(start="2023-01-01", periods=len(list_data), freq="D")
+    dates = pd.date_range(start=start, periods=len(list_data), freq="D")
 
     # Pandas Frame
     df = pd.DataFrame({
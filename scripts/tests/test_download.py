@@ -0,0 +1,98 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from test import *
+from modules.file_handler import *
+import modules.api.crypto_compare.download_courses as dc
+
+
+DAY = 60 * 60 * 24
+LAUNCH = {'AAA': 300, 'BBB': 4500, 'CCC': 10}  # symbol: days with course data until today (stub)
+
+
+class StubHistoday(BaseHTTPRequestHandler):
+    """ Mimics https://min-api.cryptocompare.com/data/v2/histoday (limit + 1 days until toTs, volumefrom 0 before the launch) """
+    requests = 0
+
+    def do_GET(self):
+        StubHistoday.requests += 1
+        query = {key: value[0] for key, value in parse_qs(urlparse(self.path).query).items()}
+        symbol = query['fsym']
+        if symbol not in LAUNCH:
+            body = {'Response': 'Error', 'Message': 'CCCAGG market does not exist for this coin pair (XYZ-USD)'}
+        else:
+            today = int(pd.Timestamp.today().normalize().timestamp())
+            to_ts = int(float(query['toTs'])) // DAY * DAY if query.get('toTs') else today
+            launch = today - LAUNCH[symbol] * DAY
+            limit = int(query['limit'])
+            rows = []
+            for ts in range(to_ts - limit * DAY, to_ts + DAY, DAY):
+                price = float(ts - launch) / DAY / 7 + 1 if ts >= launch else 0.0
+                rows.append({'time': ts, 'high': price, 'low': price, 'open': price, 'volumefrom': 1.0 if ts >= launch else 0,
+                             'volumeto': price, 'close': price, 'conversionType': 'direct', 'conversionSymbol': ''})
+            body = {'Response': 'Success', 'Message': '', 'Data': {'Data': rows}}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_download_concurrent():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHistoday)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/data/v2/histoday'
+    folder_path = get_path() / 'data/analyse/new_test/download'
+    for symbol in LAUNCH:
+        (folder_path / f'{symbol}.csv').unlink(missing_ok=True)
+    dc.ACCEPTED_ERRORS.clear()
+    try:
+        symbols = list(LAUNCH) + ['XYZ', 'XYZ2']
+        dc.main_routine_download_course_list_cc(symbols, workers=4, requests_per_second=50, url=url, folder_path=folder_path)
+    finally:
+        server.shutdown()
+
+    # Every symbol with all days since the launch (paging backwards over multiple requests for BBB)
+    for symbol, days in LAUNCH.items():
+        df = load_pandas_from_file_path(folder_path / f'{symbol}.csv')
+        print(symbol, len(df), df.index[0], df.index[-1])
+        assert len(df) == days + 1 and df.index.is_unique and df.index.is_monotonic_increasing
+    # Update: remove the last days of a course -> only the missing days are appended (no duplicates)
+    df = load_pandas_from_file_path(folder_path / 'AAA.csv')
+    save_pandas_to_file(df.iloc[:-3], folder_path, 'AAA')
+    save_course_npy(df.iloc[:-3], folder_path / 'AAA.npy')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHistoday)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        dc.main_routine_download_course_list_cc(['AAA'], url=f'http://127.0.0.1:{server.server_address[1]}/data/v2/histoday',
+                                                folder_path=folder_path)
+    finally:
+        server.shutdown()
+    df_updated = load_pandas_from_file_path(folder_path / 'AAA.csv')
+    assert df_updated.index.is_unique and df_updated.index.equals(df.index)
+    # Both unknown symbols are in the known errors
+    print(dc.ACCEPTED_ERRORS)
+    assert sorted(dc.ACCEPTED_ERRORS['CCCAGG market does not exist for this coin pair']) == ['XYZ', 'XYZ2']
+
+
+def test_rate_limiter():
+    rate_limiter = dc.RateLimiter(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        rate_limiter.acquire()
+    duration = time.monotonic() - start
+    print(f'{duration:.3f} s')
+    assert duration >= 0.45   # 10 tokens refilled with 20/s
+
+
+
+if __name__ == "__main__":
+    test_download_concurrent()
+    #test_rate_limiter()
@@ -2,7 +2,10 @@ from modules.utils import *
 from test import *
 
 from modules.strategy.evaluate_invested import _calc_amount_transactions, _calc_all_investment_states, \
-    _calc_accumulated_perc, _calc_total_accumulated_perc, evaluate_invested_multiple_cycles
+    _calc_accumulated_perc, _calc_total_accumulated_perc, evaluate_invested_multiple_cycles, evaluate_invested_batch, \
+    evaluate_invested_intervals_batch
+from modules.strategy.df_signals_invested import df_invested_from_signal, signal_labels, df_group_invested, \
+    add_one_invested_after_selling, get_invested_segments
 
 
 #------------------------- evaluation.py -------------------------#
@@ -12,6 +15,7 @@ def test_get_intervals():
     for data_length in test_data_lengths:
         intervals = get_intervals(data_length)
         print(f'{data_length}: {intervals}')
+    print(get_intervals(1000, window_size=200, overlap=50))
 
 
 def test_calc_amount_transactions():
@@ -52,6 +56,63 @@ def test_calc_accumulated_perc():
         print('\n')
 
 
+def test_evaluate_invested_batch():
+    # Batch kernel (n invested rows at once) must match the pandas calculation
+    df = get_dummy_data_random().dropna(subset=['invested'])
+    df['invested'] = df['invested'].astype(int)
+    df['close_perc'] = df['close'].pct_change(periods=1)
+    invested = df['invested'].to_numpy(dtype=float)
+    matrix = np.vstack([invested, 1 - invested, np.ones(len(df))])
+    result = evaluate_invested_batch(matrix, df['close_perc'].to_numpy(dtype=float))
+    df_eval = df.copy()
+    df_eval['close_perc'] = df_eval['close_perc'].shift(-1)
+    df_eval = df_eval.iloc[:-1]
+    df_eval = _calc_accumulated_perc(df_eval, 2)
+    S = _calc_total_accumulated_perc(df_eval, 2)
+    BaH = _calc_total_accumulated_perc(_calc_accumulated_perc(df_eval, 0), 0)
+    print(result)
+    assert np.isclose(result['S'][0], S)
+    assert np.isclose(result['BaH'][0], BaH)
+
+def test_evaluate_invested_intervals_batch():
+    # Cumulative sums (O(1) per interval) must match the evaluation of every interval slice
+    df = get_dummy_data_random()
+    invested = df['invested'].to_numpy(dtype=float)
+    close_perc = df['close'].pct_change(periods=1).to_numpy(dtype=float, copy=True)
+    close_perc[100] = -1  # course to 0
+    matrix = np.vstack([invested, 1 - invested])
+    intervals = get_intervals(len(df), 100, 20) + get_intervals(len(df), 50, 0)  # multiple window sizes at once
+    result = evaluate_invested_intervals_batch(matrix, close_perc, intervals)
+    for index, (start, end) in enumerate(intervals):
+        result_slice = evaluate_invested_batch(matrix[:, start:end + 1], close_perc[start:end + 1])
+        for key, value in result_slice.items():
+            assert np.allclose(result[key][:, index], value, equal_nan=True), (key, start, end)
+    print({key: value.mean(axis=1) for key, value in result.items()})
+
+
+#------------------------- df_signals_invested.py -------------------------#
+
+def test_df_invested_from_signal():
+    df = get_df_from_list([1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+    df['signal'] = np.array([1, 0, 0, 1, 0, -1, 0, 1, -1, 0], dtype=np.int8)
+    df['signal_valid'] = np.arange(len(df)) >= 2    # leading time
+    df['signal'] = df['signal'].where(df['signal_valid'], 0)
+    df = df_invested_from_signal(df)
+    df['label'] = signal_labels(df, 'RSI')
+    print(df)
+    assert np.array_equal(df['invested'].to_numpy(), [np.nan, np.nan, 0, 1, 1, 0, 0, 1, 0, 0], equal_nan=True)
+    assert df['label'].tolist() == [None, None, '', 'bullish', '', 'bearish', '', 'bullish', 'bearish', '']
+
+
+def test_add_one_invested_after_selling():
+    df = get_df_from_list([0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+    df['invested'] = [0, 1, 1, 0, 0, 1, 1, 1, 0, 1, 0]
+    df = df_group_invested(df)
+    df = add_one_invested_after_selling(df)
+    print(df)
+    assert df['invested'].tolist() == [0, 1, 1, 1, 0, 1, 1, 1, 1, 1, 1]
+    assert get_invested_segments(df) == [(1, 3), (5, 8), (9, 10)]
+
 
 #------------------------- evaluate_strategy.py -------------------------#
 
@@ -1,6 +1,7 @@
 
 
 from modules.file_handler import *
+import modules.file_handler as file_handler
 
 
 def test_path():
@@ -56,6 +57,88 @@ def test_find_file_in_directory():
         print()
 
 
+def test_jsonl():
+    file_path = get_path() / 'data/analyse/new_test/test.jsonl'
+    file_path.unlink(missing_ok=True)
+    records = [{'key': 1, 'value': [1.5, 2]}, {'key': 2, 'value': None}]
+    for record in records:
+        append_jsonl(record, file_path)
+    # Truncated last line (process killed while writing)
+    with open(file_path, 'a') as file:
+        file.write('{"key": 3, "val')
+    print(load_jsonl(file_path))
+    assert load_jsonl(file_path) == records
+    # Appending continues after the last complete line
+    append_jsonl({'key': 3}, file_path)
+    assert load_jsonl(file_path) == records + [{'key': 3}]
+
+
+def test_course_npy():
+    folder_path = get_path() / 'data/analyse/new_test'
+    dates = pd.date_range(start='2023-01-01', periods=5, freq='D', name='date')
+    df = pd.DataFrame({
+        'time': (dates.astype('int64') // 10**9).to_numpy(),
+        'close': [0.000012345678, 1.5, 2.25, 1e-9, 12345.678901]   # sub-cent values (csv has only 3 decimals)
+    }, index=dates)
+    save_pandas_to_file(df, folder_path, 'course')
+    save_course_npy(df, folder_path / 'course.npy')
+    df_loaded = load_pandas_from_file_path(folder_path / 'course.csv')  # npy is newer than the csv -> npy
+    print(df_loaded)
+    pd.testing.assert_frame_equal(df, df_loaded, check_freq=False)
+
+
+def test_append_course():
+    folder_path = get_path() / 'data/analyse/new_test'
+    dates = pd.date_range(start='2023-01-01', periods=2000, freq='D', name='date')
+    df = pd.DataFrame({'time': (dates.astype('int64') // 10**9).to_numpy(), 'close': np.linspace(1, 2, len(dates)) / 7}, index=dates)
+    for file_path in folder_path.glob('append*'):
+        file_path.unlink()
+    save_pandas_to_file(df.iloc[:1990], folder_path, 'append')
+    save_course_npy(df.iloc[:1990], folder_path / 'append.npy')
+    file_path = folder_path / 'append.csv'
+    # Overlapping last day is replaced, no duplicates
+    assert append_course(df.iloc[1989:1995], file_path) == 5
+    assert get_course_last_date(file_path) == dates[1994]
+    pd.testing.assert_frame_equal(load_pandas_from_file_path(file_path), df.iloc[:1995], check_freq=False)  # npy
+    df_csv = pd.read_csv(file_path, parse_dates=['date'], index_col='date')
+    assert df_csv.index.equals(dates[:1995]) and np.allclose(df_csv['close'], df['close'].iloc[:1995], atol=1e-3)
+    # Update killed while writing (csv appended, npy not) -> rolled back on the next load
+    write_at = file_handler._write_at
+    def write_at_killed(path, offset, data, truncate):
+        if path.suffix == '.npy':
+            raise KeyboardInterrupt
+        write_at(path, offset, data, truncate)
+    size_csv, size_npy = file_path.stat().st_size, (folder_path / 'append.npy').stat().st_size
+    file_handler._write_at = write_at_killed
+    try:
+        append_course(df.iloc[1995:], file_path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        file_handler._write_at = write_at
+    assert file_path.stat().st_size > size_csv
+    pd.testing.assert_frame_equal(load_pandas_from_file_path(file_path), df.iloc[:1995], check_freq=False)
+    assert file_path.stat().st_size == size_csv and (folder_path / 'append.npy').stat().st_size == size_npy
+    assert not (folder_path / f'append{JOURNAL_SUFFIX}').exists()
+    assert append_course(df.iloc[1995:], file_path) == 5
+    pd.testing.assert_frame_equal(load_pandas_from_file_path(file_path), df, check_freq=False)
+
+
+def test_course_index():
+    folder_path = get_path('course') / 'new_test'
+    create_dir(folder_path)
+    file_path = folder_path / 'TEST_INDEX.csv'
+    try:
+        file_path.write_text('date,close\n2023-01-01,1.0\n')   # new file -> directory mtime changed -> new scan
+        print(get_course_path('TEST_INDEX'))
+        assert get_course_path('TEST_INDEX') == file_path
+        print(founded_courses(['TEST_INDEX', 'NOT_AVAILABLE']))
+    finally:
+        file_path.unlink(missing_ok=True)
+        folder_path.rmdir()
+    assert founded_courses(['TEST_INDEX'])[1] == ['TEST_INDEX']
+
+
 def test_multiple_function():
     pass
 
@@ -65,4 +148,8 @@ if __name__ == "__main__":
     test_path()
     #test_create_dir()
     #test_find_file_in_directory()
+    #test_jsonl()
+    #test_course_npy()
+    #test_append_course()
+    #test_course_index()
     #test_multiple_function()
\ No newline at end of file
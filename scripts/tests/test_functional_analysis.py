@@ -22,6 +22,21 @@ def test_calculate_crossings():
     print(df)
 
 
+def test_crossings():
+    data1 = [2, 3, 1, 0, -1, -1, 0, 2, 3, np.nan, 3]
+    data2 = [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+
+    indices, directions = crossings(data1, data2)
+    print(indices, directions)
+    assert indices.tolist() == [3, 7] and directions.tolist() == [-1, 1]
+
+    # Same crossings as the DataFrame wrapper
+    df = get_df_from_list(data1, '1')
+    df['2'] = data2
+    df, cols = calculate_crossings(df, '1', '2')
+    assert np.flatnonzero(df[cols[0]] != '').tolist() == indices.tolist()
+
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+
+from test import *
+
+
+IMPORT_TIME_BUDGET_S = 1.0  # import of the compute path in a new process (pandas and numpy included)
+COMPUTE_MODULES = [
+    'modules.indicators',
+    'modules.strategy.df_signals_invested',
+    'modules.strategy.evaluate_invested',
+    'modules.strategy.strategy_indicator_invested',
+    'modules.study.study_indicator_invested',
+]
+HEAVY_MODULES = ['matplotlib', 'scipy', 'pandas_ta', 'requests']  # only imported on first use (plots, optimizer, downloads)
+
+
+def measure_import(modules:list) -> (float, list):
+    """ Import the modules in a new process (like a worker process or a short cli run)
+    :return: seconds, heavy modules which were imported
+    """
+    code = (f'import sys, time\n'
+            f'start = time.perf_counter()\n'
+            f'import {", ".join(modules)}\n'
+            f'print(time.perf_counter() - start)\n'
+            f'print(",".join(name for name in {HEAVY_MODULES} if name in sys.modules))\n')
+    output = subprocess.run([sys.executable, '-c', code], cwd=get_path(), capture_output=True, text=True, check=True).stdout
+    seconds, heavy = output.split('\n')[:2]
+    return float(seconds), [name for name in heavy.split(',') if name]
+
+
+def test_import_time():
+    seconds, heavy = min(measure_import(COMPUTE_MODULES) for _ in range(3))
+    print(f'Import compute path: {seconds:.3f} s (budget {IMPORT_TIME_BUDGET_S} s), heavy modules: {heavy}')
+    assert not heavy
+    assert seconds < IMPORT_TIME_BUDGET_S
+
+
+
+if __name__ == "__main__":
+    test_import_time()
@@ -1,8 +1,10 @@
 import matplotlib.pyplot as plt
+import pandas_ta as ta
 
 from test import *
 from modules.indicators import *
 from modules.plot import *
+from modules.indicator_cache import *
 
 
 def test_indicator(indicator_name:str):
@@ -29,6 +31,84 @@ def test_col_names(indicator_name):
     print(col_rsi)
 
 
+def test_indicator_cache():
+    values = pd.Series(np.random.randint(1, 100, size=200))
+    df = get_df_from_list(values)
+    folder_path = get_path() / 'data/analyse/new_test/indicator_cache'
+    enable_indicator_cache(folder_path=folder_path)
+    clear_indicator_cache(disk=True)
+    try:
+        for params in [{'m_fast': 12, 'm_slow': 26, 'm_signal': 9}, [12, 26, 9]]:
+            df_compute = func_indicator('MACD', df.copy(), params)
+            df_memory = func_indicator('MACD', df.copy(), params)   # memory tier
+            clear_indicator_cache()
+            df_disk = func_indicator('MACD', df.copy(), params)     # disk tier
+            pd.testing.assert_frame_equal(df_compute, df_memory)
+            pd.testing.assert_frame_equal(df_compute, df_disk)
+        print(get_indicator_cache_info())
+        clear_indicator_cache(disk=True)
+    finally:
+        disable_indicator_cache()
+
+
+def _write_cache_entries(args):
+    """ [process] Write entries of ~80 KB to the disk tier
+    :return: max size of the folder after the writes
+    """
+    folder_path, seed, disk_size_mb = args
+    enable_indicator_cache(memory_size_mb=0, disk_size_mb=disk_size_mb, folder_path=folder_path)
+    rng = np.random.default_rng(seed)
+    disk_size_max = 0
+    for i in range(60):
+        save_indicator_cache(f'{seed}_{i}', pd.DataFrame({'value': rng.normal(size=10000)}))
+        disk_size = 0
+        for file_path in folder_path.glob('*.pkl'):
+            try:
+                disk_size += file_path.stat().st_size
+            except FileNotFoundError:  # evicted by the other process
+                pass
+        disk_size_max = max(disk_size_max, disk_size)
+    return disk_size_max
+
+
+def test_indicator_cache_disk_size_processes():
+    from multiprocessing import Pool
+    folder_path = get_path() / 'data/analyse/new_test/indicator_cache_processes'
+    disk_size_mb = 1
+    enable_indicator_cache(folder_path=folder_path)
+    clear_indicator_cache(disk=True)
+    disable_indicator_cache()
+    with Pool(2) as pool:
+        disk_size_max = max(pool.map(_write_cache_entries, [(folder_path, seed, disk_size_mb) for seed in range(2)]))
+    disk_size = sum(file.stat().st_size for file in folder_path.glob('*.pkl'))
+    print(f'Disk tier: {disk_size / 2**20:.2f} MB, max {disk_size_max / 2**20:.2f} MB (cap {disk_size_mb} MB)')
+    # Both processes share the cap (rescan after 10 % of the cap) - not 2 x disk_size_mb
+    assert disk_size_max <= 1.3 * disk_size_mb * 2**20
+
+
+def test_ema_bank():
+    values = pd.Series(np.random.uniform(1, 100, size=400))
+    df = get_df_from_list(values)
+    bank = EMABank(df['close'])
+    for fast, slow, signal in [(12, 26, 9), (10, 20, 30), (30, 10, 5), (1, 3, 1), (99, 149, 149)]:
+        df_ta = ta.macd(df['close'], fast=fast, slow=slow, signal=signal)
+        pd.testing.assert_frame_equal(df_ta, bank.macd(fast, slow, signal))
+        # func_indicator reads from the active bank
+        with ema_bank(df['close']):
+            df_bank = func_indicator('MACD', df.copy(), [fast, slow, signal])
+        pd.testing.assert_frame_equal(func_indicator('MACD', df.copy(), [fast, slow, signal]), df_bank)
+    print(list(bank._emas.keys()))
+    # Bank of a course key - kept for the next blocks of the course (copies of the course match in O(1))
+    with ema_bank(df['close'], 'course') as bank_1:
+        df_1 = func_indicator('MACD', df.copy(), [12, 26, 9])
+    with ema_bank(df.copy()['close'], 'course') as bank_2:
+        assert bank_2 is bank_1 and 12 in bank_2._emas and not bank_2._macd_lines
+        pd.testing.assert_frame_equal(func_indicator('MACD', df.copy(), [12, 26, 9]), df_1)
+    with ema_bank(df['close'] * 2, 'course') as bank_3:  # other close series -> new bank
+        assert bank_3 is not bank_1 and not bank_3._emas
+    clear_ema_banks()
+
+
 def test_perc():
     #values = np.random.choice([1, 2], size=21)
     values = [1, 1,2,3,4,5,6,7, 2,2,2,2,3,3,3]
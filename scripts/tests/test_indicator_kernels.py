@@ -0,0 +1,104 @@
+import pandas_ta as ta
+
+from test import *
+from modules.indicators import func_indicator, get_indicator_col_names
+from modules.indicator_kernels import *
+
+
+RTOL = 1e-9       # relative tolerance against pandas_ta
+RTOL_BB = 1e-6    # [BB] bandwidth and percent divide by the small band width (pandas rolling std is less exact)
+
+
+def assert_close(name:str, values, values_ta, rtol:float=RTOL):
+    values_ta = np.asarray(values_ta, dtype=float)
+    error = np.nanmax(np.abs(values - values_ta) / np.maximum(1.0, np.abs(values_ta)))
+    print(f'{name:<20} max error {error:.2e}')
+    assert np.array_equal(np.isnan(values), np.isnan(values_ta)), f'{name}: NaN at different samples'
+    assert error < rtol, f'{name}: {error}'
+
+
+def rsi_reference(series:pd.Series, length:int) -> pd.Series:
+    """ ta.rsi of the pinned pandas_ta 0.3.14b0 (rma = ewm(alpha=1/length, min_periods=length), adjust=True)
+    """
+    diff = series.diff()
+    rma = lambda moves: moves.ewm(alpha=1 / length, min_periods=length).mean()
+    positive_avg, negative_avg = rma(diff.clip(lower=0)), rma(diff.clip(upper=0))
+    return 100 * positive_avg / (positive_avg + negative_avg.abs())
+
+
+def bbands_reference(series:pd.Series, length:int, std:float) -> list[pd.Series]:
+    """ ta.bbands of the pinned pandas_ta 0.3.14b0 (ddof=0) - lower, mid, upper, bandwidth, percent
+    """
+    mid = series.rolling(length).mean()
+    deviation = series.rolling(length).std(ddof=0)
+    lower, upper = mid - std * deviation, mid + std * deviation
+    return [lower, mid, upper, 100 * (upper - lower) / mid, (series - lower) / (upper - lower)]
+
+
+def test_kernels_pandas_ta():
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.03, 3000)))
+    series = pd.Series(close)
+    lengths = [2, 6, 14, 50, 200]
+
+    # SMA, EMA - all lengths at once
+    sma, ema = sma_kernel(close, lengths), ema_kernel(close, lengths)
+    for row, length in enumerate(lengths):
+        assert_close(f'SMA {length}', sma[row], ta.sma(series, length=length))
+        assert_close(f'EMA {length}', ema[row], ta.ema(series, length=length))
+
+    # MACD - multiple params at once (incl. swapped fast and slow)
+    params = [(12, 26, 9), (5, 35, 5), (30, 10, 14)]
+    lines = macd_kernel(close, *zip(*params))
+    for row, (fast, slow, signal) in enumerate(params):
+        df_ta = ta.macd(series, fast=fast, slow=slow, signal=signal)
+        for values, col in zip(lines, df_ta.columns):
+            assert_close(col, values[row], df_ta[col])
+
+    # BB (ddof explicit, the default changed between the pandas_ta versions, newer versions take lower_std and upper_std)
+    for length, std in [(6, 2.0), (20, 1.5)]:
+        df_ta = ta.bbands(series, length=length, std=std, lower_std=std, upper_std=std, ddof=0)
+        for values, col, values_reference in zip(bbands_kernel(close, [4, length], std), df_ta.columns,
+                                                 bbands_reference(series, length, std)):
+            assert_close(col, values[1], df_ta[col], RTOL_BB)
+            assert_close(col, values[1], values_reference, RTOL_BB)
+
+    # RSI from the first valid sample (pinned pandas_ta, newer versions use adjust=False)
+    rsi = rsi_kernel(close, lengths + [150])
+    for row, length in enumerate(lengths + [150]):
+        assert_close(f'RSI {length}', rsi[row], rsi_reference(series, length))
+        assert np.isnan(rsi[row, :length]).all() and not np.isnan(rsi[row, length:]).any()
+
+
+def test_func_indicator_engine():
+    rng = np.random.default_rng(1)
+    df = get_df_from_list((100 * np.exp(np.cumsum(rng.normal(0, 0.03, 1000)))).tolist())
+    for indicator_name, params in [('EMA', [20]), ('SMA', [50]), ('MACD', {'m_fast': 12, 'm_slow': 26, 'm_signal': 9}),
+                                   ('BB', {'bb_l': 6, 'bb_std': 2.0}), ('RSI', {'rsi_l': 14, 'bl': 30, 'bu': 70})]:
+        df_ta = func_indicator(indicator_name, df.copy(), params, engine='pandas_ta')
+        df_np = func_indicator(indicator_name, df.copy(), params, engine='numpy')
+        cols_ta, cols_np = get_indicator_col_names(df_ta, indicator_name), get_indicator_col_names(df_np, indicator_name)
+        print(indicator_name, cols_np)
+        assert len(np.atleast_1d(cols_np)) == len(np.atleast_1d(cols_ta))
+        if indicator_name in ['EMA', 'SMA', 'MACD'] or ta.version.startswith('0.3'):  # BB, RSI: changed in newer versions
+            for col_ta, col_np in zip(np.atleast_1d(cols_ta), np.atleast_1d(cols_np)):
+                assert_close(col_np, df_np[col_np].to_numpy(), df_ta[col_ta], RTOL_BB if indicator_name == 'BB' else RTOL)
+    # BB and RSI against the pinned pandas_ta (from the first valid sample)
+    df_np = func_indicator('BB', df.copy(), {'bb_l': 6, 'bb_std': 1.5}, engine='numpy')
+    for col, values_reference in zip(get_indicator_col_names(df_np, 'BB'), bbands_reference(df['close'], 6, 1.5)):
+        assert_close(col, df_np[col].to_numpy(), values_reference, RTOL_BB)
+    df_np = func_indicator('RSI', df.copy(), {'rsi_l': 150, 'bl': 30, 'bu': 70}, engine='numpy')
+    col_rsi = get_indicator_col_names(df_np, 'RSI')[0]
+    assert_close(col_rsi, df_np[col_rsi].to_numpy(), rsi_reference(df['close'], 150))
+    # Too short course
+    try:
+        func_indicator('MACD', df.iloc[:10].copy(), [12, 26, 9], engine='numpy')
+        raise AssertionError('No error for a too short course')
+    except ValueError as e:
+        print(e)
+
+
+
+if __name__ == "__main__":
+    test_kernels_pandas_ta()
+    test_func_indicator_engine()
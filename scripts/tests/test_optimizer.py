@@ -0,0 +1,23 @@
+from test import *
+from modules.study.optimizer import suggest_params
+
+
+def test_suggest_params():
+    # Maximum of a smooth function on a 3-D grid with a fraction of the grid evaluations
+    params_space = {'a': list(range(1, 100, 2)), 'b': list(range(1, 150, 2)), 'c': list(range(1, 150, 2))}  # 281k combinations
+    sorting = lambda params: -((params['a'] - 31) / 50) ** 2 - ((params['b'] - 77) / 75) ** 2 - ((params['c'] - 11) / 75) ** 2
+    rng = np.random.default_rng(0)
+    observations = []
+    while len(observations) < 80:
+        for params in suggest_params(params_space, observations, 10, rng):
+            observations.append((params, sorting(params)))
+    best_params, best_sorting = max(observations, key=lambda observation: observation[1])
+    print(best_params, best_sorting)
+    keys = [tuple(params.values()) for params, _ in observations]
+    assert len(set(keys)) == len(keys)      # every params variation only once
+    assert best_sorting > -0.01
+
+
+
+if __name__ == "__main__":
+    test_suggest_params()
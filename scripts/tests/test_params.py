@@ -0,0 +1,47 @@
+import itertools
+
+from test import *
+from modules.params import *
+
+
+def test_param_space():
+    grid = {'m_fast': [2, 5, 15], 'm_slow': [15.0, 25.0], 'm_signal': [10, 30, 60, 90]}
+    params_space = ParamSpace(grid)
+    params_variations = [dict(zip(grid, combination)) for combination in itertools.product(*grid.values())]
+    print(len(params_space), params_space[5], params_space[-1])
+    # Same order as the list of all combinations
+    assert len(params_space) == len(params_variations)
+    assert list(params_space) == params_variations
+    assert [params_space[i] for i in range(len(params_space))] == params_variations
+    for start, chunk in params_space.chunks(5):
+        assert chunk == params_variations[start:start + 5]
+    # Shards cover every params variation exactly once
+    assert sum((list(params_space.shard(i, 5)) for i in range(5)), []) == params_variations
+    assert list(params_space[3:20].shard(1, 2)) == params_variations[11:20]
+    # Big grid - no combinations in memory
+    params_space = get_params_variation('MACD', 'brute_force')
+    print(len(params_space), params_space[123456])
+    assert isinstance(params_space, ParamSpace) and len(params_space) > 100000
+
+
+def test_skip_checkpoint():
+    from modules.study.study_indicator_invested import _skip_checkpoint, _params_key
+    params_space = ParamSpace({'m_fast': [2, 5, 15], 'm_slow': [15, 25], 'm_signal': [10, 30]})
+    checkpoint = {_params_key(params_space[i]): {'index': i} for i in [1, 4, 9, 11]}
+    accessed = []
+    def stream():  # counts the passes over the grid
+        for params in params_space:
+            accessed.append(params)
+            yield params
+    list_results = []
+    params_left = _skip_checkpoint(stream(), checkpoint, list_results)
+    assert not accessed  # lazy
+    assert list(params_left) == [params_space[i] for i in range(len(params_space)) if i not in [1, 4, 9, 11]]
+    assert list_results == [{'index': i} for i in [1, 4, 9, 11]]
+    assert len(accessed) == len(params_space)  # one pass
+
+
+
+if __name__ == "__main__":
+    test_param_space()
+    test_skip_checkpoint()
@@ -6,6 +6,7 @@ from modules.indicators import *
 
 from test import *
 from modules.plot import *
+from modules.strategy.df_signals_invested import df_invested_from_signal, df_group_invested, add_one_invested_after_selling
 
 
 
@@ -56,6 +57,25 @@ def test_plot_perc(freq='ME'):
     plt.show()
 
 
+def test_plot_headless():
+    # Headless figures (Agg, without pyplot) with all highlight keys
+    values = pd.Series(np.random.uniform(1, 100, size=400))
+    df = get_df_from_list(values)
+    df = func_df_signals_from_indicator('MACD', df, [12, 26, 9])
+    df = df_group_invested(df_invested_from_signal(df))
+    df = add_one_invested_after_selling(df)
+    folder_path = get_path() / 'data/analyse/new_test/plot_headless'
+    n_figures = len(plt.get_fignums())
+    for key in ['background', 'dots', 'interruption_line', 'rect']:
+        fig, ax = get_subplots(1, 1, headless=True)
+        ax_course(ax, df, True, True, True, True)
+        ax_course_highlight_invested(ax, df, key)
+        save_matplotlib_figure(fig, folder_path, key, dpi=50)
+    save_fig(fig_invested_indicator(df, 'MACD', headless=True), folder_path / 'indicator.png', dpi=50)
+    assert len(list(folder_path.glob('*.png'))) == 5
+    assert len(plt.get_fignums()) == n_figures  # not retained by pyplot
+
+
 if __name__ == "__main__":
 
     # Indicator
@@ -0,0 +1,38 @@
+from test import *
+from modules.file_handler import get_path
+from modules.study.results_table import *
+
+
+def test_results_table():
+    file_path = get_path() / 'data/analyse/new_test/results.sqlite'
+    file_path.unlink(missing_ok=True)
+    course_result = lambda course, s: {'course': course, 'sorting': s, 'all': {'S': s, '%_inv': 0.5}, 'intervals': {'S': s / 2, '%_inv': 0.4}}
+    list_results = [
+        {'sorting': 1.5, 'params': {'m_fast': 12, 'm_slow': 26.0}, 'list_results': [course_result('BTC', 1.0), course_result('ETH', 2.0)]},
+        {'sorting': 2.5, 'params': {'m_fast': 5, 'm_slow': 30.0}, 'list_results': [course_result('BTC', 3.0), course_result('ETH', 2.0)]},
+    ]
+    save_results_table(flatten_results(list_results, 'MACD_default', 'MACD'), file_path, 'MACD_default')
+    save_results_table(flatten_results([{'sorting': 1.0, 'params': [14, 30, 70], 'list_results': [course_result('BTC', 1.0)]}],
+                                       'RSI_default', 'RSI'), file_path, 'RSI_default')
+    save_results_table(flatten_results(list_results, 'MACD_default', 'MACD'), file_path, 'MACD_default')  # replaces the rows of the study
+
+    # 1x row per params variation and course, 1x column per param and metric
+    df = load_results_table(file_path, indicator='MACD', course=['BTC'])
+    print(df)
+    assert len(df) == 2 and list(df['param_m_fast']) == [12, 5] and list(df['all_S']) == [1.0, 3.0]
+    assert len(load_results_table(file_path)) == 5
+    # Ranking and best params (same types as in the study)
+    df_ranking = get_ranking(file_path, 'MACD_default')
+    print(df_ranking)
+    assert list(df_ranking['sorting']) == [2.5, 1.5] and list(df_ranking['all_S']) == [2.5, 1.5]
+    assert get_best_params_from_table(file_path, 'MACD_default', 1) == [{'m_fast': 5, 'm_slow': 30.0}]
+    assert get_best_params_from_table(file_path, 'RSI_default') == [[14, 30, 70]]
+    # Study without results (every params variation failed) -> the old rows of the study are deleted
+    save_results_table(flatten_results([], 'RSI_default', 'RSI'), file_path, 'RSI_default')
+    assert get_ranking(file_path, 'RSI_default').empty
+    assert len(load_results_table(file_path)) == 4
+
+
+
+if __name__ == "__main__":
+    test_results_table()
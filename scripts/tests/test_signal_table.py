@@ -0,0 +1,39 @@
+from test import *
+from modules.file_handler import get_path, save_pandas_to_file, load_course_close
+from modules.strategy.df_signals_invested import df_invested_from_signal
+from modules.strategy.signal_table import *
+
+
+def test_refresh_signal_table():
+    folder_path = get_path() / 'data/analyse/new_test/signal_table'
+    rng = np.random.default_rng(0)
+    df_course = get_df_from_list((100 * np.exp(np.cumsum(rng.normal(0, 0.03, 600)))).tolist())
+    course_path = folder_path / 'SYN.csv'
+    indicator_params = [('BB', {'bb_l': 6, 'bb_std': 2.0}), ('MACD', {'m_fast': 12, 'm_slow': 26, 'm_signal': 9}),
+                        ('RSI', {'rsi_l': 14, 'bl': 30, 'bu': 70})]
+    for indicator_name, params in indicator_params:
+        folder_path_table = folder_path / indicator_name
+        for file_path in folder_path_table.glob('*'):
+            file_path.unlink()
+        # Full calculation with the first 500 days, then 3 updates (incl. a refresh without new days)
+        for end in [500, 501, 501, 540, 600]:
+            save_pandas_to_file(df_course.iloc[:end], folder_path, 'SYN')
+            df_new = refresh_signal_table(indicator_name, course_path, params, folder_path_table)
+            print(f'{indicator_name} {end}: {len(df_new)} new rows')
+        assert len(df_new) == 60
+        # Incremental table = full calculation
+        df = load_signal_table(indicator_name, course_path, params, folder_path_table)
+        df_full = df_invested_from_signal(func_df_signals_from_indicator(indicator_name, load_course_close(course_path), params))
+        df_full = df_full[df.columns]
+        assert list(df.index) == list(df_full.index)
+        assert (df['signal'].to_numpy() == df_full['signal'].to_numpy()).all()
+        assert np.array_equal(df['invested'].to_numpy(), df_full['invested'].to_numpy(), equal_nan=True)
+        assert np.allclose(df.to_numpy(dtype=float), df_full.to_numpy(dtype=float), rtol=1e-9, atol=1e-9, equal_nan=True)
+        # Changed history -> full calculation
+        save_pandas_to_file(df_course.iloc[:600] * 1.01, folder_path, 'SYN')
+        assert len(refresh_signal_table(indicator_name, course_path, params, folder_path_table)) == 600
+
+
+
+if __name__ == "__main__":
+    test_refresh_signal_table()
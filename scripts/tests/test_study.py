@@ -0,0 +1,44 @@
+from test import *
+from modules.file_handler import get_path, save_pandas_to_file, fill_course_cache, clear_course_cache
+from modules.study.study_indicator_invested import _iter_params_evaluations
+
+
+def _evaluate(indicator_name, course_paths, params_variations, workers):
+    """ list_results of a study - (index, params, result or error message) in the order of the results
+    """
+    list_results = []
+    for index, params, get_result in _iter_params_evaluations(indicator_name, course_paths, params_variations, workers=workers):
+        try:
+            list_results.append((index, params, get_result()))
+        except Exception as e:
+            list_results.append((index, params, str(e)))
+    return list_results
+
+
+def test_workers_same_results():
+    folder_path = get_path() / 'data/analyse/new_test/study_workers'
+    rng = np.random.default_rng(0)
+    course_paths = []
+    for symbol, n in [('AAA', 900), ('BBB', 1200), ('CCC', 700)]:
+        save_pandas_to_file(get_df_from_list((100 * np.exp(np.cumsum(rng.normal(0, 0.03, n)))).tolist()), folder_path, symbol)
+        course_paths.append(folder_path / f'{symbol}.csv')
+    # Multiple blocks per course, 1x params variation fails (too long for every course)
+    params_variations = [{'m_fast': fast, 'm_slow': slow, 'm_signal': 9} for fast in range(2, 30, 2) for slow in [20, 40, 60, 80, 100]]
+    params_variations.insert(37, {'m_fast': 12, 'm_slow': 26, 'm_signal': 2000})
+    fill_course_cache(course_paths)
+    try:
+        list_results_serial = _evaluate('MACD', course_paths, params_variations, workers=1)
+        list_results_pool = _evaluate('MACD', course_paths, params_variations, workers=3)
+    finally:
+        clear_course_cache()
+    print(len(list_results_serial), list_results_serial[37])
+    assert [index for index, _, _ in list_results_serial] == list(range(len(params_variations)))
+    assert [params for _, params, _ in list_results_serial] == params_variations
+    assert isinstance(list_results_serial[37][2], str)
+    # Same results in the same order
+    assert list_results_pool == list_results_serial
+
+
+
+if __name__ == "__main__":
+    test_workers_same_results()